@@ -1,11 +1,49 @@
 '''                   databaseFunctions.py
 Created: 28/11/2016
-    Python script that holds the functions for creating, reading and loading from 
+    Python script that holds the functions for creating, reading and loading from
     sqlite databases.
+
+Modified 18/10/2026:
+    * Database now holds a single long-lived connection (shared between threads
+    and guarded by a re-entrant lock) instead of connecting on every call.
+    * Connection is opened in WAL mode with pragmas tuned for a local, single
+    writer portfolio database.
+    * Added transaction() context manager so that many writes can be batched
+    into a single commit.
+    * Added migrate() which applies versioned schema migrations, tracking the
+    schema version in the user_version pragma.
+    * addToDatabase() now inserts with executemany() on the shared connection,
+    so it takes part in any open transaction.
+    * readDatabase() and executeCommand() take the values used in the query as
+    params, bound to ? placeholders, rather than having them formatted into
+    the sql. This keeps the sql text the same from call to call so sqlite's
+    compiled statement cache is reused. readDatabase() can also convert the
+    result columns to given types. Added readValue() for single value queries.
+    * Queries are recorded by instrumentation.py (time taken, query fingerprint
+    and number of rows) when profiling is turned on.
 '''
 
 import sqlite3
+import threading
+from contextlib import contextmanager
 import pandas as pd
+import instrumentation
+
+###############
+## Constants ##
+###############
+# Pragmas applied to every new connection. WAL lets readers carry on while a
+# write is in progress and NORMAL synchronous is safe in WAL mode while only
+# fsyncing on checkpoints rather than on every commit.
+PRAGMAS = [("journal_mode", "WAL"),
+           ("synchronous", "NORMAL"),
+           ("temp_store", "MEMORY"),
+           ("cache_size", -16000),
+           ("busy_timeout", 5000)]
+# Number of compiled statements kept by the connection. Queries are looked up
+# by their sql text, so only queries that use ? placeholders for their values
+# get reused.
+STATEMENT_CACHE_SIZE = 256
 
 # Database class to create a new database at the file location given in databasePath.
 # Includes methods for creating tables, clearing and removing tables. Adding to and
@@ -14,66 +52,148 @@ class Database():
     # Class initializer
     def __init__(self, databasePath):
       self.databasePath = databasePath
-      conn = sqlite3.connect(self.databasePath)
-      conn.close()
-         
+      self._lock = threading.RLock()
+      self._transactionDepth = 0
+      # A single connection is shared by all threads, access to it is serialized
+      # by self._lock.
+      self.conn = sqlite3.connect(self.databasePath, check_same_thread = False,
+                                  cached_statements = STATEMENT_CACHE_SIZE)
+      instrumentation.count("connections")
+      for pragma, value in PRAGMAS:
+          self.conn.execute("PRAGMA {} = {}".format(pragma, value))
+
+    # Closes the connection to the database, committing any outstanding writes.
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.commit()
+                self.conn.close()
+                self.conn = None
+
+    # Commits the connection unless we are inside a transaction() block, in
+    # which case the commit is deferred until the block exits.
+    def _commit(self):
+        if self._transactionDepth == 0:
+            self.conn.commit()
+
+    # Context manager that batches all writes made inside the with block into
+    # a single commit. Blocks can be nested, only the outermost one commits.
+    # If an exception is raised inside the block all of its writes are rolled back.
+    # Usage:
+    #   with database.transaction():
+    #       stock.buy(...)
+    #       stock.addDividend(...)
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._transactionDepth += 1
+            try:
+                yield self
+            except:
+                self._transactionDepth -= 1
+                if self._transactionDepth == 0:
+                    self.conn.rollback()
+                raise
+            else:
+                self._transactionDepth -= 1
+                self._commit()
+
     # function which creates the table (tableName) (if it doesn't already exist)
     # with the columns in columnList
     def createTable(self, tableName, columnList):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()        
         sql_command = """ CREATE TABLE IF NOT EXISTS {} ({}) """.format(tableName, columnList)
-        cursor.execute(sql_command)
-        conn.commit()
-        conn.close()
-        print("Table created") 
-    
+        with self._lock:
+            self.conn.execute(sql_command)
+            self._commit()
+        print("Table created")
+
     # Deletes all rows from the table
     def clearTable(self, tableName):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()    
-        sql_command = """ DELETE FROM {} """.format(tableName) 
-        cursor.execute(sql_command)
-        conn.commit()
-        conn.close()
+        sql_command = """ DELETE FROM {} """.format(tableName)
+        with self._lock:
+            self.conn.execute(sql_command)
+            self._commit()
         print("Table cleared")
 
-        
+
     # function which removes the table (tableName) from the database db
     def removeTable(self, tableName):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()        
         #Remove database
-        sql_command = """ DROP TABLE IF EXISTS {} """.format(tableName) 
-        cursor.execute(sql_command)
-        conn.commit()
-        conn.close()
+        sql_command = """ DROP TABLE IF EXISTS {} """.format(tableName)
+        with self._lock:
+            self.conn.execute(sql_command)
+            self._commit()
         print("Table removed")
-        
-            
-    # function which adds data in dataframe to table
-    def addToDatabase(self, dataFrame, tableName):
-        conn = sqlite3.connect(self.databasePath)
-        dataFrame.to_sql(name = tableName, con = conn, if_exists = 'append', index = False)       
-        conn.commit()
-        conn.close()
-    
-            
-    # Uses the query sqlQuery to read the database
-    def readDatabase(self, sqlQuery):
-        conn = sqlite3.connect(self.databasePath)               
-        dataFrame = pd.read_sql(sqlQuery, conn)
-        conn.close()
+
+
+    # Brings the database schema up to date. migrations is a list where entry i
+    # holds the sql commands that take the schema from version i to version i+1.
+    # All outstanding migrations are applied in a single transaction.
+    def migrate(self, migrations):
+        with self.transaction():
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for newVersion in range(version + 1, len(migrations) + 1):
+                for sql_command in migrations[newVersion - 1]:
+                    self.conn.execute(sql_command)
+                self.conn.execute("PRAGMA user_version = {}".format(newVersion))
+                print("Database migrated to schema version {}".format(newVersion))
+        return max(version, len(migrations))
+
+
+    # function which adds data in dataframe to table.
+    # onConflict can be set to e.g. "IGNORE" or "REPLACE" to control what happens
+    # when a row violates a unique index.
+    def addToDatabase(self, dataFrame, tableName, onConflict = None):
+        columns = ", ".join('"{}"'.format(column) for column in dataFrame.columns)
+        placeholders = ", ".join("?" * len(dataFrame.columns))
+        insert = "INSERT" if onConflict is None else "INSERT OR {}".format(onConflict)
+        sql_command = """ {} INTO {} ({}) VALUES ({}) """.format(insert, tableName, columns, placeholders)
+        return self.executeMany(sql_command, dataFrame.itertuples(index = False, name = None))
+
+
+    # Uses the query sqlQuery to read the database. Values should be passed in
+    # params and marked in sqlQuery with ? placeholders. dtypes is an optional
+    # dictionary of column: type that the result columns are converted to.
+    # Usage:
+    #   database.readDatabase("SELECT * FROM historicalStockData WHERE Stock_Code = ?",
+    #                         ("VAS.AX",), {"Price_$": float})
+    def readDatabase(self, sqlQuery, params = None, dtypes = None):
+        with self._lock, instrumentation.query(sqlQuery) as event:
+            dataFrame = pd.read_sql(sqlQuery, self.conn, params = params)
+            event["rows"] = len(dataFrame)
+        if dtypes is not None:
+            dataFrame = dataFrame.astype(dtypes)
         return dataFrame
-        
-    # Executes a custom sql command. Can be used for removing rows etc
-    def executeCommand(self, sql_command):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()    
-        cursor.execute(sql_command)
-        rowsAffected = cursor.rowcount
-        conn.commit()
-        conn.close()
+
+    # Gets the first column of the first row returned by sqlQuery, e.g. for
+    # SELECT SUM(...) queries. Returns default if there are no rows or the
+    # value is NULL.
+    def readValue(self, sqlQuery, params = (), default = None):
+        with self._lock, instrumentation.query(sqlQuery) as event:
+            row = self.conn.execute(sqlQuery, params).fetchone()
+            event["rows"] = 0 if row is None else 1
+        if row is None or row[0] is None:
+            return default
+        return row[0]
+
+    # Executes a custom sql command, with values in params bound to the ?
+    # placeholders in sql_command. Can be used for removing rows etc
+    def executeCommand(self, sql_command, params = ()):
+        with self._lock, instrumentation.query(sql_command) as event:
+            cursor = self.conn.execute(sql_command, params)
+            rowsAffected = cursor.rowcount
+            event["rows"] = rowsAffected
+            self._commit()
         print("Command executed")
         return rowsAffected
-    
+
+    # Executes sql_command once for every row (a sequence of parameters) in rows.
+    # Returns the number of rows affected.
+    def executeMany(self, sql_command, rows):
+        with self._lock, instrumentation.query(sql_command) as event:
+            cursor = self.conn.executemany(sql_command, rows)
+            rowsAffected = cursor.rowcount
+            event["rows"] = rowsAffected
+            self._commit()
+        return rowsAffected
+
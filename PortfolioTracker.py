@@ -42,6 +42,62 @@ Modified 7/12/2016:
     based on how much you want to increase the portfolio value by, whether selling is 
     allowed or not and what the minimum transaction is to keep the portfolio weightings
     to the desired allocation.
+Modified 18/10/2026:
+    * Portfolio initializer now runs the versioned schema migrations in
+    stockContract.MIGRATIONS, which add (Stock_Code, Date) indexes to every table.
+    * Added getSeries() method which returns the portfolio totals over a date
+    range, computed by portfolioAggregator with one query per table for all
+    stocks. plotPortfolio now uses it.
+    * Added refreshPrices() method which downloads new price data for all the
+    stocks concurrently.
+    * Added refresh option to the initializer and addStock(). With refresh=False
+    stocks are added without downloading price data.
+    * Added importTransactions() and importDividends() methods which import many
+    purchases or dividends at once in a single transaction.
+    * Added getPricesAsOf() and getValuesAsOf() methods which look up the latest
+    price on or before a date for every stock in one query. getValue(),
+    getCurrentPercentages() and valuePath() use them instead of stepping back a
+    day at a time until every stock has a price.
+    * Added buildPriceStore() method which creates the memory mapped columnar
+    copy of the price data.
+    * valuePath() now solves the whole share allocation with rebalancer (within
+    the cash budget, with an optional brokerage fee model) and returns a
+    RebalancePlan instead of printing the table.
+    * Added backtest() method which simulates value averaging the desired
+    allocation over the stored price history (see backtester.py).
+    * Added getPerformance() method which gives the time weighted return,
+    XIRR, drawdown, volatility and Sharpe ratio of each stock and the portfolio,
+    and getMonthlyPerformance() which gives the XIRR and rolling volatility at
+    every month end.
+    * plotPortfolio() draws with reportRenderer.drawPortfolio(). Added
+    renderReport() method which renders the portfolio and stock plots to PNG,
+    SVG or HTML files without a display, skipping plots whose data is unchanged.
+    * printPurchases() passes the stock code and dates as query parameters.
+    * Added databaseDirectory argument to the initializer (defaults to
+    DATABASE_DIRECTORY). The testing code only runs when this file is run as a
+    script, so Portfolio can be imported.
+    * Public methods are recorded as spans by instrumentation.py when
+    profiling is turned on.
+    * getValue(), getValuesAsOf(), getSeries() and plotPortfolio() read from the
+    dailyHoldings snapshot table (added by schema migration 3) rather than
+    recomputing the holdings from the purchase history.
+    * Added baseCurrency to the initializer and currency to addStock(), for
+    portfolios holding stocks priced in different currencies (see fxRates.py).
+    getPricesAsOf(), getValuesAsOf(), getValue(), getSeries(), valuePath() and
+    renderReport() convert every stock into the base currency. Added
+    refreshRates() and importRates() which fill the exchange rate table.
+    * Share counts and price series are adjusted for the splits recorded with
+    Stock.addSplit() (see corporateActions.py), so valuePath(), getSeries(),
+    getPerformance() and backtest() are continuous across a split.
+    * Added getTaxLots() method which matches the sales of every stock to the
+    lots they were sold from, giving the realized and unrealized gains and the
+    capital gain of each financial year (see taxLots.py).
+    * getCost() and the cost printed by the str method are the cost base of the
+    shares still owned, rather than the amount spent less the amount received
+    from sales.
+    * getCost(), getDividends(), getPerformance() and backtest() are in the
+    base currency, with purchases and dividends converted at the rate on the
+    day they were made and values at the rate on each date.
     
 
 To Do:
@@ -54,7 +110,21 @@ from Stock import Stock
 from ValueStock import ValueStock
 from Database import Database
 import stockContract as SC
+import portfolioAggregator as aggregator
+import stockDownloader as downloader
+import transactionImporter as importer
+import columnarStore
+import rebalancer
+import backtester
+import performanceMetrics as metrics
+import reportRenderer
+import instrumentation
+import holdingsTable
+import fxRates
+import corporateActions
+import taxLots
 import datetime
+import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
@@ -66,6 +136,7 @@ import pandas as pd
 DEFAULT_DATE = str(datetime.date.today())
 DEFAULT_STARTDATE = "1900-01-01"
 DEFAULT_STOCKCODE = "All"
+DATABASE_DIRECTORY = "/Users/hplustech/Documents/Canopy/Portfolio Tracker/Databases/"
 
 ####################
 ## Helper Methods ##
@@ -86,17 +157,27 @@ def convertDate(date):
 # Portfolio class for holding all of the stock objects that the user holds in
 # their investment portfolio.
 # See stockContract.py for the database contract
+@instrumentation.traceMethods
 class Portfolio: 
     # Class initializer
-    def __init__(self, databaseName):
+    # refresh sets whether stocks download any new price data when they are
+    # added. If False, call refreshPrices() to download it.
+    # databaseDirectory is the folder the database file is kept in.
+    # baseCurrency is the currency that values are reported in.
+    def __init__(self, databaseName, refresh = True, databaseDirectory = DATABASE_DIRECTORY,
+                 baseCurrency = fxRates.DEFAULT_CURRENCY):
         self.stockList = []
-        self.databasePath = "/Users/hplustech/Documents/Canopy/Portfolio Tracker/Databases/" + databaseName + ".db"
+        self.refresh = refresh
+        self.baseCurrency = baseCurrency
+        self.databasePath = os.path.join(databaseDirectory, databaseName + ".db")
         # Create SQL database
         self.stockDatabase = Database(self.databasePath);
         # Create tables
         self.stockDatabase.createTable(SC.TABLE_NAME, SC.COLUMN_LIST)
         self.stockDatabase.createTable(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_COLUMN_LIST)
         self.stockDatabase.createTable(SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_COLUMN_LIST)
+        # Bring the schema (indexes, date formats) up to date
+        self.stockDatabase.migrate(SC.MIGRATIONS)
 
         
     # Class string method
@@ -110,131 +191,201 @@ class Portfolio:
         return returnString
 
     
-    # Add a new stock with code "stockCode" to the portfolio
-    def addStock(self, stockCode, percentage):
-        newStock = ValueStock(stockCode, percentage, self.stockDatabase)
+    # Add a new stock with code "stockCode" to the portfolio. refresh overrides
+    # the portfolio's refresh setting for this stock. currency is the currency
+    # the stock is priced in, if it isn't already stored (see Stock).
+    def addStock(self, stockCode, percentage, refresh = None, currency = None):
+        if refresh is None:
+            refresh = self.refresh
+        newStock = ValueStock(stockCode, percentage, self.stockDatabase, refresh, currency)
         self.stockList.append(newStock)
         return newStock
      
         
+    # Downloads any new price data for all of the stocks in the portfolio. The
+    # stocks are downloaded concurrently, with at most maxWorkers at a time.
+    # priceSource sets where the data comes from (see stockDownloader.PriceSource).
+    # Returns a dictionary of stock code to the number of price rows added.
+    def refreshPrices(self, maxWorkers = downloader.MAX_CONCURRENT_DOWNLOADS, priceSource = None):
+        return downloader.updateAllStockData(self.getCodes(), self.stockDatabase, maxWorkers, priceSource)
+     
+        
+    # Downloads any new exchange rates from the currency of each stock in the
+    # portfolio to the base currency. Returns a dictionary of currency to the
+    # number of rates added.
+    def refreshRates(self, priceSource = None):
+        currencies = set(stock.currency for stock in self.stockList) - {self.baseCurrency}
+        return {currency: downloader.updateRates(currency, self.baseCurrency, self.stockDatabase, priceSource)
+                for currency in sorted(currencies)}
+     
+        
+    # Creates the columnar copy of the price data of the stocks in the portfolio
+    # (see columnarStore.py), which is then used for reading price ranges and
+    # kept up to date when new prices are downloaded.
+    def buildPriceStore(self):
+        columnarStore.build(self.stockDatabase, self.getCodes())
+        
+        
+    # Imports many purchases/sales at once from data, a dataframe or the path to
+    # a CSV file (see transactionImporter.py for the format). Rows already in the
+    # database are skipped. Returns the number of transactions added.
+    def importTransactions(self, data):
+        added = importer.importTransactions(self.stockDatabase, data)
+        # Update the totals of the stocks in the portfolio, with the number of
+        # shares adjusted for any splits since the purchases
+        current = added[added[SC.DATE] <= DEFAULT_DATE]
+        shares = current[SC.NUMBER_PURCHASED] * corporateActions.getRowFactors(self.stockDatabase, current[SC.CODE], current[SC.DATE]) \
+            / corporateActions.getRowFactors(self.stockDatabase, current[SC.CODE], np.full(len(current), DEFAULT_DATE))
+        totals = current.assign(**{SC.NUMBER_PURCHASED: shares}).groupby(SC.CODE)[SC.NUMBER_PURCHASED].sum()
+        for stock in self.stockList:
+            if stock.stockCode in totals.index:
+                stock.adjustTotals(numberOwned = totals[stock.stockCode])
+                stock.invalidateCost()
+        return len(added)
+        
+        
+    # Imports many dividend payments at once from data, a dataframe or the path
+    # to a CSV file (see transactionImporter.py for the format). Rows already in
+    # the database are skipped. Returns the number of dividends added.
+    def importDividends(self, data):
+        added = importer.importDividends(self.stockDatabase, data)
+        # Update the totals of the stocks in the portfolio
+        totals = added[added[SC.DIVIDEND_DATE] <= DEFAULT_DATE].groupby(SC.DIVIDEND_CODE)[SC.DIVIDEND_AMOUNT].sum()
+        for stock in self.stockList:
+            if stock.stockCode in totals.index:
+                stock.adjustTotals(totalDividend = totals[stock.stockCode])
+        return len(added)
+        
+        
+    # Imports many exchange rates at once from data, a dataframe or the path to
+    # a CSV file (see transactionImporter.py for the format). Returns the
+    # number of rates added or changed.
+    def importRates(self, data):
+        return importer.importRates(self.stockDatabase, data)
+     
+        
+    # Gets a list of the codes of the stocks in the portfolio
+    def getCodes(self):
+        return [stock.stockCode for stock in self.stockList]
+        
+        
+    # Gets a series, indexed by stock code, of the latest price of each stock in
+    # the portfolio on or before date, in the base currency. All the stocks are
+    # looked up in one query.
+    def getPricesAsOf(self, date = DEFAULT_DATE):
+        codes = self.getCodes()
+        prices = aggregator.getPricesAsOf(self.stockDatabase, codes, date)
+        return prices * fxRates.getStockRates(self.stockDatabase, codes, self.baseCurrency, date)
+        
+        
+    # Gets a series, indexed by stock code, of the value of each stock in the
+    # portfolio on the latest date on or before date that it has a price for,
+    # in the base currency. Read from the dailyHoldings snapshots (see holdingsTable.py).
+    def getValuesAsOf(self, date = DEFAULT_DATE):
+        return holdingsTable.getAsOf(self.stockDatabase, self.getCodes(), date, self.baseCurrency)[SC.TOTAL_VALUE]
+        
+        
     # Calculate the total value of the portfolio on a particular date
     def getValue(self, date = DEFAULT_DATE):
-        result = None
-        while result is None:
-            try:
-                totalValue = 0
-                for stock in self.stockList:
-                    totalValue += stock.getValue(date)
-                result = totalValue
-            except:
-                # decrement date by one day
-                date = decrementDate(date)
-
-        return result
+        return self.getValuesAsOf(date).sum()
         
         
-    # Calculate the total cost of the portfolio on a particular date
+    # Calculate the total cost of the portfolio on a particular date, the cost
+    # base of the shares still owned (see Stock.totalCost) in the base currency
     def getCost(self, date = DEFAULT_DATE):
-        totalSpent = 0
-        for stock in self.stockList:
-            totalSpent += stock.totalCost
-        return totalSpent
+        return taxLots.getCostBase(self.stockDatabase, self.getCodes(), taxLots.SPECIFIC, date,
+                                   self.baseCurrency).sum()
         
         
     # Calculate the total amount of dividend payments the portfolio has recieved
-    # up to a particular date
+    # up to a particular date, each converted into the base currency at the rate
+    # on the day it was paid
     def getDividends(self, date = DEFAULT_DATE):
-        totalDividend = 0
-        for stock in self.stockList:
-            totalDividend += stock.totalDividend
-        return totalDividend
+        codes = self.getCodes()
+        sqlQuery = '''SELECT {0}, {1}, {2} FROM {3}
+            WHERE {0} IN ({4}) AND {1} <= date(?)'''\
+            .format(SC.DIVIDEND_CODE, SC.DIVIDEND_DATE, SC.DIVIDEND_AMOUNT, SC.DIVIDEND_TABLE_NAME,
+                    aggregator.placeholders(codes))
+        data = self.stockDatabase.readDatabase(sqlQuery, codes + [str(date)])
+        currencies = fxRates.getCurrencies(self.stockDatabase, codes).reindex(data[SC.DIVIDEND_CODE]).to_numpy()
+        return fxRates.convertAmounts(self.stockDatabase, data[SC.DIVIDEND_AMOUNT].fillna(0), data[SC.DIVIDEND_DATE],
+                                      currencies, self.baseCurrency).sum()
      
     
     # For each ValueStock in the portfolio calculate its current percentage of the
     # total value and set it to the currentPercentage value in the ValueStock.
     def getCurrentPercentages(self):
-        date = DEFAULT_DATE
-        result = False
-        while not result:
-            try:
-                totalDesired = 0
-                portfolioValue = self.getValue(date)
-                for valueStock in self.stockList:
-                    stockValue = valueStock.getValue(date)
-                    valueStock.currentPercentage = 100*stockValue/portfolioValue
-                    totalDesired += valueStock.setPercentage
-                result = True
-            except:
-                # decrement date by one day
-                date = decrementDate(date)
+        values = self.getValuesAsOf(DEFAULT_DATE)
+        portfolioValue = values.sum()
+        totalDesired = 0
+        for valueStock in self.stockList:
+            valueStock.currentPercentage = 100*values[valueStock.stockCode]/portfolioValue
+            totalDesired += valueStock.setPercentage
                 
         # Make sure the desired portfolio percentages add to 0
         if totalDesired != 100:
             raise ValueError("Desired portfolio weightings do not sum to 100%. Current sum = {}%.".format(totalDesired))
             
     
-    # Calculate the value path
+    # Calculate the value path. Works out how many whole shares of each stock to
+    # buy (or sell) to bring the portfolio weightings as close as possible to
+    # the desired allocation without spending more than portfolioIncrease, sets
+    # desiredBuy on each ValueStock and returns the rebalancer.RebalancePlan.
     # params
     # portfolioIncrease - the value that you wish the portfolio to increase by
     # sellingAllowed - boolean - whether selling is allowed.
     # minimumTransaction - the minimum amount of money that you are willing to 
     #   buy or sell per transaction. Usually want to limit this to avoid excess
     #   transaction fees.
-    def valuePath(self, portfolioIncrease, sellingAllowed, minimumTransaction):
+    # feeModel - rebalancer.FeeModel giving the brokerage charged per trade.
+    def valuePath(self, portfolioIncrease, sellingAllowed, minimumTransaction, feeModel = None):
         date = DEFAULT_DATE
-        result = False
-        while not result:
-            try:
-                currentTotalValue = self.getValue(date)
-                desiredTotalValue = currentTotalValue + portfolioIncrease
-                totalSpent = 0
-                for stock in self.stockList:
-                    currentStockValue = stock.getValue(date)
-                    desiredStockValue = stock.setPercentage / 100 * desiredTotalValue
-                    if desiredStockValue - currentStockValue > minimumTransaction:
-                        stock.desiredBuy = round((desiredStockValue - currentStockValue)/stock.getPrice(date))
-                    elif sellingAllowed and desiredStockValue - currentStockValue < -minimumTransaction:
-                        stock.desiredBuy = round((desiredStockValue - currentStockValue)/stock.getPrice(date))
-                    else:
-                        stock.desiredBuy = 0
-                    totalSpent += stock.desiredBuy * stock.getPrice(date)
-                result = True
-            except:
-                # decrement date by one day
-                date = decrementDate(date)
-        
-        # Print out value path  
-        print("\n")
-        self.printValues()
-        print("\n")
-        code = []
-        numBuy = []
-        price = []
-        costArray = []
-        desiredAllocation = []
-        finalAllocation = []
-        
-        for stock in self.stockList:
-            cost = stock.getPrice(date) * stock.desiredBuy
-            finalWeight = 100 * (stock.getValue(date) + cost) / (currentTotalValue + totalSpent)
-            numBuy.append(int(stock.desiredBuy))
-            code.append(stock.stockCode)
-            price.append(stock.getPrice(date))
-            costArray.append(cost)
-            desiredAllocation.append(stock.setPercentage)
-            finalAllocation.append("{:.1f}".format(finalWeight))
-        
-        valueData = pd.DataFrame({"Stock Code": code,
-                                  "To Buy": numBuy,
-                                  "Price ($)": price,
-                                  "Total Cost ($)": costArray,
-                                  "Desired (%)": desiredAllocation,
-                                  "Final (%)": finalAllocation
-                                  }, columns=['Stock Code', 'To Buy', 'Price ($)', "Total Cost ($)", "Desired (%)", "Final (%)"])
-        print(valueData)
-        print("Total to spend: ${:.2f}. Total portfolio value after purchase: ${:.2f}.".format(totalSpent, totalSpent + currentTotalValue))
+        codes = self.getCodes()
+        owned = aggregator.getOwnedAsOf(self.stockDatabase, codes, date)
+        prices = self.getPricesAsOf(date)
+        weights = np.array([stock.setPercentage for stock in self.stockList]) / 100
+        plan = rebalancer.solveRebalance(owned.to_numpy(), prices.to_numpy(), weights, portfolioIncrease,
+                                         sellingAllowed, minimumTransaction, feeModel, codes)
+        for stock, trade in zip(self.stockList, plan.trades):
+            stock.desiredBuy = trade
+        return plan
+                            
+                
+    # Backtests value averaging the portfolio's desired allocation over the
+    # stored price history, investing contribution every month or quarter
+    # from dateStart. Returns a backtester.BacktestResult. Takes the same
+    # keyword arguments as backtester.runBacktest().
+    def backtest(self, contribution, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE, **kwargs):
+        weights = np.array([stock.setPercentage for stock in self.stockList]) / 100
+        return backtester.backtestDatabase(self.stockDatabase, self.getCodes(), weights, contribution,
+                                           dateStart, dateEnd, self.baseCurrency, **kwargs)
+                            
+                
+    # Gets a dataframe of the time weighted return, XIRR, maximum drawdown,
+    # volatility, recent rolling volatility and Sharpe ratio of each stock and
+    # of the whole portfolio between dateStart and dateEnd (see performanceMetrics.py).
+    def getPerformance(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE, riskFreeRate = 0,
+                       window = metrics.ROLLING_WINDOW):
+        return metrics.getPerformance(self.stockDatabase, self.getCodes(), dateStart, dateEnd, riskFreeRate,
+                                      self.baseCurrency, window)
+                            
+                
+    # Gets a dataframe of the XIRR and rolling volatility of each stock and of
+    # the whole portfolio at every month end between dateStart and dateEnd
+    # (see performanceMetrics.getMonthlyPerformance()).
+    def getMonthlyPerformance(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE,
+                              window = metrics.ROLLING_WINDOW):
+        return metrics.getMonthlyPerformance(self.stockDatabase, self.getCodes(), dateStart, dateEnd, window,
+                                             self.baseCurrency)
                             
                 
+    # Gets the TaxLots of all the stocks in the portfolio at date, with sales
+    # matched to lots by method (one of taxLots.METHODS). All the transactions
+    # are matched in one pass.
+    def getTaxLots(self, method = taxLots.FIFO, date = DEFAULT_DATE):
+        return taxLots.getTaxLots(self.stockDatabase, self.getCodes(), method, date)
+                
+                
     # Print values
     def printValues(self):
         for valueStock in self.stockList:
@@ -247,14 +398,16 @@ class Portfolio:
     # purchases for stockCode.    
     def printPurchases(self, stockCode = DEFAULT_STOCKCODE, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
         sqlQuery = '''SELECT * FROM {}
-            WHERE {} BETWEEN date("{}") and date("{}")'''\
-            .format(SC.TABLE_NAME, SC.DATE, dateStart, dateEnd)
+            WHERE {} BETWEEN date(?) and date(?)'''\
+            .format(SC.TABLE_NAME, SC.DATE)
+        params = [dateStart, dateEnd]
         
         if stockCode != DEFAULT_STOCKCODE:
-            sqlQuery += ''' AND {} LIKE '{}' '''.format(SC.CODE, stockCode)
+            sqlQuery += ''' AND {} = ? '''.format(SC.CODE)
+            params.append(stockCode)
         
         sqlQuery += ''' ORDER BY {}, {} '''.format(SC.CODE, SC.DATE)    
-        queryDataFrame = self.stockDatabase.readDatabase(sqlQuery)
+        queryDataFrame = self.stockDatabase.readDatabase(sqlQuery, params)
         print(queryDataFrame)
         
     
@@ -268,243 +421,215 @@ class Portfolio:
             stock.plot(dateStart, dateEnd)
     
             
+    # Gets a dataframe containing the total amount spent, total value and total
+    # dividends of the whole portfolio, in the base currency, for each date in
+    # the range. Read in one query from the dailyHoldings snapshots (see holdingsTable.py).
+    def getSeries(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
+        return holdingsTable.getPortfolioSeries(self.stockDatabase, self.getCodes(), dateStart, dateEnd,
+                                                self.baseCurrency)
+        
+        
     # Plots the total portfolio value, amount spent and profit        
     def plotPortfolio(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
         plt.close("all")
-        # Make an empty dataframe for merging using the date values in the first stock
-        # in stockList.
-        date = self.stockList[0].getValueRange(dateStart, dateEnd)[SC.HISTORICAL_DATE].tolist()
-        spent = pd.DataFrame({SC.HISTORICAL_DATE: date, SC.TOTAL_SPENT: list(np.zeros(len(date)))})
-        value = pd.DataFrame({SC.HISTORICAL_DATE: date, "Value": list(np.zeros(len(date)))})
-        dividends = pd.DataFrame({SC.HISTORICAL_DATE: date, "DIVIDEND_TOTAL": list(np.zeros(len(date)))})
-        
-        # Loop over the stocks in stockList merging their data into the total
-        # dataFrames (performs outer join).
-        for s in self.stockList:
-            spent = pd.merge(spent, s.getSpentRange(dateStart, dateEnd), how = "outer", on = SC.HISTORICAL_DATE)
-            value = pd.merge(value, s.getValueRange(dateStart, dateEnd), how = "outer", on = SC.HISTORICAL_DATE)
-            dividends = pd.merge(dividends, s.getDividendRange(dateStart, dateEnd), how = "outer", on = SC.HISTORICAL_DATE)
-        
-        # Forward fill missing data, for dates that don't exist in db
-        spent = spent.fillna(method = "ffill")
-        value = value.fillna(method = "ffill")
-        dividends = dividends.fillna(method = "ffill") 
-        
-        # Create total value column by summing the merged columns (except date)
-        spent["Total"] = spent.sum(axis = 1)
-        value["Total"] = value.sum(axis = 1)
-        dividends["Total"] = dividends.sum(axis = 1)
-        
-        # Create date column from merged data for plotting
-        date = list(map(convertDate, spent[SC.HISTORICAL_DATE]))
-        
-#         Do plotting
+        data = self.getSeries(dateStart, dateEnd)
         fig = plt.figure()
         plt.clf()
+        reportRenderer.drawPortfolio(fig, data)
+        plt.show() 
         
-        ax = fig.add_subplot(511)
-        plt.title("Portfolio Totals", fontsize = 16)
-        ax.plot(date, spent["Total"])
-        plt.ylabel("Spent ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(512)
-        ax.plot(date, value["Total"])
-        plt.ylabel("Value ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(513)
-        ax.plot(date, dividends["Total"])
-        plt.ylabel("Dividends ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(514)
-        plt.plot(date, value["Total"] - spent["Total"])
-        plt.plot(date, value["Total"] - spent["Total"] + dividends["Total"])
-        plt.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
-        plt.ylabel("Profit ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(515)
-        plt.plot(date, 100*(value["Total"] - spent["Total"])/spent["Total"])
-        plt.plot(date, 100*(value["Total"] - spent["Total"] + dividends["Total"])/spent["Total"])
-        plt.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
-        plt.ylabel("% Profit ($)", fontsize = 14)
-        plt.xlabel("Date", fontsize = 14)
         
-        plt.show() 
+    # Renders the portfolio plot and the plot of every stock to files in
+    # outputDirectory (Portfolio.png, VAS.AX.png, ...) without displaying them.
+    # The series for each plot are computed once and the plots are rendered in
+    # maxWorkers processes. Plots whose data hasn't changed since they were last
+    # rendered are skipped. Returns a dictionary of file path: True if rendered.
+    def renderReport(self, outputDirectory, fileFormat = "png", dateStart = DEFAULT_STARTDATE,
+                     dateEnd = DEFAULT_DATE, maxWorkers = 1):
+        os.makedirs(outputDirectory, exist_ok = True)
+        tasks = [(os.path.join(outputDirectory, "Portfolio.{}".format(fileFormat)), "portfolio",
+                  "Portfolio", self.getSeries(dateStart, dateEnd))]
+        for stock in self.stockList:
+            tasks.append((os.path.join(outputDirectory, "{}.{}".format(stock.stockCode, fileFormat)), "stock",
+                          stock.stockCode, stock.getTimeSeries(dateStart, dateEnd, self.baseCurrency)))
+        return reportRenderer.renderAll(tasks, maxWorkers)
         
 
 
             
 # Testing code
-try:         
-    myPortfolio = Portfolio("myPortfolio")
-    vap = myPortfolio.addStock("VAP.AX", 10.0)
-    ijr = myPortfolio.addStock("IJR.AX", 25.0)
-    veu = myPortfolio.addStock("VEU.AX", 15.0)
-    vas = myPortfolio.addStock("VAS.AX", 25.0)
-    vgb = myPortfolio.addStock("VGB.AX", 12.5)
-    vaf = myPortfolio.addStock("VAF.AX", 12.5)
-    myPortfolio.getCurrentPercentages()
+if __name__ == "__main__":
+    try:         
+        myPortfolio = Portfolio("myPortfolio")
+        vap = myPortfolio.addStock("VAP.AX", 10.0)
+        ijr = myPortfolio.addStock("IJR.AX", 25.0)
+        veu = myPortfolio.addStock("VEU.AX", 15.0)
+        vas = myPortfolio.addStock("VAS.AX", 25.0)
+        vgb = myPortfolio.addStock("VGB.AX", 12.5)
+        vaf = myPortfolio.addStock("VAF.AX", 12.5)
+        myPortfolio.getCurrentPercentages()
     
-#    print(myPortfolio)
+    #    print(myPortfolio)
     
-#    vaf.buy(31, 48.22, "2014-04-29")
-#    vaf.buy(1, 0, "2015-01-19")
-#    vaf.buy(27, 50.39, "2015-04-29")
-#    vaf.buy(21, 49.8, "2015-07-29")
-#    vaf.buy(1, 0, "2015-10-19")
-#    vaf.buy(1, 49.01, "2016-01-19")
-#    vaf.buy(1, 49.58, "2016-04-19")
-#    vaf.buy(1, 50.02, "2016-07-18")
-#    vaf.buy(1, 49.92, "2016-10-19")
-#    
-#    vgb.buy(32, 46.81, "2014-04-29")
-#    vgb.buy(74, 47.51, "2014-10-29")
-#    vgb.buy(1, 0, "2015-01-19")
-#    vgb.buy(1, 49.74, "2015-20-04")
-#    vgb.buy(1, 0, "2015-10-19")
-#    vgb.buy(1, 48.57, "2016-01-19")
-#    vgb.buy(1, 50.53, "2016-07-18")
-#    vgb.buy(1, 50.47, "2016-10-19")
-#    
-#    vas.buy(44, 70.87, "2014-07-29")
-#    vas.buy(14, 70.90, "2014-07-31")
-#    vas.buy(14, 68.98, "2014-10-29")
-#    vas.buy(1, 0, "2015-01-19")
-#    vas.buy(20, 75.22, "2015-02-26")
-#    vas.buy(1, 74.66, "2015-04-15")
-#    vas.buy(17, 74.46, "2015-04-29")
-#    vas.buy(1, 69.25, "2015-07-16")
-#    vas.buy(17, 71.54, "2015-07-29")
-#    vas.buy(2, 0, "2015-10-19")
-#    vas.buy(2, 67.00, "2016-01-19")
-#    vas.buy(1, 64.35, "2016-04-19")
-#    vas.buy(1, 66.68, "2016-07-18")
-#    vas.buy(2, 69.68, "2016-10-19")
-#    
-#    vap.buy(26, 76.11, "2015-02-26")
-#    vap.buy(18, 74.66, "2015-04-29")
-#    vap.buy(1, 0, "2015-10-19")
-#    vap.buy(1, 74.56, "2016-01-19")
-#    vap.buy(1, 84.44, "2016-07-18")
-#    
-#    ijr.buy(61, 115.22, "2014-04-29")
-#    
-#    veu.buy(27, 55.25, "2014-05-13")
-#    veu.buy(20, 55.26, "2014-05-20")
-#    veu.buy(25, 56.08, "2014-07-29")
-#    veu.buy(16, 65.60, "2015-07-29")
+    #    vaf.buy(31, 48.22, "2014-04-29")
+    #    vaf.buy(1, 0, "2015-01-19")
+    #    vaf.buy(27, 50.39, "2015-04-29")
+    #    vaf.buy(21, 49.8, "2015-07-29")
+    #    vaf.buy(1, 0, "2015-10-19")
+    #    vaf.buy(1, 49.01, "2016-01-19")
+    #    vaf.buy(1, 49.58, "2016-04-19")
+    #    vaf.buy(1, 50.02, "2016-07-18")
+    #    vaf.buy(1, 49.92, "2016-10-19")
+    #    
+    #    vgb.buy(32, 46.81, "2014-04-29")
+    #    vgb.buy(74, 47.51, "2014-10-29")
+    #    vgb.buy(1, 0, "2015-01-19")
+    #    vgb.buy(1, 49.74, "2015-20-04")
+    #    vgb.buy(1, 0, "2015-10-19")
+    #    vgb.buy(1, 48.57, "2016-01-19")
+    #    vgb.buy(1, 50.53, "2016-07-18")
+    #    vgb.buy(1, 50.47, "2016-10-19")
+    #    
+    #    vas.buy(44, 70.87, "2014-07-29")
+    #    vas.buy(14, 70.90, "2014-07-31")
+    #    vas.buy(14, 68.98, "2014-10-29")
+    #    vas.buy(1, 0, "2015-01-19")
+    #    vas.buy(20, 75.22, "2015-02-26")
+    #    vas.buy(1, 74.66, "2015-04-15")
+    #    vas.buy(17, 74.46, "2015-04-29")
+    #    vas.buy(1, 69.25, "2015-07-16")
+    #    vas.buy(17, 71.54, "2015-07-29")
+    #    vas.buy(2, 0, "2015-10-19")
+    #    vas.buy(2, 67.00, "2016-01-19")
+    #    vas.buy(1, 64.35, "2016-04-19")
+    #    vas.buy(1, 66.68, "2016-07-18")
+    #    vas.buy(2, 69.68, "2016-10-19")
+    #    
+    #    vap.buy(26, 76.11, "2015-02-26")
+    #    vap.buy(18, 74.66, "2015-04-29")
+    #    vap.buy(1, 0, "2015-10-19")
+    #    vap.buy(1, 74.56, "2016-01-19")
+    #    vap.buy(1, 84.44, "2016-07-18")
+    #    
+    #    ijr.buy(61, 115.22, "2014-04-29")
+    #    
+    #    veu.buy(27, 55.25, "2014-05-13")
+    #    veu.buy(20, 55.26, "2014-05-20")
+    #    veu.buy(25, 56.08, "2014-07-29")
+    #    veu.buy(16, 65.60, "2015-07-29")
     
-#    vap.remove(1, 0, "2016-04-19")
-#    vap.remove(1, 0, "2016-10-18")
+    #    vap.remove(1, 0, "2016-04-19")
+    #    vap.remove(1, 0, "2016-10-18")
 
-#    veu.sell(10, 100, "2016-06-01")
-#    veu.buy(20, 100, "2016-06-02")
-#    veu.sell(10, 100, "2014-06-01")
-#    veu.remove(-10, 52.3, "2014-06-01")
-#    veu.remove(20, 59.3, "2016-06-02")
-#    veu.remove(-10, 59.3, "2016-06-01")
-##    veu.remove(100, 100, "2016-12-01")
+    #    veu.sell(10, 100, "2016-06-01")
+    #    veu.buy(20, 100, "2016-06-02")
+    #    veu.sell(10, 100, "2014-06-01")
+    #    veu.remove(-10, 52.3, "2014-06-01")
+    #    veu.remove(20, 59.3, "2016-06-02")
+    #    veu.remove(-10, 59.3, "2016-06-01")
+    ##    veu.remove(100, 100, "2016-12-01")
     
-#    vaf.addDividend(19.10, "2014-07-16")
-#    vaf.addDividend(14.61, "2014-10-17")
-#    vaf.addDividend(16.85, "2015-01-19")
-#    vaf.addDividend(13.97, "2015-04-20")
-#    vaf.addDividend(28.10, "2015-07-16")
-#    vaf.addDividend(42.88, "2015-10-19")
-#    vaf.addDividend(40.18, "2016-01-19")
-#    vaf.addDividend(35.02, "2016-04-19")
-#    vaf.addDividend(78.50, "2016-07-18")
-#    vaf.addDividend(35.35, "2016-10-19")
-#    
-#    vap.addDividend(14.63, "2015-04-20")
-#    vap.addDividend(56.19, "2015-07-16")
-#    vap.addDividend(25.04, "2015-10-19")
-#    vap.addDividend(53.65, "2016-01-19")
-#    vap.addDividend(27.02, "2016-04-19")
-#    vap.addDividend(68.13, "2016-07-18")
-#    vap.addDividend(27.07, "2016-10-19")
-#    
-#    vas.addDividend(56.65, "2014-10-17")
-#    vas.addDividend(54.51, "2015-01-19")
-#    vas.addDividend(62.95, "2015-04-20")
-#    vas.addDividend(61.32, "2015-07-16")
-#    vas.addDividend(121.75, "2015-10-19")
-#    vas.addDividend(142.11, "2016-01-19")
-#    vas.addDividend(112.61, "2016-04-19")
-#    vas.addDividend(24.22, "2016-07-18")
-#    vas.addDividend(137.72, "2016-10-19")
-#    
-#    veu.addDividend(25.88, "2014-07-17")
-#    veu.addDividend(18.82, "2014-10-17")
-#    veu.addDividend(28.34, "2015-01-19")
-#    veu.addDividend(12.80, "2015-04-29")
-#    veu.addDividend(45.71, "2015-07-28")
-#    veu.addDividend(23.55, "2015-10-28")
-#    veu.addDividend(36.34, "2016-01-25")
-#    veu.addDividend(14.52, "2016-04-18")
-#    veu.addDividend(52.75, "2016-07-14")
-#    veu.addDividend(25.05, "2016-10-13")
-#    
-#    vgb.addDividend(24.42, "2014-07-16")
-#    vgb.addDividend(11.40, "2014-10-17")
-#    vgb.addDividend(35.16, "2015-01-19")
-#    vgb.addDividend(33.83, "2015-04-20")
-#    vgb.addDividend(36.84, "2015-07-16")
-#    vgb.addDividend(31.40, "2015-10-19")
-#    vgb.addDividend(34.17, "2016-01-19")
-#    vgb.addDividend(35.35, "2016-04-19")
-#    vgb.addDividend(34.87, "2016-07-18")
-#    vgb.addDividend(32.41, "2016-10-19")
-#    
-#    ijr.addDividend(17.49, "2014-07-16")
-#    ijr.addDividend(18.60, "2014-10-17")
-#    ijr.addDividend(28.78, "2015-01-28")
-#    ijr.addDividend(28.12, "2015-04-27")
-#    ijr.addDividend(24.96, "2015-07-23")
-#    ijr.addDividend(25.45, "2015-10-27")
-#    ijr.addDividend(37.23, "2016-01-28")
-#    ijr.addDividend(27.93, "2016-04-27")
-#    ijr.addDividend(0, "2016-07-14")
-#    ijr.addDividend(0, "2016-10-13")
+    #    vaf.addDividend(19.10, "2014-07-16")
+    #    vaf.addDividend(14.61, "2014-10-17")
+    #    vaf.addDividend(16.85, "2015-01-19")
+    #    vaf.addDividend(13.97, "2015-04-20")
+    #    vaf.addDividend(28.10, "2015-07-16")
+    #    vaf.addDividend(42.88, "2015-10-19")
+    #    vaf.addDividend(40.18, "2016-01-19")
+    #    vaf.addDividend(35.02, "2016-04-19")
+    #    vaf.addDividend(78.50, "2016-07-18")
+    #    vaf.addDividend(35.35, "2016-10-19")
+    #    
+    #    vap.addDividend(14.63, "2015-04-20")
+    #    vap.addDividend(56.19, "2015-07-16")
+    #    vap.addDividend(25.04, "2015-10-19")
+    #    vap.addDividend(53.65, "2016-01-19")
+    #    vap.addDividend(27.02, "2016-04-19")
+    #    vap.addDividend(68.13, "2016-07-18")
+    #    vap.addDividend(27.07, "2016-10-19")
+    #    
+    #    vas.addDividend(56.65, "2014-10-17")
+    #    vas.addDividend(54.51, "2015-01-19")
+    #    vas.addDividend(62.95, "2015-04-20")
+    #    vas.addDividend(61.32, "2015-07-16")
+    #    vas.addDividend(121.75, "2015-10-19")
+    #    vas.addDividend(142.11, "2016-01-19")
+    #    vas.addDividend(112.61, "2016-04-19")
+    #    vas.addDividend(24.22, "2016-07-18")
+    #    vas.addDividend(137.72, "2016-10-19")
+    #    
+    #    veu.addDividend(25.88, "2014-07-17")
+    #    veu.addDividend(18.82, "2014-10-17")
+    #    veu.addDividend(28.34, "2015-01-19")
+    #    veu.addDividend(12.80, "2015-04-29")
+    #    veu.addDividend(45.71, "2015-07-28")
+    #    veu.addDividend(23.55, "2015-10-28")
+    #    veu.addDividend(36.34, "2016-01-25")
+    #    veu.addDividend(14.52, "2016-04-18")
+    #    veu.addDividend(52.75, "2016-07-14")
+    #    veu.addDividend(25.05, "2016-10-13")
+    #    
+    #    vgb.addDividend(24.42, "2014-07-16")
+    #    vgb.addDividend(11.40, "2014-10-17")
+    #    vgb.addDividend(35.16, "2015-01-19")
+    #    vgb.addDividend(33.83, "2015-04-20")
+    #    vgb.addDividend(36.84, "2015-07-16")
+    #    vgb.addDividend(31.40, "2015-10-19")
+    #    vgb.addDividend(34.17, "2016-01-19")
+    #    vgb.addDividend(35.35, "2016-04-19")
+    #    vgb.addDividend(34.87, "2016-07-18")
+    #    vgb.addDividend(32.41, "2016-10-19")
+    #    
+    #    ijr.addDividend(17.49, "2014-07-16")
+    #    ijr.addDividend(18.60, "2014-10-17")
+    #    ijr.addDividend(28.78, "2015-01-28")
+    #    ijr.addDividend(28.12, "2015-04-27")
+    #    ijr.addDividend(24.96, "2015-07-23")
+    #    ijr.addDividend(25.45, "2015-10-27")
+    #    ijr.addDividend(37.23, "2016-01-28")
+    #    ijr.addDividend(27.93, "2016-04-27")
+    #    ijr.addDividend(0, "2016-07-14")
+    #    ijr.addDividend(0, "2016-10-13")
     
-#    vgb.addDividend(100)
-#    vgb.removeDividend(100, "2016-12-05")
+    #    vgb.addDividend(100)
+    #    vgb.removeDividend(100, "2016-12-05")
     
     
-    myPortfolio.printPurchases()
-#    myPortfolio.printPurchases("VEU.AX", "2014-01-01", "2015-01-01")
-#    myPortfolio.printPurchases("VAF.AX")
-    print(myPortfolio)
-#    myPortfolio.printValues()
-    myPortfolio.valuePath(3000, False, 500)
+        myPortfolio.printPurchases()
+    #    myPortfolio.printPurchases("VEU.AX", "2014-01-01", "2015-01-01")
+    #    myPortfolio.printPurchases("VAF.AX")
+        print(myPortfolio)
+    #    myPortfolio.printValues()
+        print(myPortfolio.valuePath(3000, False, 500))
     
 
     
-#    print(veu.getOwned())
-#    print(veu.getPrice("2016-11-28"))
-#    print("VEU ${:.2f} ${:.2f}".format(veu.getValue("2016-11-29"), veu.totalCost))
-#    print("IJR ${:.2f} ${:.2f}".format(ijr.getValue("2016-11-29"), ijr.totalCost))
-#    print("VAP ${:.2f} ${:.2f}".format(vap.getValue("2016-11-29"), vap.totalCost))
-#    print(vap.getPriceRange("2015-02-26", "2016-01-19"))
-#    print(veu.getOwnedRange("2016-05-26"))
-#    print(vas.getValueRange("2014-05-12"))
-#    print(vas.getPriceRange("2014-05-12"))
-#    print(vas.getDividendRange("2014-01-01"))
-#    veu.plot("2014-03-01")
+    #    print(veu.getOwned())
+    #    print(veu.getPrice("2016-11-28"))
+    #    print("VEU ${:.2f} ${:.2f}".format(veu.getValue("2016-11-29"), veu.totalCost))
+    #    print("IJR ${:.2f} ${:.2f}".format(ijr.getValue("2016-11-29"), ijr.totalCost))
+    #    print("VAP ${:.2f} ${:.2f}".format(vap.getValue("2016-11-29"), vap.totalCost))
+    #    print(vap.getPriceRange("2015-02-26", "2016-01-19"))
+    #    print(veu.getOwnedRange("2016-05-26"))
+    #    print(vas.getValueRange("2014-05-12"))
+    #    print(vas.getPriceRange("2014-05-12"))
+    #    print(vas.getDividendRange("2014-01-01"))
+    #    veu.plot("2014-03-01")
 
-#    myPortfolio.plot([vas, ijr, vap], "2014-01-01")
-#    myPortfolio.plotPortfolio("2014-01-01")
+    #    myPortfolio.plot([vas, ijr, vap], "2014-01-01")
+    #    myPortfolio.plotPortfolio("2014-01-01")
     
-#    sqlQuery = '''SELECT * FROM {} 
-#    WHERE Stock_Code LIKE 'VGB.AX' 
-#    AND Date BETWEEN date("2014-01-01") AND date("2016-12-02")'''.format(SC.HISTORICAL_TABLE_NAME)
-#    print(myPortfolio.stockDatabase.readDatabase(sqlQuery))
+    #    sqlQuery = '''SELECT * FROM {} 
+    #    WHERE Stock_Code LIKE 'VGB.AX' 
+    #    AND Date BETWEEN date("2014-01-01") AND date("2016-12-02")'''.format(SC.HISTORICAL_TABLE_NAME)
+    #    print(myPortfolio.stockDatabase.readDatabase(sqlQuery))
     
 
-# The line below is just so we don't readd the data every time.
-finally:
-    print("\n")
-#    myPortfolio.stockDatabase.removeTable(SC.TABLE_NAME)
-#    myPortfolio.stockDatabase.clearTable(SC.DIVIDEND_TABLE_NAME)
-#    myPortfolio.stockDatabase.clearTable(SC.TABLE_NAME)
+    # The line below is just so we don't readd the data every time.
+    finally:
+        print("\n")
+    #    myPortfolio.stockDatabase.removeTable(SC.TABLE_NAME)
+    #    myPortfolio.stockDatabase.clearTable(SC.DIVIDEND_TABLE_NAME)
+    #    myPortfolio.stockDatabase.clearTable(SC.TABLE_NAME)
 
 
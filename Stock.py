@@ -49,6 +49,54 @@ Modified 02/12/2016:
 Modified 05/12/2016:
     * Added getDividendRange() method.
     * Updated plot() method to include plotting dividends.
+Modified 18/10/2026:
+    * Stock code and date lookups compare with = rather than LIKE so that the
+    (Stock_Code, Date) indexes can be used.
+    * getOwnedRange(), getSpentRange() and getDividendRange() now compute a
+    cumulative sum over the transactions and align it to the price dates with
+    an as-of lookup, instead of the quadratic LEFT OUTER JOIN ... GROUP BY.
+    * Added getTimeSeries() method which returns the price, owned, spent, value
+    and dividend series in one dataframe. getValueRange() and plot() now use it.
+    * numberOwned, totalCost and totalDividend are now read from the database
+    the first time they are used rather than in the constructor, and kept up
+    to date by buy(), sell(), remove(), addDividend() and removeDividend().
+    * Added refresh() method and a refresh argument to the constructor, so that
+    the price data download can be skipped when the stock is created.
+    * Added getPriceAsOf() method which gets the latest price on or before a date.
+    * getPrice(), getPriceAsOf() and getPriceRange() results are kept in the
+    database's price cache (see priceCache.py).
+    * getPriceRange() reads from the columnar price store (see columnarStore.py)
+    when it has been created.
+    * plot() draws with reportRenderer.drawStock(). Added render() method which
+    saves the plot to a PNG, SVG or HTML file without a display.
+    * All queries pass the stock code, dates and amounts as parameters rather
+    than formatting them into the sql, so their compiled statements are reused
+    and codes read from files can't change the query. getOwned(), getSpent()
+    and getDividend() return 0 when there are no transactions.
+    * Public methods are recorded as spans by instrumentation.py when
+    profiling is turned on.
+    * buy(), sell(), remove(), addDividend() and removeDividend() update the
+    stock's dailyHoldings snapshots from the transaction date onwards, in the
+    same transaction as the change. getTimeSeries() and the get*Range() methods read from the snapshots
+    instead of summing the transactions on every call.
+    * Added a currency argument to the constructor and a currency property
+    (see fxRates.py). getValue(), getPriceRange(), getTimeSeries() and the
+    get*Range() methods take an optional baseCurrency to convert the amounts
+    into.
+    * Added addSplit(), removeSplit(), addDrp() and removeDrp() methods for
+    splits and dividend reinvestment plan allotments (see corporateActions.py),
+    instead of entering them as free purchases. getPriceRange(), getTimeSeries()
+    and the get*Range() methods give split adjusted prices and shares, and
+    getOwned() and numberOwned count shares bought before a split as the
+    shares they became.
+    * Added getTaxLots() and getCostBase() methods which match sales to the
+    lots they were sold from (see taxLots.py). sell() takes an optional list of
+    the lots to sell, for specific identification. sell(), remove() and
+    removeDrp() match every sale of the stock to lots before committing, and
+    roll back if a sale would be for more shares than were owned on its date.
+    * totalCost is now the cost base of the shares still owned, from the lots
+    left after the sales are matched to lots, rather than the amount spent on
+    purchases less the amount received from sales.
         
     
 """
@@ -56,6 +104,15 @@ import datetime
 import pandas as pd
 import stockContract as SC
 import stockDownloader as downloader
+import priceCache
+from priceCache import getPriceCache
+import columnarStore
+import reportRenderer
+import instrumentation
+import holdingsTable
+import fxRates
+import corporateActions
+import taxLots
 import seaborn as sns
 import matplotlib.pyplot as plt
 import urllib.request
@@ -81,346 +138,467 @@ def convertDate(date):
 #               stockCode
 #               dataBase
 #               totalDividend
+@instrumentation.traceMethods
 class Stock:
-    numberOwned = 0
-    totalCost = 0
-    totalDividend = 0
-      
     # Class initializer
-    def __init__(self, stockCode, database):
+    # If refresh is True any new price data is downloaded straight away,
+    # otherwise it is only downloaded when refresh() is called.
+    # currency is the currency the stock is priced in. If None the currency
+    # already stored for the stock is used (fxRates.DEFAULT_CURRENCY if none is).
+    def __init__(self, stockCode, database, refresh = True, currency = None):
       self.stockCode = stockCode
       self.database = database
-      # Updates the database with any price data that it does not have.
-      try:
-          downloader.updateStockData(self.stockCode, self.database)
-      except urllib.request.URLError:
-          print("{} data not updated. URL Error.".format(self.stockCode))
-              
-      # Updates the numberOwned, totalCost and totalDividend values
-      numOwned = self.getOwned()
-      if numOwned != None:
-          self.numberOwned = numOwned
-      amountSpent = self.getSpent()
-      if amountSpent != None:
-          self.totalCost = amountSpent
-      dividend = self.getDividend()
-      if dividend != None:
-          self.totalDividend = dividend
+      self._currency = currency
+      if currency is not None:
+          fxRates.setCurrency(database, stockCode, currency)
+      # numberOwned, totalCost and totalDividend are read from the database the
+      # first time one of them is used (see _getTotals()).
+      self._totals = None
+      if refresh:
+          self.refresh()
+          
+          
+    # Updates the database with any price data that it does not have.
+    def refresh(self, priceSource = None):
+        try:
+            return downloader.updateStockData(self.stockCode, self.database, priceSource)
+        except urllib.request.URLError:
+            print("{} data not updated. URL Error.".format(self.stockCode))
+            
+            
+    # Gets the dictionary holding numberOwned, totalCost and totalDividend,
+    # reading them from the database if they haven't been yet. numberOwned
+    # counts shares bought before a split as the shares they became. totalCost
+    # is None until it is first used (see the totalCost property).
+    def _getTotals(self):
+        if self._totals is None:
+            sqlQuery = '''SELECT SUM({}) AS {} FROM {}
+                WHERE {} = ?
+                AND {} <= date(?)''' \
+                .format(SC.DIVIDEND_AMOUNT, SC.DIVIDEND_TOTAL, SC.DIVIDEND_TABLE_NAME,
+                        SC.DIVIDEND_CODE, SC.DIVIDEND_DATE)
+            dividends = self.database.readDatabase(sqlQuery, (self.stockCode, DEFAULT_DATE)).fillna(0)
+            self._totals = {"numberOwned": corporateActions.getOwned(self.database, self.stockCode, DEFAULT_DATE),
+                            "totalCost": None,
+                            "totalDividend": dividends[SC.DIVIDEND_TOTAL].iloc[0]}
+        return self._totals
+        
+        
+    # Adds to the cached totals after a transaction has been written to the
+    # database. If the totals haven't been read yet there is nothing to update,
+    # they will include the transaction when they are read.
+    def adjustTotals(self, numberOwned = 0, totalDividend = 0):
+        if self._totals is not None:
+            self._totals["numberOwned"] += numberOwned
+            self._totals["totalDividend"] += totalDividend
+            
+            
+    # Forgets the cached cost base after a purchase or sale has been written to
+    # the database. Any change can alter which lots earlier sales were matched
+    # to, so the cost base is worked out again the next time it is used.
+    def invalidateCost(self):
+        if self._totals is not None:
+            self._totals["totalCost"] = None
+            
+            
+    # Forgets the cached totals so that they are read from the database again
+    # the next time they are used.
+    def invalidateTotals(self):
+        self._totals = None
+        
+        
+    @property
+    def currency(self):
+        if self._currency is None:
+            self._currency = fxRates.getCurrencies(self.database, [self.stockCode]).iloc[0]
+        return self._currency
+        
+    @property
+    def numberOwned(self):
+        return self._getTotals()["numberOwned"]
+    
+    @numberOwned.setter
+    def numberOwned(self, value):
+        self._getTotals()["numberOwned"] = value
+        
+    # Cost base of the shares still owned, the cost of the lots left once the
+    # sales have been matched to lots (by the lots chosen when they were sold,
+    # otherwise first in first out, see taxLots.py).
+    @property
+    def totalCost(self):
+        totals = self._getTotals()
+        if totals["totalCost"] is None:
+            totals["totalCost"] = taxLots.getCostBase(self.database, [self.stockCode], taxLots.SPECIFIC,
+                                                      DEFAULT_DATE).iloc[0]
+        return totals["totalCost"]
+    
+    @totalCost.setter
+    def totalCost(self, value):
+        self._getTotals()["totalCost"] = value
+        
+    @property
+    def totalDividend(self):
+        return self._getTotals()["totalDividend"]
+    
+    @totalDividend.setter
+    def totalDividend(self, value):
+        self._getTotals()["totalDividend"] = value
     
       
     # Class string method
     def __str__(self):
+         # Split adjusted share counts are floats, but are usually whole numbers
+         numberOwned = self.numberOwned
+         if float(numberOwned).is_integer():
+             numberOwned = int(numberOwned)
          return "{} - number owned: {}, total cost: ${:.2f}, total dividend: ${:.2f}." \
-                .format(self.stockCode, self.numberOwned, self.totalCost, self.totalDividend)
+                .format(self.stockCode, numberOwned, self.totalCost, self.totalDividend)
 
     
     # Buy a number of stocks at a price and save in the database     
     def buy(self, numberBought, price, date = DEFAULT_DATE):
-        self.numberOwned += numberBought
-        self.totalCost += numberBought*price
         purchaseData = pd.DataFrame({SC.CODE: [self.stockCode],
                                      SC.DATE: [date],
                                      SC.NUMBER_PURCHASED: [numberBought],
                                      SC.PRICE: [price],
                                      SC.COST: [price*numberBought]})
-        self.database.addToDatabase(purchaseData, SC.TABLE_NAME)
+        with self.database.transaction():
+            self.database.addToDatabase(purchaseData, SC.TABLE_NAME)
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(numberBought*self._getShareRatio(date))
+        self.invalidateCost()
     
         
-    # Sell a number of stocks at a price and save in the database     
-    def sell(self, numberSold, price, date = DEFAULT_DATE):
-        self.numberOwned -= numberSold
-        if self.numberOwned < 0:
-            self.numberOwned += numberSold      # Not sure if this is necessary
+    # Sell a number of stocks at a price and save in the database
+    # lots is an optional list of (purchase date, purchase price, number sold)
+    # of the parcels the shares are sold from, which is used as the cost base
+    # by the specific identification method (see taxLots.py).
+    # Raises a ValueError, and saves nothing, if on date or any later sale
+    # more shares would be sold than were owned, or a lot doesn't have the
+    # shares chosen from it left.
+    def sell(self, numberSold, price, date = DEFAULT_DATE, lots = None):
+        if self.numberOwned - numberSold*self._getShareRatio(date) < 0:
             raise ValueError("Can't sell more shares than you own.")
-        self.totalCost -= numberSold*price
+        if lots is not None and sum(number for lotDate, lotPrice, number in lots) != numberSold:
+            raise ValueError("Number of shares sold from lots must equal numberSold.")
         purchaseData = pd.DataFrame({SC.CODE: [self.stockCode],
                                      SC.DATE: [date],
                                      SC.NUMBER_PURCHASED: [-numberSold],
                                      SC.PRICE: [price],
                                      SC.COST: [-price*numberSold]})
-        self.database.addToDatabase(purchaseData, SC.TABLE_NAME)
+        with self.database.transaction():
+            self.database.addToDatabase(purchaseData, SC.TABLE_NAME)
+            if lots is not None:
+                # The lots are linked to the sale by its rowid
+                saleId = self.database.readValue("SELECT last_insert_rowid()")
+                lotData = pd.DataFrame([(self.stockCode, saleId, date, lotDate, lotPrice, number)
+                                        for lotDate, lotPrice, number in lots],
+                                       columns = SC.LOT_COLUMNS)
+                self.database.addToDatabase(lotData, SC.LOT_TABLE_NAME)
+            # A back dated sale can leave a later sale short of shares, and the
+            # chosen lots must have the shares left, so match every sale
+            # before committing
+            taxLots.checkSales(self.database, [self.stockCode])
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(-numberSold*self._getShareRatio(date))
+        self.invalidateCost()
     
         
     # Update a data input, incase of input error. 
     # numberBought is a negative number if its a sale we wish to reverse
     def remove(self, numberBought, price, date):
-        self.numberOwned -= numberBought
-        self.totalCost -= numberBought*price
-        sqlCommand = '''DELETE FROM {} 
-            WHERE {} LIKE '{}'
-            AND {} == {}
-            AND {} == {}
-            AND {} == date("{}")''' \
-            .format(SC.TABLE_NAME, 
-                    SC.CODE, self.stockCode,
-                    SC.NUMBER_PURCHASED, numberBought,
-                    SC.PRICE, price,
-                    SC.DATE, date)
-        rowsRemoved = self.database.executeCommand(sqlCommand)
-        
-        # Check whether the data removal was succesful. If not, user most likely
-        # made an input error, so throw a ValueError so they know about it.
-        if rowsRemoved == 0:
-            self.numberOwned += numberBought
-            self.totalCost += numberBought*price
-            raise ValueError("Purchase of {} shares for ${} on {} was not in database".format(numberBought, price, date))
+        conditions = '''WHERE {} = ?
+            AND {} == ?
+            AND {} == ?
+            AND {} == date(?)''' \
+            .format(SC.CODE, SC.NUMBER_PURCHASED, SC.PRICE, SC.DATE)
+        # Remove the lots chosen for the sales being removed, but not those of
+        # any other sales on the same date
+        lotCommand = '''DELETE FROM {} WHERE {} IN (SELECT rowid FROM {} {})''' \
+            .format(SC.LOT_TABLE_NAME, SC.LOT_SALE_ID, SC.TABLE_NAME, conditions)
+        sqlCommand = '''DELETE FROM {} {}'''.format(SC.TABLE_NAME, conditions)
+        with self.database.transaction():
+            self.database.executeCommand(lotCommand, (self.stockCode, numberBought, price, date))
+            rowsRemoved = self.database.executeCommand(sqlCommand, (self.stockCode, numberBought, price, date))
+            
+            # Check whether the data removal was succesful. If not, user most likely
+            # made an input error, so throw a ValueError so they know about it.
+            if rowsRemoved == 0:
+                raise ValueError("Purchase of {} shares for ${} on {} was not in database".format(numberBought, price, date))
+            # Removing a purchase can leave a later sale short of shares
+            taxLots.checkSales(self.database, [self.stockCode])
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(-numberBought*rowsRemoved*self._getShareRatio(date))
+        self.invalidateCost()
         
     
     # Adds a dividend payment to the dividend database table
     def addDividend(self, payment, date = DEFAULT_DATE):
-        self.totalDividend += payment
         dividendData = pd.DataFrame({SC.DIVIDEND_CODE: [self.stockCode],
                                      SC.DIVIDEND_DATE: [date],
                                      SC.DIVIDEND_AMOUNT: [payment]})
-        self.database.addToDatabase(dividendData, SC.DIVIDEND_TABLE_NAME)        
+        with self.database.transaction():
+            self.database.addToDatabase(dividendData, SC.DIVIDEND_TABLE_NAME)
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(totalDividend = payment)
     
         
     # Removes a divident payment from the dividend database table
     def removeDividend(self, payment, date):
-        self.totalDividend -= payment
         sqlCommand = '''DELETE FROM {} 
-            WHERE {} LIKE '{}'
-            AND {} == {}
-            AND {} == date("{}")''' \
-            .format(SC.DIVIDEND_TABLE_NAME, 
-                    SC.DIVIDEND_CODE, self.stockCode,
-                    SC.DIVIDEND_AMOUNT, payment,
-                    SC.DIVIDEND_DATE, date)
-        rowsRemoved = self.database.executeCommand(sqlCommand)
-        
-        # Check whether the data removal was succesful. If not, user most likely
-        # made an input error, so throw a ValueError so they know about it.
-        if rowsRemoved == 0:
-            self.totalDividend += payment
-            raise ValueError("Dividend payment of ${} was not in database".format(payment, date))
+            WHERE {} = ?
+            AND {} == ?
+            AND {} == date(?)''' \
+            .format(SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_CODE, SC.DIVIDEND_AMOUNT, SC.DIVIDEND_DATE)
+        with self.database.transaction():
+            rowsRemoved = self.database.executeCommand(sqlCommand, (self.stockCode, payment, date))
+            
+            # Check whether the data removal was succesful. If not, user most likely
+            # made an input error, so throw a ValueError so they know about it.
+            if rowsRemoved == 0:
+                raise ValueError("Dividend payment of ${} was not in database".format(payment, date))
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(totalDividend = -payment*rowsRemoved)
+        
+        
+    # Gets the number of shares that one share bought on date has become today
+    def _getShareRatio(self, date):
+        return corporateActions.getShareRatio(self.database, self.stockCode, date, DEFAULT_DATE)
+        
+        
+    # Adds a split on date, where every share held before date becomes ratio
+    # shares, e.g. 2 for a 2 for 1 split or 1.1 for a 1 for 10 bonus issue.
+    # Prices and holdings before date are adjusted, so all of the stock's
+    # snapshots are recomputed.
+    def addSplit(self, ratio, date = DEFAULT_DATE):
+        with self.database.transaction():
+            corporateActions.addSplit(self.database, self.stockCode, ratio, date)
+            self._updateSplits()
+            
+            
+    # Removes a split, incase of input error.
+    def removeSplit(self, ratio, date):
+        with self.database.transaction():
+            corporateActions.removeSplit(self.database, self.stockCode, ratio, date)
+            self._updateSplits()
+            
+            
+    # Clears the cached prices and splits of the stock and recomputes its
+    # snapshots and totals after the splits have changed.
+    def _updateSplits(self):
+        getPriceCache(self.database).invalidate(self.stockCode)
+        holdingsTable.update(self.database, self.stockCode, SC.HOLDINGS_START_DATE)
+        self.invalidateTotals()
+        
+        
+    # Adds a dividend reinvestment plan allotment of numberAllotted shares at
+    # price on date, paid for with a dividend of payment. Saved as a dividend
+    # payment and a purchase linked to the allotment.
+    def addDrp(self, payment, numberAllotted, price, date = DEFAULT_DATE):
+        with self.database.transaction():
+            corporateActions.addDrp(self.database, self.stockCode, payment, numberAllotted, price, date)
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(numberAllotted*self._getShareRatio(date), payment)
+        self.invalidateCost()
+        
+        
+    # Removes a dividend reinvestment plan allotment, and its dividend payment
+    # and purchase, incase of input error.
+    def removeDrp(self, payment, numberAllotted, price, date):
+        with self.database.transaction():
+            corporateActions.removeDrp(self.database, self.stockCode, payment, numberAllotted, price, date)
+            taxLots.checkSales(self.database, [self.stockCode])
+            holdingsTable.update(self.database, self.stockCode, date)
+        self.adjustTotals(-numberAllotted*self._getShareRatio(date), -payment)
+        self.invalidateCost()
     
     
     # Get the number of the stock owned at date. Default date is today.
+    # Shares bought before a split are counted as the shares they became.
     def getOwned(self, date = DEFAULT_DATE):
-        sqlQuery = '''SELECT SUM({}) AS {} FROM {} 
-            WHERE {} LIKE '{}' 
-            AND {} <= date("{}")''' \
-            .format(SC.NUMBER_PURCHASED, SC.TOTAL_OWNED, SC.TABLE_NAME, 
-                    SC.CODE, self.stockCode, 
-                    SC.DATE, date)
-        data = self.database.readDatabase(sqlQuery)
-        # If data is empty return 0
-        if data.empty:
-            print('No data for dates up to {}.'.format(date))
-            return 0
-        return data.get_value(0, SC.TOTAL_OWNED)
+        return corporateActions.getOwned(self.database, self.stockCode, date)
         
     
     # Get the number of the stock owned at date. Default date is today.
     def getSpent(self, date = DEFAULT_DATE):
-        sqlQuery = '''SELECT SUM({}) AS {} FROM {} 
-            WHERE {} LIKE '{}' 
-            AND {} <= date("{}")''' \
-            .format(SC.COST, SC.TOTAL_SPENT, SC.TABLE_NAME, 
-                    SC.CODE, self.stockCode, 
-                    SC.DATE, date)
-        data = self.database.readDatabase(sqlQuery)
-        # If data is empty return 0
-        if data.empty:
-            print('No data for dates up to {}.'.format(date))
-            return 0
-        return data.get_value(0, SC.TOTAL_SPENT)
+        sqlQuery = '''SELECT SUM({}) FROM {} 
+            WHERE {} = ? 
+            AND {} <= date(?)''' \
+            .format(SC.COST, SC.TABLE_NAME, SC.CODE, SC.DATE)
+        # If there are no purchases up to date return 0
+        return self.database.readValue(sqlQuery, (self.stockCode, date), 0)
     
     
     # Get the price of the stock at date. Default date is today.
     def getPrice(self, date = DEFAULT_DATE):
+        cache = getPriceCache(self.database)
+        price = cache.get((priceCache.PRICE, self.stockCode, date))
+        if price is not None:
+            return price
         sqlQuery = ''' SELECT {} FROM {}
-            WHERE {} LIKE '{}'
-            AND {} LIKE '{}' ''' \
-            .format(SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME, 
-                    SC.HISTORICAL_CODE, self.stockCode, 
-                    SC.HISTORICAL_DATE, date)
-        data = self.database.readDatabase(sqlQuery)
-        # If data is empty raise ValueError
-        if data.empty:
+            WHERE {} = ?
+            AND {} = date(?) ''' \
+            .format(SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, SC.HISTORICAL_DATE)
+        price = self.database.readValue(sqlQuery, (self.stockCode, date))
+        # If there is no price raise ValueError
+        if price is None:
             raise ValueError(('No price data for {}.'.format(date)))
-        return data.get_value(0, SC.HISTORICAL_PRICE)
+        cache.put((priceCache.PRICE, self.stockCode, date), price)
+        return price
 
         
+    # Get the price of the stock on the latest date on or before date that there
+    # is price data for, e.g. the last trading day before a weekend or holiday.
+    def getPriceAsOf(self, date = DEFAULT_DATE):
+        cache = getPriceCache(self.database)
+        price = cache.get((priceCache.PRICE_AS_OF, self.stockCode, date))
+        if price is not None:
+            return price
+        sqlQuery = ''' SELECT {} FROM {}
+            WHERE {} = ?
+            AND {} <= date(?)
+            ORDER BY {} DESC LIMIT 1''' \
+            .format(SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME,
+                    SC.HISTORICAL_CODE, SC.HISTORICAL_DATE, SC.HISTORICAL_DATE)
+        price = self.database.readValue(sqlQuery, (self.stockCode, date))
+        # If there is no price raise ValueError
+        if price is None:
+            raise ValueError(('No price data on or before {}.'.format(date)))
+        cache.put((priceCache.PRICE_AS_OF, self.stockCode, date), price)
+        return price
+        
+        
     # get the total value of the stock at date. Default date is today.
-    def getValue(self, date = DEFAULT_DATE):
-        return self.getOwned(date) * self.getPrice(date)
+    # If baseCurrency is given the value is converted into it.
+    def getValue(self, date = DEFAULT_DATE, baseCurrency = None):
+        value = self.getOwned(date) * self.getPrice(date)
+        if baseCurrency is not None:
+            value *= fxRates.getStockRates(self.database, [self.stockCode], baseCurrency, date)[0]
+        return value
         
     
     # Get the total amount of dividend payments at date.
     def getDividend(self, date = DEFAULT_DATE):
-        sqlQuery = ''' SELECT SUM({}) AS {} FROM {}
-            WHERE {} LIKE '{}'
-            AND {} <= date("{}") ''' \
-            .format(SC.DIVIDEND_AMOUNT, SC.DIVIDEND_TOTAL, SC.DIVIDEND_TABLE_NAME,
-                    SC.DIVIDEND_CODE, self.stockCode,
-                    SC.DIVIDEND_DATE, date)
-        data = self.database.readDatabase(sqlQuery)
-        # If data is empty return 0
+        sqlQuery = ''' SELECT SUM({}) FROM {}
+            WHERE {} = ?
+            AND {} <= date(?) ''' \
+            .format(SC.DIVIDEND_AMOUNT, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_CODE, SC.DIVIDEND_DATE)
+        # If there are no dividends up to date return 0
+        return self.database.readValue(sqlQuery, (self.stockCode, date), 0)
+
+
+    # Gets the TaxLots of the stock at date, with sales matched to the lots
+    # they were sold from by method, one of taxLots.METHODS.
+    def getTaxLots(self, method = taxLots.FIFO, date = DEFAULT_DATE):
+        return taxLots.getTaxLots(self.database, [self.stockCode], method, date)
+
+
+    # Gets the cost base of the shares still owned at date, the cost of the
+    # lots left after the sales are matched to lots by method.
+    def getCostBase(self, date = DEFAULT_DATE, method = taxLots.FIFO):
+        return taxLots.getCostBase(self.database, [self.stockCode], method, date).iloc[0]
+
+
+    # Get a data fram containing the price of the stock over a range of dates    
+    # adjusted for splits. If baseCurrency is given the prices are converted
+    # into it at the rate on each date.
+    def getPriceRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE, baseCurrency = None):
+        data = self._getPriceRange(startDate, endDate)
+        if baseCurrency is not None and baseCurrency != self.currency:
+            data[SC.HISTORICAL_PRICE] *= fxRates.getRatesAsOf(self.database, self.currency, baseCurrency,
+                                                              data[SC.HISTORICAL_DATE].to_numpy())
+        return data
+        
+        
+    # Gets the price range in the stock's own currency, from the price cache if
+    # it is there.
+    def _getPriceRange(self, startDate, endDate):
+        cache = getPriceCache(self.database)
+        data = cache.get((priceCache.RANGE, self.stockCode, startDate, endDate))
+        # Return a copy so that callers can add columns without changing the cache
+        if data is not None:
+            return data.copy()
+        # Read from the columnar price store if it has this stock
+        arrays = columnarStore.getPriceArrays(self.database, self.stockCode, startDate, endDate)
+        if arrays is not None:
+            dates, prices = arrays
+            data = pd.DataFrame({SC.HISTORICAL_DATE: columnarStore.toDateStrings(dates),
+                                 SC.HISTORICAL_PRICE: prices},
+                                columns = [SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE])
+        else:
+            data = self._readPriceRange(startDate, endDate)
+        # If data is empty raise ValueError
         if data.empty:
-            print(('No dividend data for {}.'.format(date)))
-            return 0
-        return data.get_value(0, SC.DIVIDEND_TOTAL)
+            raise ValueError(('No price data in the range {} - {}.'.format(startDate, endDate)))
+        # The split adjusted prices are what is cached
+        data[SC.HISTORICAL_PRICE] = corporateActions.adjustPrices(self.database, self.stockCode,
+                                                                  data[SC.HISTORICAL_DATE], data[SC.HISTORICAL_PRICE])
+        cache.put((priceCache.RANGE, self.stockCode, startDate, endDate), data)
+        return data.copy()
         
         
-    # Get a data fram containing the price of the stock over a range of dates    
-    def getPriceRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
+    # Reads the price of the stock over a range of dates from the database
+    def _readPriceRange(self, startDate, endDate):
         sqlQuery = ''' SELECT {}, {} FROM {}
-            WHERE {} LIKE '{}'
-            AND {} BETWEEN date("{}") AND date("{}") 
+            WHERE {} = ?
+            AND {} BETWEEN date(?) AND date(?) 
             ORDER BY {} ASC''' \
             .format(SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME, 
-                    SC.HISTORICAL_CODE, self.stockCode, 
-                    SC.HISTORICAL_DATE, startDate, endDate,
-                    SC.HISTORICAL_DATE)
-        data = self.database.readDatabase(sqlQuery)
-        # If data is empty raise ValueError
-        if data.empty:
-            raise ValueError(('No price data in the range {} - {}.'.format(startDate, endDate)))
-        return data
+                    SC.HISTORICAL_CODE, SC.HISTORICAL_DATE, SC.HISTORICAL_DATE)
+        return self.database.readDatabase(sqlQuery, (self.stockCode, startDate, endDate),
+                                          {SC.HISTORICAL_PRICE: float})
         
     
     # Gets a dataframe containing the number of shares owned over a range of dates    
     def getOwnedRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
-        # Perform a left outer join to get the total number of stocks owned at each
-        # date in the historical data table.
-        sqlQuery = ''' SELECT {}.{}, SUM({}.{}) AS {}, MAX({}.{}) AS {} FROM {}   
-            LEFT OUTER JOIN {} ON {}.{} >= {}.{}
-            AND {}.{} == {}.{}
-            WHERE {}.{} LIKE '{}' 
-            AND {} BETWEEN date("{}") AND date("{}")
-            GROUP BY {} ORDER BY {} ASC''' \
-            .format(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE, 
-                    SC.TABLE_NAME, SC.NUMBER_PURCHASED, SC.TOTAL_OWNED, 
-                    SC.TABLE_NAME, SC.DATE, SC.DATE,
-                    SC.HISTORICAL_TABLE_NAME, 
-                    SC.TABLE_NAME, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE, SC.TABLE_NAME, SC.DATE,
-                    SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, SC.TABLE_NAME, SC.CODE,
-                    SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, self.stockCode,
-                    SC.HISTORICAL_DATE, startDate, endDate,
-                    SC.HISTORICAL_DATE, SC.HISTORICAL_DATE)
-
-        data = self.database.readDatabase(sqlQuery)
-        # Remove the unwanted Purchase_Date column
-        data = data.drop(SC.DATE, 1)
-        # For any dates before the first purchase, set the number owned to 0.
-        data = data.fillna(0)
-        return data
+        data = self.getTimeSeries(startDate, endDate)
+        return data[[SC.HISTORICAL_DATE, SC.TOTAL_OWNED]]
         
         
    # Gets a dataframe containing the total spend on the shares owned over a range of dates    
-    def getSpentRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
-        # Perform a left outer join to get the total number of stocks owned at each
-        # date in the historical data table.
-        sqlQuery = ''' SELECT {}.{}, SUM({}.{}) AS {}, MAX({}.{}) AS {} FROM {}   
-            LEFT OUTER JOIN {} ON {}.{} >= {}.{}
-            AND {}.{} == {}.{}
-            WHERE {}.{} LIKE '{}' 
-            AND {} BETWEEN date("{}") AND date("{}")
-            GROUP BY {} ORDER BY {} ASC''' \
-            .format(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE, 
-                    SC.TABLE_NAME, SC.COST, SC.TOTAL_SPENT, 
-                    SC.TABLE_NAME, SC.DATE, SC.DATE,
-                    SC.HISTORICAL_TABLE_NAME, 
-                    SC.TABLE_NAME, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE, SC.TABLE_NAME, SC.DATE,
-                    SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, SC.TABLE_NAME, SC.CODE,
-                    SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, self.stockCode,
-                    SC.HISTORICAL_DATE, startDate, endDate,
-                    SC.HISTORICAL_DATE, SC.HISTORICAL_DATE)
-
-        data = self.database.readDatabase(sqlQuery)
-        # Remove the unwanted Purchase_Date column
-        data = data.drop(SC.DATE, 1)
-        # For any dates before the first purchase, set the number owned to 0.
-        data = data.fillna(0)
-        return data
+    def getSpentRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE, baseCurrency = None):
+        data = self.getTimeSeries(startDate, endDate, baseCurrency)
+        return data[[SC.HISTORICAL_DATE, SC.TOTAL_SPENT]]
         
         
     # Get a dataframe containing the total value of the stock over a range of dates
-    def getValueRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
-        data = pd.merge(self.getPriceRange(startDate, endDate), self.getOwnedRange(startDate, endDate), on=SC.HISTORICAL_DATE)
-        # Add a column for the total value of the stock
-        data['Total_Value'] = data[SC.HISTORICAL_PRICE] * data[SC.TOTAL_OWNED]
-        # For any dates before the first purchase, set the total value to 0.
-        data = data.fillna(0)
-        # Remove the price and number owned columns
-        data = data.drop([SC.HISTORICAL_PRICE, SC.TOTAL_OWNED], 1)
-        return data
+    def getValueRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE, baseCurrency = None):
+        data = self.getTimeSeries(startDate, endDate, baseCurrency)
+        return data[[SC.HISTORICAL_DATE, SC.TOTAL_VALUE]]
         
 
     # Gets a dataframe containing the total amount of dividen income over a range of dates    
-    def getDividendRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
-        # Perform a left outer join to get the total number of stocks owned at each
-        # date in the historical data table.
-        sqlQuery = ''' SELECT {}.{}, SUM({}.{}) AS {}, MAX({}.{}) AS {} FROM {}   
-            LEFT OUTER JOIN {} ON {}.{} >= {}.{}
-            AND {}.{} == {}.{}
-            WHERE {}.{} LIKE '{}' 
-            AND {} BETWEEN date("{}") AND date("{}")
-            GROUP BY {} ORDER BY {} ASC''' \
-            .format(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE, 
-                    SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_AMOUNT, SC.DIVIDEND_TOTAL, 
-                    SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_DATE, SC.DIVIDEND_DATE,
-                    SC.HISTORICAL_TABLE_NAME, 
-                    SC.DIVIDEND_TABLE_NAME, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_DATE,
-                    SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_CODE,
-                    SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, self.stockCode,
-                    SC.HISTORICAL_DATE, startDate, endDate,
-                    SC.HISTORICAL_DATE, SC.HISTORICAL_DATE)
-
-        data = self.database.readDatabase(sqlQuery)
-        # Remove the unwanted Purchase_Date column
-        data = data.drop(SC.DIVIDEND_DATE, 1)
-        # For any dates before the first purchase, set the number owned to 0.
-        data = data.fillna(0)
+    def getDividendRange(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE, baseCurrency = None):
+        data = self.getTimeSeries(startDate, endDate, baseCurrency)
+        return data[[SC.HISTORICAL_DATE, SC.DIVIDEND_TOTAL]]
+        
+        
+    # Gets a dataframe containing, for every date with price data in the range,
+    # the price, number of shares owned, total spent, total dividends and total
+    # value. Read directly from the dailyHoldings snapshots (see holdingsTable.py).
+    # If baseCurrency is given the amounts are converted into it.
+    def getTimeSeries(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE, baseCurrency = None):
+        data = holdingsTable.getRange(self.database, self.stockCode, startDate, endDate, baseCurrency)
+        # If data is empty raise ValueError
+        if data.empty:
+            raise ValueError(('No price data in the range {} - {}.'.format(startDate, endDate)))
         return data
         
         
     # Plot stock data in a range of dates
     def plot(self, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
-        # Format data to be plotted
-        date = self.getValueRange(startDate, endDate)[SC.HISTORICAL_DATE].tolist()
-        date = list(map(convertDate, date))
-        value = self.getValueRange(startDate, endDate)["Total_Value"]
-        owned = self.getOwnedRange(startDate, endDate)[SC.TOTAL_OWNED]
-        price = self.getPriceRange(startDate, endDate)[SC.HISTORICAL_PRICE]
-        spent = self.getSpentRange(startDate, endDate)[SC.TOTAL_SPENT]
-        dividend = self.getDividendRange(startDate, endDate)[SC.DIVIDEND_TOTAL]
-
-        # Do plotting
+        data = self.getTimeSeries(startDate, endDate)
         fig = plt.figure()
-        plt.clf()  
-        
-        ax = fig.add_subplot(411)
-        plt.title(self.stockCode, fontsize = 16)
-        ax.plot(date, value)
-        ax.plot(date, spent, color = sns.color_palette()[1])
-        plt.ylabel("Amount ($)", fontsize = 14)
-        plt.legend(["Value", "Amount Spent"], loc = "upper left")
-        
-        sns.set_style("dark")
-        ax = fig.add_subplot(412)  
-        ax.plot(date, owned)
-        ax.set_ylabel("Number of shares owned", fontsize = 14, color = sns.color_palette()[0])
-        ax2 = ax.twinx()
-        ax2.plot(date, dividend, color = sns.color_palette()[1])
-        ax2.set_ylabel("Total Dividend ($)", fontsize = 14, color = sns.color_palette()[1])
-        ax2.xaxis.grid(True)
-        ax.xaxis.grid(True)
-        
-        sns.set_style("darkgrid")
-        ax = fig.add_subplot(413)
-        plt.plot(date, price)
-        plt.ylabel("Stock price ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(414)
-        plt.plot(date, value - spent)
-        plt.plot(date, value - spent + dividend)
-        plt.legend(["Share Profit", "Share Profit + Dividend"], loc = "upper left")
-        plt.ylabel("Profit ($)", fontsize = 14)
-        plt.xlabel("Date", fontsize = 14)
-        
+        plt.clf()
+        reportRenderer.drawStock(fig, self.stockCode, data)
         plt.show() 
 
+
+    # Renders the plot to filePath (a .png, .svg or .html file) without
+    # displaying it. Nothing is rendered if filePath already holds a plot of
+    # the same data. Returns True if the plot was rendered.
+    def render(self, filePath, startDate = DEFAULT_STARTDATE, endDate = DEFAULT_DATE):
+        return reportRenderer.render(filePath, "stock", self.stockCode, self.getTimeSeries(startDate, endDate))
+
         
         
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 backtester.py
+Created on Sun Oct 18 15:47:09 2026
+
+@author: dmcauslan
+
+Backtests value averaging strategies over the stored historical prices.
+Starting from a given date, a fixed contribution is invested every month (or
+quarter) using the same allocation as Portfolio.valuePath() (see
+rebalancer.py). Any cash that can't be invested is carried over to the next
+contribution.
+
+Only the contribution dates need to be stepped through in order, since each
+allocation depends on the holdings bought before it. The holdings, cash and
+value on every other date are then filled in with NumPy for all dates at once,
+so a 20 year backtest of 50 stocks only needs 240 rebalancing solves.
+
+runSweep() runs a backtest for each set of parameters in a grid, optionally
+spread over a pool of processes.
+"""
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import stockContract as SC
+import portfolioAggregator as aggregator
+import rebalancer
+import fxRates
+
+###############
+## Constants ##
+###############
+# Pandas period codes for the supported contribution frequencies
+FREQUENCIES = {"monthly": "M", "quarterly": "Q"}
+
+
+# The result of runBacktest(). Holds the value of the portfolio on every date
+# along with the trades made on each contribution date.
+class BacktestResult:
+    def __init__(self, codes, dates, prices, contributionRows, trades, fees, cashAfter, contribution):
+        self.codes = list(codes)
+        self.dates = dates
+        self.contributionDates = dates[contributionRows]
+        self.trades = trades
+        self.fees = fees
+        # Index of the latest contribution on or before each date, -1 before the first
+        latest = np.searchsorted(contributionRows, np.arange(len(dates)), side = "right") - 1
+        started = latest >= 0
+        self.holdings = np.where(started[:, None], np.cumsum(trades, axis = 0)[latest], 0)
+        self.cash = np.where(started, cashAfter[latest], 0)
+        self.contributed = np.where(started, contribution * (latest + 1), 0)
+        self.value = np.nansum(self.holdings * prices, axis = 1) + self.cash
+        self.tradeValues = trades * prices[contributionRows]
+        self.totalFees = fees.sum()
+        self.totalTraded = np.abs(self.tradeValues).sum()
+        # Total value traded as a fraction of the average portfolio value
+        averageValue = self.value[started].mean() if started.any() else 0
+        self.turnover = self.totalTraded / averageValue if averageValue > 0 else 0
+
+
+    # Gets the equity curve as a dataframe, with the same total columns as
+    # Portfolio.getSeries() plus the cash that hasn't been invested yet.
+    def toDataFrame(self):
+        return pd.DataFrame({SC.HISTORICAL_DATE: self.dates,
+                             SC.TOTAL_SPENT: self.contributed,
+                             SC.TOTAL_VALUE: self.value,
+                             "Cash_$": self.cash},
+                            columns = [SC.HISTORICAL_DATE, SC.TOTAL_SPENT, SC.TOTAL_VALUE, "Cash_$"])
+
+
+    # Class string method
+    def __str__(self):
+        return "Backtest from {} to {}: contributed ${:.2f}, final value ${:.2f}, fees ${:.2f}, turnover {:.2f}." \
+            .format(self.dates[0], self.dates[-1], self.contributed[-1], self.value[-1], self.totalFees, self.turnover)
+
+
+# Gets the rows of dates (a sorted array of "yyyy-mm-dd" strings) that are the
+# first trading day of each month or quarter.
+def getContributionRows(dates, frequency):
+    if frequency not in FREQUENCIES:
+        raise ValueError("Unknown contribution frequency {}. Must be one of {}.".format(frequency, ", ".join(FREQUENCIES)))
+    periods = pd.to_datetime(dates).to_period(FREQUENCIES[frequency]).to_numpy()
+    return np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+
+
+# Runs a backtest over the price matrix prices (len(dates) x len(codes), as
+# returned by portfolioAggregator.getPriceMatrix()).
+# params
+# weights - array of the desired fraction of the portfolio in each stock, summing to 1
+# contribution - the amount invested on each contribution date
+# frequency - "monthly" or "quarterly"
+# sellingAllowed, minimumTransaction, feeModel - as for rebalancer.solveRebalance()
+# startDate - the backtest starts at the first date on or after both startDate
+#   and the first date that every stock has a price.
+def runBacktest(codes, dates, prices, weights, contribution, frequency = "monthly", sellingAllowed = False,
+                minimumTransaction = 0, feeModel = None, startDate = None):
+    priced = np.flatnonzero(~np.isnan(prices).any(axis = 1))
+    if len(priced) == 0:
+        raise ValueError("There is no date on which every stock has a price.")
+    firstRow = priced[0]
+    if startDate is not None:
+        firstRow = max(firstRow, np.searchsorted(dates, startDate, side = "left"))
+    if firstRow >= len(dates):
+        raise ValueError("No price data on or after {}.".format(startDate))
+    dates = dates[firstRow:]
+    prices = prices[firstRow:]
+
+    contributionRows = getContributionRows(dates, frequency)
+    trades = np.zeros((len(contributionRows), len(codes)))
+    fees = np.zeros(len(contributionRows))
+    cashAfter = np.zeros(len(contributionRows))
+    holdings = np.zeros(len(codes))
+    cash = 0
+    for i, row in enumerate(contributionRows):
+        plan = rebalancer.solveRebalance(holdings, prices[row], weights, cash + contribution,
+                                         sellingAllowed, minimumTransaction, feeModel)
+        trades[i] = plan.trades
+        fees[i] = plan.totalFees
+        holdings = holdings + plan.trades
+        cash = plan.cashRemaining
+        cashAfter[i] = cash
+    return BacktestResult(codes, dates, prices, contributionRows, trades, fees, cashAfter, contribution)
+
+
+# Reads the price matrix of codes from database and runs a backtest over it.
+# If baseCurrency is given the prices are converted into it at the rate on each
+# date, so the contributions are in baseCurrency.
+# Takes the same keyword arguments as runBacktest().
+def backtestDatabase(database, codes, weights, contribution, startDate, endDate, baseCurrency = None, **kwargs):
+    dates, prices = aggregator.getPriceMatrix(database, codes, startDate, endDate)
+    if baseCurrency is not None:
+        prices = fxRates.convertMatrices(database, {SC.HOLDINGS_PRICE: prices}, dates,
+                                         fxRates.getCurrencies(database, codes).to_numpy(), baseCurrency)[SC.HOLDINGS_PRICE]
+    return runBacktest(codes, dates, prices, weights, contribution, startDate = startDate, **kwargs)
+
+
+# Runs one backtest of a parameter sweep. Defined at module level so that it
+# can be sent to a worker process.
+def _runParameters(arguments):
+    codes, dates, prices, parameters = arguments
+    return runBacktest(codes, dates, prices, **parameters)
+
+
+# Runs a backtest for each dictionary of runBacktest() keyword arguments in
+# parameterGrid and returns the list of BacktestResults in the same order.
+# With maxWorkers greater than 1 the backtests are run in a pool of processes.
+def runSweep(codes, dates, prices, parameterGrid, maxWorkers = 1):
+    arguments = [(codes, dates, prices, parameters) for parameters in parameterGrid]
+    if maxWorkers is not None and maxWorkers <= 1:
+        return [_runParameters(argument) for argument in arguments]
+    with ProcessPoolExecutor(max_workers = maxWorkers) as executor:
+        return list(executor.map(_runParameters, arguments))
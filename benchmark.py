@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 benchmark.py
+Created on Sun Oct 18 18:40:16 2026
+
+@author: dmcauslan
+
+Benchmarks the main Stock and Portfolio query paths against a synthetic
+database.
+
+generateDatabase() creates a database with the stockContract schema holding
+random walk prices for a number of made up stocks over a number of years of
+weekdays, along with regular purchases and dividends. runBenchmarks() then
+times each of the BENCHMARKS on it and the results are saved as JSON, along
+with the git commit and library versions, so results from different versions
+of the code can be compared with compareResults().
+
+The price cache is cleared before every call so the timings include the
+database reads.
+
+Usage:
+    python benchmark.py --stocks 20 --years 10 --output results.json
+    python benchmark.py --compare old.json new.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import stockContract as SC
+from PortfolioTracker import Portfolio
+from priceCache import getPriceCache
+import holdingsTable
+
+###############
+## Constants ##
+###############
+DATABASE_NAME = "benchmark"
+END_DATE = "2025-12-31"
+DEFAULT_REPEATS = 5
+# Names of the benchmarks and the function that runs each one. Each function
+# takes the portfolio and the first stock in it.
+BENCHMARKS = [("Stock.getOwnedRange", lambda portfolio, stock: stock.getOwnedRange()),
+              ("Stock.getValueRange", lambda portfolio, stock: stock.getValueRange()),
+              ("Portfolio.getValue", lambda portfolio, stock: portfolio.getValue(END_DATE)),
+              ("Portfolio.getSeries", lambda portfolio, stock: portfolio.getSeries()),
+              ("Portfolio.valuePath", lambda portfolio, stock: portfolio.valuePath(3000, False, 500))]
+
+
+# Fills the database of portfolio with synthetic data for numberOfStocks
+# stocks, with daily prices (on weekdays) for the given number of years up to
+# END_DATE, and purchases and dividends the given number of times per year.
+# Returns the list of stock codes.
+def generateDatabase(portfolio, numberOfStocks, years, purchasesPerYear, dividendsPerYear, seed = 0):
+    random = np.random.default_rng(seed)
+    end = pd.Timestamp(END_DATE)
+    dates = pd.bdate_range(end - pd.DateOffset(years = years), end)
+    dateStrings = dates.strftime("%Y-%m-%d").to_numpy()
+    codes = ["SYN{:03d}.AX".format(i) for i in range(numberOfStocks)]
+
+    # Geometric random walk prices starting between $10 and $100
+    returns = random.normal(0.0003, 0.01, (len(dates), numberOfStocks))
+    prices = np.round(random.uniform(10, 100, numberOfStocks) * np.exp(np.cumsum(returns, axis = 0)), 2)
+    priceData = pd.DataFrame({SC.HISTORICAL_CODE: np.tile(codes, len(dates)),
+                              SC.HISTORICAL_DATE: np.repeat(dateStrings, numberOfStocks),
+                              SC.HISTORICAL_PRICE: prices.ravel()},
+                             columns = SC.HISTORICAL_COLUMNS)
+
+    # Purchases and dividends spread evenly through the years
+    purchaseRows = np.linspace(0, len(dates) - 1, max(1, int(purchasesPerYear * years)), dtype = int)
+    numberBought = random.integers(1, 100, (len(purchaseRows), numberOfStocks))
+    purchasePrices = prices[purchaseRows]
+    purchaseData = pd.DataFrame({SC.CODE: np.tile(codes, len(purchaseRows)),
+                                 SC.DATE: np.repeat(dateStrings[purchaseRows], numberOfStocks),
+                                 SC.NUMBER_PURCHASED: numberBought.ravel(),
+                                 SC.PRICE: purchasePrices.ravel(),
+                                 SC.COST: (numberBought * purchasePrices).ravel()},
+                                columns = [SC.CODE, SC.DATE, SC.NUMBER_PURCHASED, SC.PRICE, SC.COST])
+    dividendRows = np.linspace(0, len(dates) - 1, max(1, int(dividendsPerYear * years)), dtype = int)
+    dividendData = pd.DataFrame({SC.DIVIDEND_CODE: np.tile(codes, len(dividendRows)),
+                                 SC.DIVIDEND_DATE: np.repeat(dateStrings[dividendRows], numberOfStocks),
+                                 SC.DIVIDEND_AMOUNT: np.round(random.uniform(10, 200, len(dividendRows) * numberOfStocks), 2)},
+                                columns = [SC.DIVIDEND_CODE, SC.DIVIDEND_DATE, SC.DIVIDEND_AMOUNT])
+
+    database = portfolio.stockDatabase
+    with database.transaction():
+        database.addToDatabase(priceData, SC.HISTORICAL_TABLE_NAME)
+        database.addToDatabase(purchaseData, SC.TABLE_NAME)
+        database.addToDatabase(dividendData, SC.DIVIDEND_TABLE_NAME)
+        holdingsTable.rebuild(database, codes)
+    return codes
+
+
+# Times function over a number of repeats, clearing the price cache of
+# database before each one. Returns a dictionary of timing statistics in seconds.
+def timeCall(function, database, repeats):
+    timings = []
+    for repeat in range(repeats):
+        getPriceCache(database).clear()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings),
+            "median": float(np.median(timings)),
+            "max": max(timings),
+            "repeats": repeats}
+
+
+# Gets the current git commit of the code, or None if it isn't in a git repository
+def getVersion():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr = subprocess.DEVNULL,
+                                       cwd = os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Generates a synthetic database in a temporary directory, runs every benchmark
+# on it and returns the results as a dictionary.
+def runBenchmarks(numberOfStocks = 20, years = 10, purchasesPerYear = 4, dividendsPerYear = 4,
+                  repeats = DEFAULT_REPEATS, seed = 0):
+    parameters = {"stocks": numberOfStocks, "years": years, "purchasesPerYear": purchasesPerYear,
+                  "dividendsPerYear": dividendsPerYear, "repeats": repeats, "seed": seed}
+    with tempfile.TemporaryDirectory() as directory:
+        portfolio = Portfolio(DATABASE_NAME, refresh = False, databaseDirectory = directory)
+        start = time.perf_counter()
+        codes = generateDatabase(portfolio, numberOfStocks, years, purchasesPerYear, dividendsPerYear, seed)
+        generateTime = time.perf_counter() - start
+        stocks = [portfolio.addStock(code, 100 / len(codes)) for code in codes]
+
+        timings = {}
+        for name, benchmark in BENCHMARKS:
+            timings[name] = timeCall(lambda: benchmark(portfolio, stocks[0]), portfolio.stockDatabase, repeats)
+            print("{:<25} median {:.4f}s".format(name, timings[name]["median"]))
+        portfolio.stockDatabase.close()
+
+    return {"version": getVersion(),
+            "timestamp": datetime.datetime.now().isoformat(timespec = "seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "parameters": parameters,
+            "generateSeconds": generateTime,
+            "results": timings}
+
+
+# Prints the median time of each benchmark in two results files and the ratio
+# of the new time to the old time.
+def compareResults(oldPath, newPath):
+    with open(oldPath) as oldFile:
+        old = json.load(oldFile)
+    with open(newPath) as newFile:
+        new = json.load(newFile)
+    print("{:<25} {:>10} {:>10} {:>8}".format("Benchmark", old["version"], new["version"], "Ratio"))
+    for name in new["results"]:
+        newTime = new["results"][name]["median"]
+        if name in old["results"]:
+            oldTime = old["results"][name]["median"]
+            print("{:<25} {:>9.4f}s {:>9.4f}s {:>7.2f}x".format(name, oldTime, newTime, newTime / oldTime))
+        else:
+            print("{:<25} {:>10} {:>9.4f}s".format(name, "-", newTime))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the Stock and Portfolio query paths.")
+    parser.add_argument("--stocks", type = int, default = 20)
+    parser.add_argument("--years", type = int, default = 10)
+    parser.add_argument("--purchases-per-year", type = float, default = 4)
+    parser.add_argument("--dividends-per-year", type = float, default = 4)
+    parser.add_argument("--repeats", type = int, default = DEFAULT_REPEATS)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--output", help = "JSON file to save the results to")
+    parser.add_argument("--compare", nargs = 2, metavar = ("OLD", "NEW"), help = "compare two results files")
+    arguments = parser.parse_args()
+
+    if arguments.compare:
+        compareResults(*arguments.compare)
+    else:
+        results = runBenchmarks(arguments.stocks, arguments.years, arguments.purchases_per_year,
+                                arguments.dividends_per_year, arguments.repeats, arguments.seed)
+        if arguments.output:
+            with open(arguments.output, "w") as outputFile:
+                json.dump(results, outputFile, indent = 2)
+            print("Results saved to {}".format(arguments.output))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 columnarStore.py
+Created on Sun Oct 18 13:48:26 2026
+
+@author: dmcauslan
+
+Optional columnar copy of the historical price table, for reading long price
+histories quickly (e.g. when backtesting). For each stock two .npy files are
+kept in a directory next to the database file:
+    <code>.dates.npy  - int32 day numbers (days since 1970-01-01), sorted
+    <code>.prices.npy - float64 prices
+The files are memory mapped when read, so getPriceArrays() returns views of
+the file without copying or parsing anything.
+
+The store is only used once it has been created with build(). After that
+stockDownloader.insertPrices(), which all price data is written through,
+rewrites a stock's files whenever it adds price data for it.
+"""
+import os
+import datetime
+import numpy as np
+import stockContract as SC
+
+###############
+## Constants ##
+###############
+STORE_EXTENSION = ".columns"
+EPOCH = datetime.date(1970, 1, 1)
+
+
+# Gets the directory the store for database is kept in, or None if the
+# database isn't a file.
+def getStorePath(database):
+    if database.databasePath == ":memory:":
+        return None
+    return database.databasePath + STORE_EXTENSION
+
+
+# Whether the store has been created for database.
+def isEnabled(database):
+    storePath = getStorePath(database)
+    return storePath is not None and os.path.isdir(storePath)
+
+
+# Converts a "yyyy-mm-dd" date to a day number
+def toDayNumber(date):
+    [year, month, day] = map(int, date.split("-"))
+    return (datetime.date(year, month, day) - EPOCH).days
+
+
+# Converts an array of day numbers to an array of "yyyy-mm-dd" strings
+def toDateStrings(dayNumbers):
+    return np.datetime_as_string(np.asarray(dayNumbers).astype("datetime64[D]"))
+
+
+# Gets the paths of the date and price files for stockCode
+def _getFilePaths(database, stockCode):
+    storePath = getStorePath(database)
+    return (os.path.join(storePath, stockCode + ".dates.npy"),
+            os.path.join(storePath, stockCode + ".prices.npy"))
+
+
+# Writes array to path, via a temporary file so that readers never see a
+# partly written file.
+def _save(path, array):
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "wb") as file:
+        np.save(file, array)
+    os.replace(temporaryPath, path)
+
+
+# Rewrites the files for stockCode from the historical table. Does nothing if
+# the store hasn't been created.
+def writeStock(database, stockCode):
+    if not isEnabled(database):
+        return
+    sqlQuery = ''' SELECT {}, {} FROM {}
+        WHERE {} = ?
+        ORDER BY {} ASC''' \
+        .format(SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME,
+                SC.HISTORICAL_CODE, SC.HISTORICAL_DATE)
+    data = database.readDatabase(sqlQuery, (stockCode,))
+    dates = data[SC.HISTORICAL_DATE].to_numpy().astype("datetime64[D]").astype(np.int32)
+    prices = data[SC.HISTORICAL_PRICE].to_numpy(dtype = np.float64)
+    datePath, pricePath = _getFilePaths(database, stockCode)
+    _save(datePath, dates)
+    _save(pricePath, prices)
+
+
+# Creates the store for database and writes the files for each stock in
+# stockCodes (every stock in the historical table if None).
+def build(database, stockCodes = None):
+    os.makedirs(getStorePath(database), exist_ok = True)
+    if stockCodes is None:
+        sqlQuery = ''' SELECT DISTINCT {} FROM {}'''.format(SC.HISTORICAL_CODE, SC.HISTORICAL_TABLE_NAME)
+        stockCodes = database.readDatabase(sqlQuery)[SC.HISTORICAL_CODE].tolist()
+    for stockCode in stockCodes:
+        writeStock(database, stockCode)
+
+
+# Gets memory mapped (dates, prices) arrays for stockCode, or None if the stock
+# isn't in the store.
+def readStock(database, stockCode):
+    if not isEnabled(database):
+        return None
+    datePath, pricePath = _getFilePaths(database, stockCode)
+    if not os.path.exists(datePath) or not os.path.exists(pricePath):
+        return None
+    return np.load(datePath, mmap_mode = "r"), np.load(pricePath, mmap_mode = "r")
+
+
+# Gets (dates, prices) arrays for stockCode between startDate and endDate
+# (inclusive), with dates as day numbers. The arrays are views of the memory
+# mapped files. Returns None if the stock isn't in the store.
+def getPriceArrays(database, stockCode, startDate, endDate):
+    arrays = readStock(database, stockCode)
+    if arrays is None:
+        return None
+    dates, prices = arrays
+    start = np.searchsorted(dates, toDayNumber(startDate), side = "left")
+    end = np.searchsorted(dates, toDayNumber(endDate), side = "right")
+    return dates[start:end], prices[start:end]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 corporateActions.py
+Created on Sun Oct 18 21:34:09 2026
+
+@author: dmcauslan
+
+Splits and dividend reinvestment plan (DRP) allotments, kept in the
+corporateActions table.
+
+A split on a date turns every share held before it into Ratio shares (e.g. 2
+for a 2 for 1 split, 0.1 for a 1 for 10 consolidation, 1.1 for a 1 for 10
+bonus issue). Stored prices and purchases are as they were on their date, so
+the split factor of a date, the product of the ratios of all the splits after
+it, is used to adjust them: prices are divided by it and numbers of shares
+multiplied by it, giving split adjusted series in shares as they are after
+every split. Values are unchanged by the adjustment. The factors of many dates
+are found at once with np.searchsorted over the split dates.
+
+A DRP allotment is stored as a linked pair of rows, a dividend payment and a
+purchase of the allotted shares at the DRP price, which are added and removed
+together with the action, so the dividend counts as income and the shares as
+an amount spent rather than as free shares. The action holds the rowids of
+the two rows, so only they are removed with it.
+
+The splits of each stock are read once and kept in the database's price cache
+(see priceCache.py), so adjusted series aren't recomputed from the table on
+every call. Stock.addSplit() and removeSplit() clear the stock's cache entries.
+"""
+import numpy as np
+import pandas as pd
+import stockContract as SC
+import priceCache
+from priceCache import getPriceCache
+
+###############
+## Constants ##
+###############
+SPLIT = "split"
+DRP = "drp"
+
+
+# Gets the splits of stockCode as (dates, ratios) arrays sorted by date
+def getSplits(database, stockCode):
+    cache = getPriceCache(database)
+    splits = cache.get((priceCache.SPLITS, stockCode))
+    if splits is None:
+        sqlQuery = ''' SELECT {0}, {1} FROM {2} WHERE {3} = ? AND {4} = ? ORDER BY {0} ASC''' \
+            .format(SC.ACTION_DATE, SC.ACTION_RATIO, SC.ACTION_TABLE_NAME, SC.ACTION_CODE, SC.ACTION_TYPE)
+        data = database.readDatabase(sqlQuery, (stockCode, SPLIT))
+        splits = (data[SC.ACTION_DATE].to_numpy().astype(str), data[SC.ACTION_RATIO].to_numpy(dtype = float))
+        cache.put((priceCache.SPLITS, stockCode), splits)
+    return splits
+
+
+# Gets an array of the split factor of stockCode on each of dates: the number
+# of shares that one share held on that date has become after every split.
+def getShareFactors(database, stockCode, dates):
+    dates = np.asarray(dates).astype(str)
+    splitDates, ratios = getSplits(database, stockCode)
+    if len(splitDates) == 0:
+        return np.ones(len(dates))
+    # Product of the ratios of the splits from each split onwards, and 1 after the last
+    laterProducts = np.append(np.cumprod(ratios[::-1])[::-1], 1)
+    return laterProducts[np.searchsorted(splitDates, dates, side = "right")]
+
+
+# Gets an array of the split factor of each (stock code, date) pair in codes and dates
+def getRowFactors(database, codes, dates):
+    codes = np.asarray(codes)
+    dates = np.asarray(dates).astype(str)
+    factors = np.ones(len(dates))
+    for stockCode in np.unique(codes):
+        rows = codes == stockCode
+        factors[rows] = getShareFactors(database, stockCode, dates[rows])
+    return factors
+
+
+# Gets the number of shares that one share of stockCode held on fromDate had
+# become by toDate
+def getShareRatio(database, stockCode, fromDate, toDate):
+    fromFactor, toFactor = getShareFactors(database, stockCode, [str(fromDate), str(toDate)])
+    return fromFactor / toFactor
+
+
+# Gets prices, of stockCode on each of dates, adjusted for the splits after them
+def adjustPrices(database, stockCode, dates, prices):
+    return np.asarray(prices, dtype = float) / getShareFactors(database, stockCode, dates)
+
+
+# Gets the number of shares of stockCode owned on date, counting shares bought
+# before a split on or before date as the shares they became.
+def getOwned(database, stockCode, date):
+    sqlQuery = '''SELECT {0}, SUM({1}) AS {1} FROM {2}
+        WHERE {3} = ?
+        AND {0} <= date(?)
+        GROUP BY {0}''' \
+        .format(SC.DATE, SC.NUMBER_PURCHASED, SC.TABLE_NAME, SC.CODE)
+    purchases = database.readDatabase(sqlQuery, (stockCode, str(date)))
+    factors = getShareFactors(database, stockCode, purchases[SC.DATE]) / getShareFactors(database, stockCode, [str(date)])
+    return (purchases[SC.NUMBER_PURCHASED].fillna(0).to_numpy(dtype = float) * factors).sum()
+
+
+# Gets a dataframe of the corporate actions of stockCode (or of every stock if
+# None), sorted by stock code and date.
+def getActions(database, stockCode = None):
+    sqlQuery = ''' SELECT * FROM {}'''.format(SC.ACTION_TABLE_NAME)
+    params = []
+    if stockCode is not None:
+        sqlQuery += ''' WHERE {} = ?'''.format(SC.ACTION_CODE)
+        params.append(stockCode)
+    sqlQuery += ''' ORDER BY {}, {}'''.format(SC.ACTION_CODE, SC.ACTION_DATE)
+    return database.readDatabase(sqlQuery, params)
+
+
+# Adds a split of ratio on date to the corporateActions table
+def addSplit(database, stockCode, ratio, date):
+    if ratio <= 0:
+        raise ValueError("Split ratio must be greater than 0.")
+    data = pd.DataFrame({SC.ACTION_CODE: [stockCode],
+                         SC.ACTION_DATE: [date],
+                         SC.ACTION_TYPE: [SPLIT],
+                         SC.ACTION_RATIO: [ratio]})
+    database.addToDatabase(data, SC.ACTION_TABLE_NAME)
+
+
+# Removes a split of ratio on date. Raises a ValueError if it isn't in the table.
+def removeSplit(database, stockCode, ratio, date):
+    sqlCommand = '''DELETE FROM {}
+        WHERE {} = ?
+        AND {} = ?
+        AND {} == ?
+        AND {} == date(?)''' \
+        .format(SC.ACTION_TABLE_NAME, SC.ACTION_CODE, SC.ACTION_TYPE, SC.ACTION_RATIO, SC.ACTION_DATE)
+    if database.executeCommand(sqlCommand, (stockCode, SPLIT, ratio, date)) == 0:
+        raise ValueError("Split of {} on {} was not in database".format(ratio, date))
+
+
+# Adds a DRP allotment on date of numberAllotted shares at price, paid for with
+# a dividend of payment, as the action and its dividend and purchase rows, in
+# a single transaction. The action holds the rowids of the other two rows.
+def addDrp(database, stockCode, payment, numberAllotted, price, date):
+    dividendData = pd.DataFrame({SC.DIVIDEND_CODE: [stockCode],
+                                 SC.DIVIDEND_DATE: [date],
+                                 SC.DIVIDEND_AMOUNT: [payment]})
+    purchaseData = pd.DataFrame({SC.CODE: [stockCode],
+                                 SC.DATE: [date],
+                                 SC.NUMBER_PURCHASED: [numberAllotted],
+                                 SC.PRICE: [price],
+                                 SC.COST: [price*numberAllotted]})
+    with database.transaction():
+        database.addToDatabase(dividendData, SC.DIVIDEND_TABLE_NAME)
+        dividendId = database.readValue("SELECT last_insert_rowid()")
+        database.addToDatabase(purchaseData, SC.TABLE_NAME)
+        purchaseId = database.readValue("SELECT last_insert_rowid()")
+        actionData = pd.DataFrame({SC.ACTION_CODE: [stockCode],
+                                   SC.ACTION_DATE: [date],
+                                   SC.ACTION_TYPE: [DRP],
+                                   SC.ACTION_NUMBER: [numberAllotted],
+                                   SC.ACTION_PRICE: [price],
+                                   SC.ACTION_AMOUNT: [payment],
+                                   SC.ACTION_DIVIDEND_ID: [dividendId],
+                                   SC.ACTION_PURCHASE_ID: [purchaseId]})
+        database.addToDatabase(actionData, SC.ACTION_TABLE_NAME)
+
+
+# Removes one DRP allotment, with its linked dividend and purchase rows, in a
+# single transaction. Raises a ValueError if it isn't in the table.
+# Allotments added before the rows were linked (with no ids) fall back to
+# removing the first dividend and purchase with the same date and amounts.
+def removeDrp(database, stockCode, payment, numberAllotted, price, date):
+    sqlQuery = '''SELECT rowid, {}, {} FROM {}
+        WHERE {} = ? AND {} = ? AND {} == ? AND {} == ? AND {} == ? AND {} == date(?)
+        ORDER BY rowid LIMIT 1''' \
+        .format(SC.ACTION_DIVIDEND_ID, SC.ACTION_PURCHASE_ID, SC.ACTION_TABLE_NAME, SC.ACTION_CODE, SC.ACTION_TYPE,
+                SC.ACTION_NUMBER, SC.ACTION_PRICE, SC.ACTION_AMOUNT, SC.ACTION_DATE)
+
+    # Deletes the row of tableName with rowid, or if rowid is None the first
+    # row matching all of the conditions
+    def deleteOne(tableName, rowid, conditions, params):
+        if rowid is not None:
+            sqlCommand = '''DELETE FROM {} WHERE rowid = ?'''.format(tableName)
+            return database.executeCommand(sqlCommand, (int(rowid),))
+        sqlCommand = '''DELETE FROM {0} WHERE rowid IN
+            (SELECT rowid FROM {0} WHERE {1} LIMIT 1)''' \
+            .format(tableName, " AND ".join("{} == ?".format(column) for column in conditions))
+        return database.executeCommand(sqlCommand, params)
+
+    with database.transaction():
+        actions = database.readDatabase(sqlQuery, (stockCode, DRP, numberAllotted, price, payment, date))
+        if len(actions) == 0:
+            raise ValueError("DRP allotment of {} shares for ${} on {} was not in database"
+                             .format(numberAllotted, price, date))
+        actionId, dividendId, purchaseId = [None if pd.isnull(value) else value for value in actions.iloc[0]]
+        deleteOne(SC.ACTION_TABLE_NAME, actionId, [], ())
+        deleteOne(SC.DIVIDEND_TABLE_NAME, dividendId, [SC.DIVIDEND_CODE, SC.DIVIDEND_AMOUNT, SC.DIVIDEND_DATE],
+                  (stockCode, payment, date))
+        deleteOne(SC.TABLE_NAME, purchaseId, [SC.CODE, SC.NUMBER_PURCHASED, SC.PRICE, SC.DATE],
+                  (stockCode, numberAllotted, price, date))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 fxRates.py
+Created on Sun Oct 18 20:48:31 2026
+
+@author: dmcauslan
+
+Currencies of the stocks and the exchange rates between them, for portfolios
+that hold stocks priced in more than one currency (e.g. ASX and US listed
+funds).
+
+Each stock's currency is kept in the stockCurrencies table, and stocks that
+aren't in it are in DEFAULT_CURRENCY. Daily exchange rates are kept in the
+fxRates table, written by insertRates() from the downloader
+(stockDownloader.updateRates()) or from a file (transactionImporter.importRates()).
+A rate stored for one direction is also used, inverted, for the other.
+
+Amounts are converted into a base currency with an as-of join over the date
+axis: the rate dates are searched for every date at once with np.searchsorted,
+giving the latest rate on or before each date, and whole (date x stock)
+matrices are multiplied by it, rather than looking up a rate for each row.
+Prices and values are converted at the rate on their date. Amounts spent and
+dividends are running totals, so each increase is converted at the rate on the
+date it happened and the converted increases are summed again.
+convertAmounts() converts individual payments (e.g. purchases, dividends and
+the cost of tax lots) at the rate on the date each was paid.
+"""
+import numpy as np
+import stockContract as SC
+import portfolioAggregator as aggregator
+
+###############
+## Constants ##
+###############
+# Currency of stocks without one set, and the default base currency of a portfolio
+DEFAULT_CURRENCY = "AUD"
+# Snapshot columns converted at the rate on each date, and running totals
+# whose increases are converted at the rate on the date they happened
+LEVEL_COLUMNS = [SC.HOLDINGS_PRICE, SC.HOLDINGS_VALUE]
+FLOW_COLUMNS = [SC.HOLDINGS_SPENT, SC.HOLDINGS_DIVIDENDS]
+
+
+# Sets the currency of stockCode
+def setCurrency(database, stockCode, currency):
+    sqlCommand = ''' INSERT INTO {0} ({1}, {2}) VALUES (?, ?)
+        ON CONFLICT ({1}) DO UPDATE SET {2} = excluded.{2}''' \
+        .format(SC.CURRENCY_TABLE_NAME, SC.CURRENCY_CODE, SC.CURRENCY)
+    database.executeCommand(sqlCommand, (stockCode, currency))
+
+
+# Gets a series, indexed by stock code, of the currency of each stock in codes
+def getCurrencies(database, codes):
+    sqlQuery = ''' SELECT {}, {} FROM {} WHERE {} IN ({})''' \
+        .format(SC.CURRENCY_CODE, SC.CURRENCY, SC.CURRENCY_TABLE_NAME, SC.CURRENCY_CODE,
+                aggregator.placeholders(codes))
+    data = database.readDatabase(sqlQuery, list(codes))
+    return data.set_index(SC.CURRENCY_CODE)[SC.CURRENCY].reindex(codes).fillna(DEFAULT_CURRENCY)
+
+
+# Upserts rows of (fromCurrency, toCurrency, "yyyy-mm-dd" date, rate) into the
+# fxRates table with a single executemany. Returns the number of rows added or
+# changed.
+def insertRates(database, rows):
+    sqlCommand = ''' INSERT INTO {0} ({1}, {2}, {3}, {4}) VALUES (?, ?, ?, ?)
+        ON CONFLICT ({1}, {2}, {3}) DO UPDATE SET {4} = excluded.{4}
+        WHERE {4} IS NOT excluded.{4}''' \
+        .format(SC.FX_TABLE_NAME, SC.FX_FROM, SC.FX_TO, SC.FX_DATE, SC.FX_RATE)
+    with database.transaction():
+        return database.executeMany(sqlCommand, [(fromCurrency, toCurrency, str(date), float(rate))
+                                                 for fromCurrency, toCurrency, date, rate in rows])
+
+
+# Gets a function that writes rows of (code, date, rate), as read by a price
+# source, to the fxRates table as rates from fromCurrency to toCurrency.
+def getRateWriter(fromCurrency, toCurrency):
+    def writeRates(database, rows):
+        return insertRates(database, ((fromCurrency, toCurrency, date, rate) for code, date, rate in rows))
+    return writeRates
+
+
+# Gets the latest date that there is a rate from fromCurrency to toCurrency
+# for, or None if there are no rates.
+def getLastDate(database, fromCurrency, toCurrency):
+    sqlQuery = ''' SELECT MAX({}) FROM {} WHERE {} = ? AND {} = ?''' \
+        .format(SC.FX_DATE, SC.FX_TABLE_NAME, SC.FX_FROM, SC.FX_TO)
+    return database.readValue(sqlQuery, (fromCurrency, toCurrency))
+
+
+# Gets the rates from fromCurrency to toCurrency on or before endDate as
+# (dates, rates) arrays sorted by date. If only the rates from toCurrency to
+# fromCurrency are stored, they are inverted.
+def getRateSeries(database, fromCurrency, toCurrency, endDate):
+    sqlQuery = ''' SELECT {0}, {1} FROM {2} WHERE {3} = ? AND {4} = ? AND {0} <= date(?) ORDER BY {0} ASC''' \
+        .format(SC.FX_DATE, SC.FX_RATE, SC.FX_TABLE_NAME, SC.FX_FROM, SC.FX_TO)
+    data = database.readDatabase(sqlQuery, (fromCurrency, toCurrency, str(endDate)))
+    if not data.empty:
+        return data[SC.FX_DATE].to_numpy().astype(str), data[SC.FX_RATE].to_numpy(dtype = float)
+    data = database.readDatabase(sqlQuery, (toCurrency, fromCurrency, str(endDate)))
+    return data[SC.FX_DATE].to_numpy().astype(str), 1 / data[SC.FX_RATE].to_numpy(dtype = float)
+
+
+# Gets an array of the latest rate from fromCurrency to toCurrency on or
+# before each of dates (a sorted array of "yyyy-mm-dd" strings). Dates before
+# the first rate are NaN.
+def getRatesAsOf(database, fromCurrency, toCurrency, dates):
+    dates = np.asarray(dates).astype(str)
+    if fromCurrency == toCurrency or len(dates) == 0:
+        return np.ones(len(dates))
+    rateDates, rates = getRateSeries(database, fromCurrency, toCurrency, dates[-1])
+    if len(rates) == 0:
+        return np.full(len(dates), np.nan)
+    index = np.searchsorted(rateDates, dates, side = "right") - 1
+    return np.where(index >= 0, rates[np.maximum(index, 0)], np.nan)
+
+
+# Gets an array of the rate on or before date that converts each of the stocks
+# in codes into baseCurrency. Raises a ValueError if a rate is missing.
+def getStockRates(database, codes, baseCurrency, date):
+    currencies = getCurrencies(database, codes).to_numpy()
+    rates = np.ones(len(codes))
+    for currency in np.unique(currencies):
+        if currency != baseCurrency:
+            [rate] = getRatesAsOf(database, currency, baseCurrency, [str(date)])
+            if np.isnan(rate):
+                raise ValueError("No {}/{} exchange rate on or before {}.".format(currency, baseCurrency, date))
+            rates[currencies == currency] = rate
+    return rates
+
+
+# Converts amounts, each paid on the matching one of dates (an array of
+# "yyyy-mm-dd" strings in any order) in the matching one of currencies, into
+# baseCurrency at the rate on the date they were paid. Raises a ValueError if
+# an amount needs a rate from before the first stored rate.
+def convertAmounts(database, amounts, dates, currencies, baseCurrency):
+    amounts = np.array(amounts, dtype = float)
+    dates = np.asarray(dates).astype(str)
+    currencies = np.asarray(currencies)
+    for currency in np.unique(currencies):
+        # Amounts of zero don't need a rate
+        rows = np.flatnonzero((currencies == currency) & (amounts != 0))
+        if currency == baseCurrency or len(rows) == 0:
+            continue
+        order = rows[np.argsort(dates[rows], kind = "stable")]
+        rates = getRatesAsOf(database, currency, baseCurrency, dates[order])
+        if np.isnan(rates).any():
+            raise ValueError("No {}/{} exchange rate on or before {}."
+                             .format(currency, baseCurrency, dates[order][np.isnan(rates)][0]))
+        amounts[order] *= rates
+    return amounts
+
+
+# Converts snapshot matrices into baseCurrency. matrices is a dictionary of
+# holdings column: (len(dates) x len(currencies)) matrix, with one column per
+# stock, and currencies holds the currency of each stock. Columns in
+# LEVEL_COLUMNS are converted at the rate on each date, columns in
+# FLOW_COLUMNS by converting their increases, so they must start from the
+# stock's first snapshot. Other columns (e.g. shares owned) are left alone.
+# Raises a ValueError if an amount needs a rate from before the first stored
+# rate. Prices on those dates are NaN.
+def convertMatrices(database, matrices, dates, currencies, baseCurrency):
+    currencies = np.asarray(currencies)
+    for currency in np.unique(currencies):
+        if currency == baseCurrency:
+            continue
+        columns = np.flatnonzero(currencies == currency)
+        rates = getRatesAsOf(database, currency, baseCurrency, dates)[:, None]
+        for name, matrix in matrices.items():
+            if name in FLOW_COLUMNS:
+                amounts = np.diff(np.nan_to_num(matrix[:, columns]), axis = 0, prepend = 0)
+            elif name in LEVEL_COLUMNS:
+                amounts = matrix[:, columns]
+            else:
+                continue
+            # Amounts of zero don't need a rate
+            converted = np.where(amounts == 0, 0, amounts * rates)
+            if name != SC.HOLDINGS_PRICE:
+                missing = np.isnan(converted) & ~np.isnan(amounts)
+                if missing.any():
+                    raise ValueError("No {}/{} exchange rate on or before {}."
+                                     .format(currency, baseCurrency, dates[np.flatnonzero(missing.any(axis = 1))[0]]))
+            if name in FLOW_COLUMNS:
+                converted = np.cumsum(converted, axis = 0)
+            matrix[:, columns] = converted
+    return matrices
+
+
+# Converts a dataframe of one stock's snapshots (as from holdingsTable.getRange(),
+# starting from the stock's first snapshot) from currency into baseCurrency.
+def convertSnapshots(database, data, currency, baseCurrency):
+    if currency == baseCurrency or data.empty:
+        return data
+    data = data.copy()
+    columns = [column for column in LEVEL_COLUMNS + FLOW_COLUMNS if column in data.columns]
+    matrices = {column: data[column].to_numpy(dtype = float)[:, None].copy() for column in columns}
+    convertMatrices(database, matrices, data[SC.HOLDINGS_DATE].to_numpy().astype(str), [currency], baseCurrency)
+    for column in columns:
+        data[column] = matrices[column][:, 0]
+    return data
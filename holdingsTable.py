@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 holdingsTable.py
+Created on Sun Oct 18 20:05:12 2026
+
+@author: dmcauslan
+
+Maintains the dailyHoldings table, a materialized snapshot holding, for every
+stock and every date it has a price for, the price, number of shares owned,
+total spent, total dividends and total value on that date.
+
+The table is kept up to date incrementally. A transaction, dividend or price
+on a date only changes the snapshots from that date onwards, so update()
+recomputes just that suffix of dates for the stock from a cumulative sum over
+the stock's transactions (summed per date). Stock.buy(), sell(), remove(),
+addDividend(), removeDividend(), addDrp(), the transaction importer and
+stockDownloader.insertPrices() all call it. A split changes every snapshot
+before it, so Stock.addSplit() recomputes all of the stock's snapshots.
+
+Prices and shares owned are stored adjusted for splits (see
+corporateActions.py), in shares as they are after every split.
+
+With the snapshots stored, valuations and time series are a single indexed
+read of this table instead of recomputing the holdings from the full
+purchase history every time.
+
+Snapshots are stored in each stock's own currency. The read functions take
+an optional baseCurrency and convert the amounts into it (see fxRates.py).
+"""
+import numpy as np
+import pandas as pd
+import stockContract as SC
+import portfolioAggregator as aggregator
+import fxRates
+import corporateActions
+
+###############
+## Constants ##
+###############
+# The columns of the snapshot computed from each source table
+PURCHASE_TOTALS = [(SC.NUMBER_PURCHASED, SC.HOLDINGS_OWNED), (SC.COST, SC.HOLDINGS_SPENT)]
+DIVIDEND_TOTALS = [(SC.DIVIDEND_AMOUNT, SC.HOLDINGS_DIVIDENDS)]
+# Source columns holding numbers of shares, which are adjusted for splits
+SHARE_COLUMNS = [SC.NUMBER_PURCHASED]
+
+
+# Gets the running totals of amountColumns in tableName for stockCode on each
+# of dates (a sorted array of "yyyy-mm-dd" strings). Numbers of shares are
+# adjusted for splits.
+def _getRunningTotals(database, stockCode, tableName, codeColumn, dateColumn, amountColumns, dates):
+    sums = ", ".join("SUM({0}) AS {0}".format(column) for column in amountColumns)
+    sqlQuery = ''' SELECT {0}, {1} FROM {2} WHERE {3} = ? AND {0} <= ?
+        GROUP BY {0} ORDER BY {0} ASC''' \
+        .format(dateColumn, sums, tableName, codeColumn)
+    transactions = database.readDatabase(sqlQuery, (stockCode, str(dates[-1])))
+    transactionDates = transactions[dateColumn].to_numpy().astype(str)
+    # For every date find how many transaction dates are <= to it
+    index = np.searchsorted(transactionDates, dates, side = "right")
+    totals = []
+    for amountColumn in amountColumns:
+        amounts = transactions[amountColumn].fillna(0).to_numpy(dtype = float)
+        if amountColumn in SHARE_COLUMNS:
+            amounts = amounts * corporateActions.getShareFactors(database, stockCode, transactionDates)
+        runningTotal = np.concatenate(([0], np.cumsum(amounts)))
+        totals.append(runningTotal[index])
+    return totals
+
+
+# Recomputes the snapshots of stockCode on every date on or after fromDate
+def update(database, stockCode, fromDate):
+    fromDate = str(fromDate)
+    sqlQuery = ''' SELECT {0}, {1} FROM {2} WHERE {3} = ? AND {0} >= ? ORDER BY {0} ASC''' \
+        .format(SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE)
+    prices = database.readDatabase(sqlQuery, (stockCode, fromDate))
+    dates = prices[SC.HISTORICAL_DATE].to_numpy().astype(str)
+    price = corporateActions.adjustPrices(database, stockCode, dates, prices[SC.HISTORICAL_PRICE])
+
+    with database.transaction():
+        sqlCommand = ''' DELETE FROM {} WHERE {} = ? AND {} >= ?''' \
+            .format(SC.HOLDINGS_TABLE_NAME, SC.HOLDINGS_CODE, SC.HOLDINGS_DATE)
+        database.executeCommand(sqlCommand, (stockCode, fromDate))
+        if len(dates) == 0:
+            return 0
+        owned, spent = _getRunningTotals(database, stockCode, SC.TABLE_NAME, SC.CODE, SC.DATE,
+                                         [column for column, total in PURCHASE_TOTALS], dates)
+        [dividends] = _getRunningTotals(database, stockCode, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_CODE, SC.DIVIDEND_DATE,
+                                        [column for column, total in DIVIDEND_TOTALS], dates)
+        snapshots = pd.DataFrame({SC.HOLDINGS_CODE: stockCode,
+                                  SC.HOLDINGS_DATE: dates,
+                                  SC.HOLDINGS_PRICE: price,
+                                  SC.HOLDINGS_OWNED: owned,
+                                  SC.HOLDINGS_SPENT: spent,
+                                  SC.HOLDINGS_DIVIDENDS: dividends,
+                                  SC.HOLDINGS_VALUE: owned * price},
+                                 columns = SC.HOLDINGS_COLUMNS)
+        return database.addToDatabase(snapshots, SC.HOLDINGS_TABLE_NAME)
+
+
+# Recomputes the snapshots of several stocks. firstDates is a dictionary of
+# stock code: the earliest date that changed for that stock.
+def updateMany(database, firstDates):
+    with database.transaction():
+        for stockCode, fromDate in firstDates.items():
+            update(database, stockCode, fromDate)
+
+
+# Recomputes every snapshot of the stocks in stockCodes (every stock in the
+# historical table if None).
+def rebuild(database, stockCodes = None):
+    if stockCodes is None:
+        sqlQuery = ''' SELECT DISTINCT {} FROM {}'''.format(SC.HISTORICAL_CODE, SC.HISTORICAL_TABLE_NAME)
+        stockCodes = database.readDatabase(sqlQuery)[SC.HISTORICAL_CODE].tolist()
+    updateMany(database, {stockCode: SC.HOLDINGS_START_DATE for stockCode in stockCodes})
+
+
+# Reads the snapshots of stockCode between startDate and endDate
+def _readRange(database, stockCode, startDate, endDate):
+    sqlQuery = ''' SELECT {} FROM {} WHERE {} = ? AND {} BETWEEN date(?) AND date(?) ORDER BY {} ASC''' \
+        .format(", ".join('"{}"'.format(column) for column in SC.HOLDINGS_COLUMNS[1:]), SC.HOLDINGS_TABLE_NAME,
+                SC.HOLDINGS_CODE, SC.HOLDINGS_DATE, SC.HOLDINGS_DATE)
+    return database.readDatabase(sqlQuery, (stockCode, startDate, endDate),
+                                 {SC.HOLDINGS_PRICE: float, SC.HOLDINGS_OWNED: float, SC.HOLDINGS_SPENT: float,
+                                  SC.HOLDINGS_DIVIDENDS: float, SC.HOLDINGS_VALUE: float})
+
+
+# Gets a dataframe of the snapshots of stockCode between startDate and endDate,
+# with columns Date, Price_$, Total_Owned, Total_Spent_$, Total_Dividend_$ and
+# Total_Value. If baseCurrency is given and the stock is in another currency
+# the amounts are converted into it, which needs the snapshots from the
+# stock's first one so that the running totals are converted correctly.
+def getRange(database, stockCode, startDate, endDate, baseCurrency = None):
+    if baseCurrency is not None:
+        currency = fxRates.getCurrencies(database, [stockCode]).iloc[0]
+        if currency != baseCurrency:
+            data = _readRange(database, stockCode, SC.HOLDINGS_START_DATE, endDate)
+            data = fxRates.convertSnapshots(database, data, currency, baseCurrency)
+            return data[data[SC.HOLDINGS_DATE] >= str(startDate)].reset_index(drop = True)
+    return _readRange(database, stockCode, startDate, endDate)
+
+
+# Gets a dataframe, indexed by stock code, of the latest snapshot of each stock
+# in codes on or before date. Raises a ValueError if any of the stocks have no
+# snapshot on or before date. If baseCurrency is given the prices and values
+# are converted into it at the rates on date.
+def getAsOf(database, codes, date, baseCurrency = None):
+    sqlQuery = ''' SELECT holdings.* FROM {0} AS holdings
+        JOIN (SELECT {1}, MAX({2}) AS {2} FROM {0}
+              WHERE {1} IN ({3}) AND {2} <= date(?)
+              GROUP BY {1}) AS latest
+        ON holdings.{1} = latest.{1} AND holdings.{2} = latest.{2}''' \
+        .format(SC.HOLDINGS_TABLE_NAME, SC.HOLDINGS_CODE, SC.HOLDINGS_DATE, aggregator.placeholders(codes))
+    data = database.readDatabase(sqlQuery, list(codes) + [str(date)])
+    data = data.set_index(SC.HOLDINGS_CODE).reindex(codes)
+    missing = data.index[data[SC.HOLDINGS_DATE].isnull()].tolist()
+    if len(missing) > 0:
+        raise ValueError("No price data for {} on or before {}.".format(", ".join(missing), date))
+    if baseCurrency is not None:
+        rates = fxRates.getStockRates(database, codes, baseCurrency, date)
+        for column in fxRates.LEVEL_COLUMNS:
+            data[column] = data[column].to_numpy(dtype = float) * rates
+    return data
+
+
+# Gets a dataframe containing the total amount spent, total value and total
+# dividends of the stocks in codes for every date between startDate and endDate
+# that any of them has a snapshot for. Each stock's totals are carried forward
+# over dates it has no snapshot on. If baseCurrency is given the totals are
+# converted into it. When any of the stocks are in another currency the
+# snapshots are read from the first one so that the running totals are
+# converted correctly.
+def getPortfolioSeries(database, codes, startDate, endDate, baseCurrency = None):
+    totalColumns = [SC.HOLDINGS_SPENT, SC.HOLDINGS_VALUE, SC.HOLDINGS_DIVIDENDS]
+    currencies = None
+    readStart = str(startDate)
+    if baseCurrency is not None:
+        currencies = fxRates.getCurrencies(database, codes).to_numpy()
+        if (currencies != baseCurrency).any():
+            readStart = SC.HOLDINGS_START_DATE
+    sqlQuery = ''' SELECT {}, {}, {} FROM {}
+        WHERE {} IN ({}) AND {} BETWEEN date(?) AND date(?)''' \
+        .format(SC.HOLDINGS_CODE, SC.HOLDINGS_DATE, ", ".join('"{}"'.format(column) for column in totalColumns),
+                SC.HOLDINGS_TABLE_NAME, SC.HOLDINGS_CODE, aggregator.placeholders(codes), SC.HOLDINGS_DATE)
+    data = database.readDatabase(sqlQuery, list(codes) + [readStart, str(endDate)])
+
+    dates, rowIndex = np.unique(data[SC.HOLDINGS_DATE].to_numpy().astype(str), return_inverse = True)
+    columnIndex = pd.Index(codes).get_indexer(data[SC.HOLDINGS_CODE])
+    matrices = {}
+    for column in totalColumns:
+        matrix = np.full((len(dates), len(codes)), np.nan)
+        matrix[rowIndex, columnIndex] = data[column].to_numpy(dtype = float)
+        matrices[column] = np.nan_to_num(aggregator.forwardFill(matrix))
+    if currencies is not None:
+        fxRates.convertMatrices(database, matrices, dates, currencies, baseCurrency)
+
+    rows = dates >= str(startDate)
+    series = {SC.HISTORICAL_DATE: dates[rows]}
+    for column in totalColumns:
+        series[column] = matrices[column][rows].sum(axis = 1)
+    return pd.DataFrame(series, columns = [SC.HISTORICAL_DATE, SC.TOTAL_SPENT, SC.TOTAL_VALUE, SC.DIVIDEND_TOTAL])
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 instrumentation.py
+Created on Sun Oct 18 19:21:37 2026
+
+@author: dmcauslan
+
+Opt in profiling of where the time goes: sql queries (with a fingerprint of
+the query text and the number of rows), page downloads, and the public methods
+of Stock and Portfolio as spans, so it is possible to see which queries a
+slow method fans out into.
+
+Recording is off by default and costs very little when off. Turn it on with
+the profiling() context manager, or for a whole run by setting the
+PORTFOLIO_PROFILE environment variable to 1. If PORTFOLIO_TRACE is also set
+to a file path, the trace is written there when the program exits.
+Usage:
+    with instrumentation.profiling("trace.json"):
+        portfolio.plotPortfolio()
+    instrumentation.printSummary()
+
+Traces are saved in the Chrome trace event format, which can be opened in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import atexit
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+###############
+## Constants ##
+###############
+ENABLE_VARIABLE = "PORTFOLIO_PROFILE"
+TRACE_VARIABLE = "PORTFOLIO_TRACE"
+SUMMARY_ROWS = 10
+
+enabled = os.environ.get(ENABLE_VARIABLE, "") not in ("", "0")
+_events = []
+_counters = {}
+_lock = threading.Lock()
+_startTime = time.perf_counter()
+
+
+# Gets a short fingerprint of an sql query which is the same for queries that
+# only differ in their values: string and number literals are replaced by ?,
+# lists of values in IN (...) are collapsed and whitespace is normalized.
+# Returns (fingerprint, normalized sql).
+def fingerprint(sql):
+    normalized = re.sub(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"", "?", sql)
+    normalized = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized)
+    normalized = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(...)", normalized)
+    normalized = " ".join(normalized.split())
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+# Adds amount to the counter called name (e.g. the number of connections opened)
+def count(name, amount = 1):
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+# Context manager that records the time taken by the with block as an event
+# called name in category (e.g. "sql", "http" or "span"). Yields a dictionary
+# that extra details, such as the number of rows, can be added to.
+@contextmanager
+def span(name, category = "span", **details):
+    if not enabled:
+        yield details
+        return
+    start = time.perf_counter()
+    try:
+        yield details
+    finally:
+        end = time.perf_counter()
+        with _lock:
+            _events.append({"name": name,
+                            "category": category,
+                            "start": start - _startTime,
+                            "duration": end - start,
+                            "thread": threading.get_ident(),
+                            "details": details})
+
+
+# Context manager that records an sql query, with its fingerprint.
+def query(sql):
+    if not enabled:
+        return span("sql", "sql")
+    queryFingerprint, normalized = fingerprint(sql)
+    return span(queryFingerprint, "sql", sql = normalized)
+
+
+# Decorator that records each call of a function as a span named after it
+def traced(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+        with span(function.__qualname__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+# Class decorator that traces every public method defined in the class
+def traceMethods(cls):
+    for name, value in list(vars(cls).items()):
+        if not name.startswith("_") and callable(value) and not isinstance(value, (staticmethod, classmethod, type)):
+            setattr(cls, name, traced(value))
+    return cls
+
+
+# Removes all of the recorded events and counters
+def reset():
+    with _lock:
+        del _events[:]
+        _counters.clear()
+
+
+# Context manager which turns recording on for the with block. If traceFile is
+# given the trace is written to it at the end of the block.
+@contextmanager
+def profiling(traceFile = None):
+    global enabled
+    wasEnabled = enabled
+    enabled = True
+    try:
+        yield
+    finally:
+        enabled = wasEnabled
+        if traceFile is not None:
+            exportTrace(traceFile)
+
+
+# Gets a dataframe of the recorded events
+def getEvents():
+    with _lock:
+        events = list(_events)
+    return pd.DataFrame({"name": [event["name"] for event in events],
+                         "category": [event["category"] for event in events],
+                         "start": [event["start"] for event in events],
+                         "duration": [event["duration"] for event in events],
+                         "rows": [event["details"].get("rows") for event in events],
+                         "bytes": [event["details"].get("bytes") for event in events],
+                         "sql": [event["details"].get("sql") for event in events]},
+                        columns = ["name", "category", "start", "duration", "rows", "bytes", "sql"])
+
+
+# Gets a dataframe with one row per distinct query (by fingerprint), or per
+# span name (or host for downloads) for other categories, holding the number
+# of calls, total, mean and maximum time and total rows and bytes. Sorted by
+# total time, slowest first.
+def getSummary(category = "sql"):
+    events = getEvents()
+    events = events[events["category"] == category]
+    summary = events.groupby("name").agg(calls = ("duration", "size"),
+                                         total = ("duration", "sum"),
+                                         mean = ("duration", "mean"),
+                                         max = ("duration", "max"),
+                                         rows = ("rows", "sum"),
+                                         bytes = ("bytes", "sum"),
+                                         sql = ("sql", "first"))
+    return summary.sort_values("total", ascending = False)
+
+
+# Prints the slowest queries, the slowest spans and the counters
+def printSummary(rows = SUMMARY_ROWS):
+    with pd.option_context("display.max_colwidth", 80, "display.width", 200, "display.max_columns", None):
+        print("Slowest queries:")
+        print(getSummary("sql").drop(columns = ["bytes"]).head(rows))
+        print("\nSlowest spans:")
+        print(getSummary("span").drop(columns = ["rows", "bytes", "sql"]).head(rows))
+        print("\nDownloads:")
+        print(getSummary("http").drop(columns = ["rows", "sql"]).head(rows))
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            print("{}: {}".format(name, value))
+
+
+# Writes the recorded events to filePath in the Chrome trace event format
+def exportTrace(filePath):
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    traceEvents = [{"name": event["name"],
+                    "cat": event["category"],
+                    "ph": "X",
+                    "ts": event["start"] * 1e6,
+                    "dur": event["duration"] * 1e6,
+                    "pid": os.getpid(),
+                    "tid": event["thread"],
+                    "args": event["details"]} for event in events]
+    with open(filePath, "w") as traceFile:
+        json.dump({"traceEvents": traceEvents, "otherData": counters}, traceFile, default = str)
+
+
+# Write the trace on exit when asked to by the environment
+if enabled and os.environ.get(TRACE_VARIABLE):
+    atexit.register(exportTrace, os.environ[TRACE_VARIABLE])
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 performanceMetrics.py
+Created on Sun Oct 18 16:38:25 2026
+
+@author: dmcauslan
+
+Performance analytics for the stocks in a portfolio and the portfolio as a
+whole:
+    * Time weighted return, which removes the effect of the timing and size of
+    purchases, sales and dividends.
+    * Money weighted return (XIRR) of the actual cash flows in the purchases
+    and dividends tables.
+    * Maximum drawdown, volatility (overall and rolling) and Sharpe ratio of the
+    time weighted daily returns.
+getPerformance() gives each of them over a date range, and
+getMonthlyPerformance() gives the XIRR and rolling volatility at every month
+end in the range.
+
+The calculations work on (date x series) arrays so that every stock and the
+portfolio total are handled at once. xirr() solves any number of problems
+together with a vectorized Newton iteration that falls back to bisection
+whenever a step would leave the bracket around the root, so computing it for
+every holding at every month end is a handful of array operations per
+iteration rather than a root find per problem.
+
+Cash flow sign convention: money paid into a holding (purchases) is negative
+and money paid out of it (sales, dividends and the final value) is positive.
+
+Given a baseCurrency, values are converted at the rate on each date and cash
+flows at the rate on the date they were paid (see fxRates.py), so the
+portfolio column of a portfolio holding stocks in several currencies is in
+one currency.
+"""
+import numpy as np
+import pandas as pd
+import stockContract as SC
+import portfolioAggregator as aggregator
+import fxRates
+
+###############
+## Constants ##
+###############
+PERIODS_PER_YEAR = 252          # Trading days in a year, for annualizing daily returns
+ROLLING_WINDOW = 63             # Trading days (about 3 months) in the rolling volatility window
+DAYS_PER_YEAR = 365.0           # Used to convert cash flow dates to years for XIRR
+XIRR_BRACKET = (-0.9999, 100.0) # Range of annual rates searched by xirr()
+XIRR_TOLERANCE = 1e-10
+XIRR_MAX_ITERATIONS = 100
+PORTFOLIO_COLUMN = "Portfolio"
+
+
+# Gets the return over each period from values, the value of each series at the
+# end of each period, and flows, the net cash paid into each series during the
+# period (purchases less sales and dividends). Flows are assumed to arrive at
+# the end of the period, so they are included in that period's value. opening
+# is the value of each series before the first period (0 if None). In periods
+# that start with nothing held, the money paid in is taken as the opening
+# value, so the gain from the purchase price to the first value counts.
+# Periods that start with nothing held and have nothing paid in, or nothing
+# valued at the end, have a return of 0.
+def getPeriodReturns(values, flows, opening = None):
+    values = np.asarray(values, dtype = float)
+    flows = np.asarray(flows, dtype = float)
+    first = np.zeros_like(values[:1]) if opening is None else np.reshape(np.asarray(opening, dtype = float), values[:1].shape)
+    previous = np.concatenate((first, values[:-1]))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        returns = np.where(previous > 0, (values - flows) / previous - 1, (values - flows) / flows)
+    # Purchases without a value yet (no price) aren't counted as a loss
+    return np.where((previous > 0) | ((flows > 0) & (values > 0)), returns, 0)
+
+
+# Gets the growth of $1 invested in each series at the start, chaining the
+# period returns together.
+def getReturnIndex(returns):
+    return np.cumprod(1 + np.asarray(returns, dtype = float), axis = 0)
+
+
+# Gets the time weighted return of each series over the whole range
+def timeWeightedReturn(returns):
+    return np.prod(1 + np.asarray(returns, dtype = float), axis = 0) - 1
+
+
+# Gets the drawdown of a return index: the fractional fall from the highest
+# value reached so far, on every date.
+def getDrawdowns(returnIndex):
+    return returnIndex / np.maximum.accumulate(returnIndex, axis = 0) - 1
+
+
+# Gets the largest fall from peak to trough of each series (a negative number)
+def maxDrawdown(returns):
+    return getDrawdowns(getReturnIndex(returns)).min(axis = 0)
+
+
+# Gets the annualized standard deviation of the period returns of each series
+def volatility(returns, periodsPerYear = PERIODS_PER_YEAR):
+    return np.std(returns, axis = 0, ddof = 1) * np.sqrt(periodsPerYear)
+
+
+# Gets the annualized volatility over a rolling window of periods. NaN until
+# the first full window.
+def rollingVolatility(returns, window, periodsPerYear = PERIODS_PER_YEAR):
+    return pd.DataFrame(returns).rolling(window).std().to_numpy() * np.sqrt(periodsPerYear)
+
+
+# Gets the annualized Sharpe ratio of each series. riskFreeRate is an annual rate.
+def sharpeRatio(returns, riskFreeRate = 0, periodsPerYear = PERIODS_PER_YEAR):
+    excess = np.asarray(returns, dtype = float) - riskFreeRate / periodsPerYear
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return excess.mean(axis = 0) / np.std(excess, axis = 0, ddof = 1) * np.sqrt(periodsPerYear)
+
+
+# Gets the net present value and its derivative with respect to rate for each
+# row of amounts (problems x cash flows) paid at times (in years).
+def _npv(rates, amounts, times):
+    discount = (1 + rates[:, None]) ** -times
+    npv = (amounts * discount).sum(axis = 1)
+    derivative = -(times * amounts * discount).sum(axis = 1) / (1 + rates)
+    return npv, derivative
+
+
+# Solves for the annual rate that makes the net present value of each row of
+# amounts zero, i.e. the XIRR of each set of cash flows.
+# params
+# amounts - (problems x cash flows) array, or a single 1d set of cash flows.
+#   Unused entries can be left as 0.
+# times - the time of each cash flow in years, either matching amounts or a
+#   1d array shared by every problem.
+# Returns an array of rates, NaN for problems with no root in XIRR_BRACKET
+# (e.g. cash flows that are all the same sign).
+def xirr(amounts, times):
+    amounts = np.atleast_2d(np.asarray(amounts, dtype = float))
+    times = np.broadcast_to(np.asarray(times, dtype = float), amounts.shape)
+    low = np.full(len(amounts), XIRR_BRACKET[0])
+    high = np.full(len(amounts), XIRR_BRACKET[1])
+    lowNpv = _npv(low, amounts, times)[0]
+    highNpv = _npv(high, amounts, times)[0]
+    solvable = np.sign(lowNpv) * np.sign(highNpv) < 0
+    lowSign = np.sign(lowNpv)
+    scale = np.abs(amounts).sum(axis = 1)
+
+    rates = np.where(solvable, 0.1, np.nan)
+    active = solvable.copy()
+    for iteration in range(XIRR_MAX_ITERATIONS):
+        if not active.any():
+            break
+        npv, derivative = _npv(rates[active], amounts[active], times[active])
+        # Keep the bracket around the root
+        belowRoot = np.sign(npv) == lowSign[active]
+        low[active] = np.where(belowRoot, rates[active], low[active])
+        high[active] = np.where(belowRoot, high[active], rates[active])
+        # Newton step, or bisection if the step leaves the bracket
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            newton = rates[active] - npv / derivative
+        inside = (newton > low[active]) & (newton < high[active])
+        newRates = np.where(inside, newton, (low[active] + high[active]) / 2)
+        converged = (np.abs(npv) <= XIRR_TOLERANCE * scale[active]) | \
+                    (np.abs(newRates - rates[active]) <= XIRR_TOLERANCE)
+        rates[active] = np.where(converged, rates[active], newRates)
+        activeIndex = np.flatnonzero(active)
+        active[activeIndex[converged]] = False
+    return rates
+
+
+# Converts an array of "yyyy-mm-dd" strings to years since firstDate
+def toYears(dates, firstDate):
+    days = (pd.to_datetime(dates) - pd.Timestamp(str(firstDate))).days
+    return np.asarray(days, dtype = float) / DAYS_PER_YEAR
+
+
+# Gets the last date of each month in dates (a sorted array of "yyyy-mm-dd" strings)
+def getMonthEnds(dates):
+    months = pd.to_datetime(dates).to_period("M").to_numpy()
+    return dates[np.concatenate((months[1:] != months[:-1], [True]))]
+
+
+# Gets the dates, values and net cash flows of each stock in codes (and of the
+# whole portfolio, as an extra last column) on every date between startDate
+# and endDate that any of the stocks has a price for, along with the opening
+# value of the shares held before the first date (at the first date's prices).
+# If baseCurrency is given the amounts are converted into it.
+def getValuesAndFlows(database, codes, startDate, endDate, baseCurrency = None):
+    dates, prices = aggregator.getPriceMatrix(database, codes, startDate, endDate)
+    if len(dates) == 0:
+        return dates, np.zeros((0, len(codes) + 1)), np.zeros((0, len(codes) + 1)), np.zeros(len(codes) + 1)
+    # The first row of the running totals holds the transactions before the first date
+    totalDates = np.concatenate(([str(np.datetime64(dates[0]) - 1)], dates))
+    owned, spent = aggregator.getRunningTotalMatrices(database, SC.TABLE_NAME, SC.CODE, SC.DATE,
+                                                      [SC.NUMBER_PURCHASED, SC.COST], codes, totalDates)
+    [dividends] = aggregator.getRunningTotalMatrices(database, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_CODE, SC.DIVIDEND_DATE,
+                                                     [SC.DIVIDEND_AMOUNT], codes, totalDates)
+    # Totals since the start, so that only the flows on each date are converted
+    matrices = {SC.HOLDINGS_PRICE: prices,
+                SC.HOLDINGS_SPENT: spent[1:] - spent[0],
+                SC.HOLDINGS_DIVIDENDS: dividends[1:] - dividends[0]}
+    if baseCurrency is not None:
+        fxRates.convertMatrices(database, matrices, dates, fxRates.getCurrencies(database, codes).to_numpy(), baseCurrency)
+    prices = matrices[SC.HOLDINGS_PRICE]
+    values = np.nan_to_num(owned[1:] * prices)
+    opening = np.nan_to_num(owned[0] * prices[0])
+    flows = np.diff(matrices[SC.HOLDINGS_SPENT] - matrices[SC.HOLDINGS_DIVIDENDS], axis = 0, prepend = 0)
+    values = np.column_stack((values, values.sum(axis = 1)))
+    flows = np.column_stack((flows, flows.sum(axis = 1)))
+    return dates, values, flows, np.append(opening, opening.sum())
+
+
+# Gets a dataframe, indexed by stock code plus a "Portfolio" row, of the time
+# weighted return, XIRR, maximum drawdown, volatility, volatility over the last
+# window periods and Sharpe ratio of each stock in codes between startDate and
+# endDate, with the amounts converted into baseCurrency if it is given.
+def getPerformance(database, codes, startDate, endDate, riskFreeRate = 0, baseCurrency = None,
+                   window = ROLLING_WINDOW):
+    dates, values, flows, opening = getValuesAndFlows(database, codes, startDate, endDate, baseCurrency)
+    returns = getPeriodReturns(values, flows, opening)
+    if len(dates) > 0:
+        [xirrs] = getXirrMatrix(database, codes, dates[-1:], baseCurrency)
+        recentVolatility = rollingVolatility(returns, window)[-1]
+    else:
+        xirrs = recentVolatility = np.full(len(codes) + 1, np.nan)
+    return pd.DataFrame({"TWR": timeWeightedReturn(returns),
+                         "XIRR": xirrs,
+                         "Max_Drawdown": maxDrawdown(returns),
+                         "Volatility": volatility(returns),
+                         "Rolling_Volatility": recentVolatility,
+                         "Sharpe": sharpeRatio(returns, riskFreeRate)},
+                        index = list(codes) + [PORTFOLIO_COLUMN],
+                        columns = ["TWR", "XIRR", "Max_Drawdown", "Volatility", "Rolling_Volatility", "Sharpe"])
+
+
+# Gets a dataframe, indexed by the last date in each month between startDate
+# and endDate that any of the stocks has a price for, of the XIRR of each stock
+# in codes and of the portfolio from all the cash flows up to that date, and
+# their volatility over the window periods up to it. The columns are
+# (metric, stock code) pairs.
+def getMonthlyPerformance(database, codes, startDate, endDate, window = ROLLING_WINDOW, baseCurrency = None):
+    dates, values, flows, opening = getValuesAndFlows(database, codes, startDate, endDate, baseCurrency)
+    columns = pd.MultiIndex.from_product([["XIRR", "Rolling_Volatility"], list(codes) + [PORTFOLIO_COLUMN]])
+    if len(dates) == 0:
+        return pd.DataFrame(columns = columns, dtype = float)
+    monthEnds = getMonthEnds(dates)
+    xirrs = getXirrMatrix(database, codes, monthEnds, baseCurrency)
+    returns = getPeriodReturns(values, flows, opening)
+    rolling = rollingVolatility(returns, window)[np.searchsorted(dates, monthEnds)]
+    return pd.DataFrame(np.hstack((xirrs, rolling)), index = monthEnds, columns = columns)
+
+
+# Gets a (len(evaluationDates) x len(codes) + 1) matrix of the XIRR of each
+# stock in codes, and of the whole portfolio in the last column, from all
+# purchases, sales and dividends up to each of evaluationDates (a sorted array
+# of "yyyy-mm-dd" strings), valuing the holding at the latest price on or
+# before that date. All the problems are solved together by xirr(). If
+# baseCurrency is given, cash flows are converted into it at the rate on the
+# date they were paid and values at the rate on the evaluation date.
+def getXirrMatrix(database, codes, evaluationDates, baseCurrency = None):
+    evaluationDates = np.asarray(evaluationDates).astype(str)
+    lastDate = evaluationDates[-1]
+    sqlQuery = ''' SELECT {0} AS Code, {1} AS Date, -SUM({2}) AS Amount FROM {3}
+        WHERE {0} IN ({4}) AND {1} <= date(?) GROUP BY {0}, {1}
+        UNION ALL
+        SELECT {5}, {6}, SUM({7}) FROM {8}
+        WHERE {5} IN ({4}) AND {6} <= date(?) GROUP BY {5}, {6}''' \
+        .format(SC.CODE, SC.DATE, SC.COST, SC.TABLE_NAME, aggregator.placeholders(codes),
+                SC.DIVIDEND_CODE, SC.DIVIDEND_DATE, SC.DIVIDEND_AMOUNT, SC.DIVIDEND_TABLE_NAME)
+    data = database.readDatabase(sqlQuery, list(codes) + [str(lastDate)] + list(codes) + [str(lastDate)])
+    if len(data) == 0:
+        return np.full((len(evaluationDates), len(codes) + 1), np.nan)
+
+    # Cash flow amounts as a (flow dates x codes) matrix, plus a portfolio column
+    flowDates, rowIndex = np.unique(data["Date"].to_numpy().astype(str), return_inverse = True)
+    columnIndex = pd.Index(codes).get_indexer(data["Code"])
+    amounts = np.zeros((len(flowDates), len(codes)))
+    flowAmounts = data["Amount"].fillna(0).to_numpy(dtype = float)
+    if baseCurrency is not None:
+        currencies = fxRates.getCurrencies(database, codes).to_numpy()
+        flowAmounts = fxRates.convertAmounts(database, flowAmounts, flowDates[rowIndex], currencies[columnIndex],
+                                             baseCurrency)
+    np.add.at(amounts, (rowIndex, columnIndex), flowAmounts)
+    amounts = np.column_stack((amounts, amounts.sum(axis = 1)))
+
+    # Value of each holding on each evaluation date, which is treated as a
+    # final positive cash flow
+    priceDates, prices = aggregator.getPriceMatrix(database, codes, flowDates[0], lastDate)
+    priceRows = np.searchsorted(priceDates, evaluationDates, side = "right") - 1
+    prices = np.where((priceRows >= 0)[:, None], prices[np.maximum(priceRows, 0)], np.nan)
+    if baseCurrency is not None:
+        prices = fxRates.convertMatrices(database, {SC.HOLDINGS_PRICE: prices}, evaluationDates, currencies,
+                                         baseCurrency)[SC.HOLDINGS_PRICE]
+    [owned] = aggregator.getRunningTotalMatrices(database, SC.TABLE_NAME, SC.CODE, SC.DATE,
+                                                 [SC.NUMBER_PURCHASED], codes, evaluationDates)
+    values = np.nan_to_num(owned * prices)
+    values = np.column_stack((values, values.sum(axis = 1)))
+
+    # One problem per (evaluation date, series), each with every flow date
+    # (zeroed after the evaluation date) followed by the final value
+    numberDates, numberSeries = values.shape
+    included = flowDates[None, :] <= evaluationDates[:, None]
+    problemAmounts = np.where(included[:, None, :], amounts.T[None, :, :], 0)
+    problemAmounts = np.concatenate((problemAmounts, values[:, :, None]), axis = 2)
+    flowTimes = toYears(flowDates, flowDates[0])
+    evaluationTimes = toYears(evaluationDates, flowDates[0])
+    problemTimes = np.concatenate((np.broadcast_to(flowTimes, (numberDates, numberSeries, len(flowDates))),
+                                   np.broadcast_to(evaluationTimes[:, None, None], (numberDates, numberSeries, 1))), axis = 2)
+    rates = xirr(problemAmounts.reshape(numberDates * numberSeries, -1),
+                 problemTimes.reshape(numberDates * numberSeries, -1))
+    return rates.reshape(numberDates, numberSeries)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 portfolioAggregator.py
+Created on Sun Oct 18 10:12:41 2026
+
+@author: dmcauslan
+
+Functions for building time series across every stock in a portfolio at once.
+Rather than querying each stock separately and merging the results, each table
+is read once for all of the stock codes and pivoted into a (date x stock code)
+NumPy matrix, which is forward filled and summed along the stock axis.
+
+Price matrices and running totals of shares are adjusted for splits (see
+corporateActions.py), so they are in shares as they are after every split.
+"""
+import numpy as np
+import pandas as pd
+import stockContract as SC
+import corporateActions
+
+
+# Gets the ? placeholders for binding a list of values (e.g. stock codes) in
+# an sql IN (...) clause
+def placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+# Forward fills the NaN values in each column of matrix with the last valid
+# value above it. Values before the first valid value in a column stay NaN.
+def forwardFill(matrix):
+    rows = np.arange(matrix.shape[0])[:, None]
+    lastValid = np.where(np.isnan(matrix), 0, rows)
+    np.maximum.accumulate(lastValid, axis = 0, out = lastValid)
+    return matrix[lastValid, np.arange(matrix.shape[1])]
+
+
+# Gets the price data for all of the stocks in codes between startDate and endDate.
+# Returns (dates, prices) where dates is a sorted array of every date that any of
+# the stocks has a price for, and prices is a (len(dates) x len(codes)) matrix.
+# Prices are adjusted for splits, forward filled over dates a stock has no data
+# for and are NaN before a stock's first price.
+def getPriceMatrix(database, codes, startDate, endDate):
+    sqlQuery = ''' SELECT {}, {}, {} FROM {}
+        WHERE {} IN ({})
+        AND {} BETWEEN date(?) AND date(?)''' \
+        .format(SC.HISTORICAL_CODE, SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME,
+                SC.HISTORICAL_CODE, placeholders(codes),
+                SC.HISTORICAL_DATE)
+    data = database.readDatabase(sqlQuery, list(codes) + [str(startDate), str(endDate)])
+
+    # np.unique sorts the dates and gives the row of each price at the same time
+    dates, rowIndex = np.unique(data[SC.HISTORICAL_DATE].to_numpy().astype(str), return_inverse = True)
+    columnIndex = pd.Index(codes).get_indexer(data[SC.HISTORICAL_CODE])
+    prices = np.full((len(dates), len(codes)), np.nan)
+    prices[rowIndex, columnIndex] = data[SC.HISTORICAL_PRICE].to_numpy(dtype = float) \
+        / corporateActions.getRowFactors(database, data[SC.HISTORICAL_CODE], data[SC.HISTORICAL_DATE])
+    return dates, forwardFill(prices)
+
+
+# Gets a list of (len(dates) x len(codes)) matrices, one for each column in
+# amountColumns, holding the running total of that column in tableName for each
+# stock up to and including each date in dates (a sorted array of "yyyy-mm-dd"
+# strings). Transactions before dates[0] are included in the first row.
+# Numbers of shares (Number_Purchased) are adjusted for splits.
+def getRunningTotalMatrices(database, tableName, codeColumn, dateColumn, amountColumns, codes, dates):
+    if len(dates) == 0:
+        return [np.zeros((0, len(codes))) for column in amountColumns]
+    sums = ", ".join("SUM({0}) AS {0}".format(column) for column in amountColumns)
+    sqlQuery = ''' SELECT {}, {}, {} FROM {}
+        WHERE {} IN ({})
+        AND {} <= date(?)
+        GROUP BY {}, {}''' \
+        .format(codeColumn, dateColumn, sums, tableName,
+                codeColumn, placeholders(codes),
+                dateColumn,
+                codeColumn, dateColumn)
+    data = database.readDatabase(sqlQuery, list(codes) + [str(dates[-1])])
+
+    # Each transaction is counted on the first date on or after it, then the
+    # cumulative sum carries it forward to all later dates.
+    rowIndex = np.searchsorted(dates, data[dateColumn].to_numpy().astype(str), side = "left")
+    columnIndex = pd.Index(codes).get_indexer(data[codeColumn])
+    matrices = []
+    for amountColumn in amountColumns:
+        amounts = data[amountColumn].fillna(0).to_numpy(dtype = float)
+        if amountColumn == SC.NUMBER_PURCHASED:
+            amounts = amounts * corporateActions.getRowFactors(database, data[codeColumn], data[dateColumn])
+        totals = np.zeros((len(dates), len(codes)))
+        np.add.at(totals, (rowIndex, columnIndex), amounts)
+        matrices.append(np.cumsum(totals, axis = 0))
+    return matrices
+
+
+# Gets a series, indexed by stock code, of the latest price of each stock in
+# codes on or before date. Raises a ValueError if any of the stocks have no
+# price data on or before date.
+def getPricesAsOf(database, codes, date):
+    sqlQuery = ''' SELECT prices.{0}, prices.{1} FROM {2} AS prices
+        JOIN (SELECT {0}, MAX({3}) AS {3} FROM {2}
+              WHERE {0} IN ({4})
+              AND {3} <= date(?)
+              GROUP BY {0}) AS latest
+        ON prices.{0} = latest.{0} AND prices.{3} = latest.{3}''' \
+        .format(SC.HISTORICAL_CODE, SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME,
+                SC.HISTORICAL_DATE, placeholders(codes))
+    data = database.readDatabase(sqlQuery, list(codes) + [str(date)])
+    prices = data.set_index(SC.HISTORICAL_CODE)[SC.HISTORICAL_PRICE].reindex(codes)
+    missing = prices.index[prices.isnull()].tolist()
+    if len(missing) > 0:
+        raise ValueError("No price data for {} on or before {}.".format(", ".join(missing), date))
+    return prices
+
+
+# Gets a series, indexed by stock code, of the number of shares owned of each
+# stock in codes on date. Shares bought before a split on or before date are
+# counted as the shares they became.
+def getOwnedAsOf(database, codes, date):
+    sqlQuery = ''' SELECT {0}, {5}, SUM({1}) AS {2} FROM {3}
+        WHERE {0} IN ({4})
+        AND {5} <= date(?)
+        GROUP BY {0}, {5}''' \
+        .format(SC.CODE, SC.NUMBER_PURCHASED, SC.TOTAL_OWNED, SC.TABLE_NAME,
+                placeholders(codes), SC.DATE)
+    data = database.readDatabase(sqlQuery, list(codes) + [str(date)])
+    factors = corporateActions.getRowFactors(database, data[SC.CODE], data[SC.DATE]) \
+        / corporateActions.getRowFactors(database, data[SC.CODE], np.full(len(data), str(date)))
+    data[SC.TOTAL_OWNED] = data[SC.TOTAL_OWNED].to_numpy(dtype = float) * factors
+    return data.groupby(SC.CODE)[SC.TOTAL_OWNED].sum().reindex(codes).fillna(0)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 priceCache.py
+Created on Sun Oct 18 13:05:44 2026
+
+@author: dmcauslan
+
+In-memory cache of price lookups, so that repeated requests for the same price
+(or range of prices) don't go back to the database. There is one cache per
+Database object, see getPriceCache().
+
+Keys are tuples of the kind of entry (one of KINDS) followed by the stock code,
+e.g. (PRICE, code, date) for a single price or (RANGE, code, startDate,
+endDate) for a range, so entries of different kinds never share a key. When
+new price data is written for a stock (stockDownloader.insertPrices()) all of
+that stock's entries are removed. The least recently used entries are evicted once the
+cache holds maxSize entries.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+
+###############
+## Constants ##
+###############
+DEFAULT_CACHE_SIZE = 4096
+# Kinds of entry, the first element of every key
+PRICE = "price"
+PRICE_AS_OF = "asOf"
+RANGE = "range"
+SPLITS = "splits"
+KINDS = [PRICE, PRICE_AS_OF, RANGE, SPLITS]
+
+
+# Least recently used cache of price data, keyed by tuples of the kind of entry
+# and the stock code followed by the rest of the lookup. Safe to share between
+# threads.
+class PriceCache:
+    def __init__(self, maxSize = DEFAULT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        
+    # Returns the value stored for key, or None if it isn't in the cache.
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+        
+        
+    # Stores value under key, evicting the least recently used entry if the
+    # cache is full.
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last = False)
+                
+                
+    # Removes all of the entries for the stock stockCode.
+    def invalidate(self, stockCode):
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == stockCode]:
+                del self._entries[key]
+                
+                
+    # Removes all entries and resets the counters.
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            
+            
+    # Returns a dictionary of the cache size and hit/miss counts.
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries),
+                    "maxSize": self.maxSize,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hitRate": self.hits / lookups if lookups > 0 else 0}
+        
+        
+# One cache per Database, dropped when the Database is garbage collected
+_caches = weakref.WeakKeyDictionary()
+_cachesLock = threading.Lock()
+
+
+# Gets the price cache for database, creating it if needed.
+def getPriceCache(database):
+    with _cachesLock:
+        if database not in _caches:
+            _caches[database] = PriceCache()
+        return _caches[database]
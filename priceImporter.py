@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 priceImporter.py
+Created on Sun Oct 18 11:02:17 2026
+
+@author: dmcauslan
+
+Price source that reads historical price data from local CSV or Parquet files,
+such as the bulk price dumps supplied by data vendors. A file can hold any
+number of stocks. The file is read in chunks and each chunk is written to the
+historical table with a single executemany, so a new database can be seeded
+from a dump of millions of rows without holding it all in memory.
+
+Exchange rates can be read from the same kind of file, with the code column
+holding the Yahoo code of the currency pair (e.g. USDAUD=X, see
+stockDownloader.RATE_CODE).
+
+Usage:
+    source = FilePriceSource("prices.csv", codeColumn = "ticker",
+                             dateColumn = "date", priceColumn = "close")
+    source.importAll(portfolio.stockDatabase)     # load every stock in the file
+    portfolio.refreshPrices(priceSource = source) # or just the portfolio's stocks
+    portfolio.refreshRates(priceSource = source)  # and the exchange rates
+"""
+import pandas as pd
+import stockContract as SC
+from stockDownloader import PriceSource, upsertPrices, refreshStocks, RATE_CODE
+import fxRates
+
+###############
+## Constants ##
+###############
+# Number of rows read from the file and written to the database at a time
+DEFAULT_CHUNK_SIZE = 100000
+
+
+# Price source that reads prices from a CSV or Parquet file (chosen by the file
+# extension). codeColumn, dateColumn and priceColumn give the names of the
+# columns in the file holding the stock code, date and price.
+class FilePriceSource(PriceSource):
+    def __init__(self, filePath, codeColumn = SC.HISTORICAL_CODE, dateColumn = SC.HISTORICAL_DATE,
+                 priceColumn = SC.HISTORICAL_PRICE, chunkSize = DEFAULT_CHUNK_SIZE):
+        self.filePath = filePath
+        self.codeColumn = codeColumn
+        self.dateColumn = dateColumn
+        self.priceColumn = priceColumn
+        self.chunkSize = chunkSize
+        
+        
+    # Adds the prices of stockCode between minDate and maxDate (no limit if None)
+    # to the database. Returns the number of rows added.
+    def update(self, stockCode, database, minDate = '1900-01-01', maxDate = None):
+        return self._import(database, [stockCode], minDate, maxDate)
+        
+        
+    # Adds the rates from fromCurrency to toCurrency between minDate and maxDate
+    # (no limit if None) to the fxRates table. Returns the number of rows added.
+    def updateRates(self, fromCurrency, toCurrency, database, minDate = '1900-01-01', maxDate = None):
+        return self._import(database, [RATE_CODE.format(fromCurrency, toCurrency)], minDate, maxDate,
+                            fxRates.getRateWriter(fromCurrency, toCurrency))
+        
+        
+    # Adds the prices of every stock in the file to the database, or only those
+    # in stockCodes if it is given. Returns the number of rows added.
+    def importAll(self, database, stockCodes = None):
+        return self._import(database, stockCodes, '1900-01-01')
+        
+        
+    # Reads the file a chunk at a time, writing the rows for stockCodes (all
+    # stocks if None) dated between minDate and maxDate to the database with
+    # insertRows (by default upserted into the historical table, refreshing the
+    # snapshots, cached prices and columnar files of the stocks once at the end,
+    # see stockDownloader.refreshStocks()). The whole import is a single
+    # transaction, so a failure part way through adds nothing.
+    def _import(self, database, stockCodes, minDate, maxDate = None, insertRows = None):
+        rowsAdded = 0
+        firstDates = {}
+        if insertRows is None:
+            insertRows = lambda database, rows: upsertPrices(database, rows, firstDates)
+        with database.transaction():
+            for chunk in self._readChunks():
+                chunk = self._clean(chunk)
+                if stockCodes is not None:
+                    chunk = chunk[chunk[SC.HISTORICAL_CODE].isin(stockCodes)]
+                chunk = chunk[chunk[SC.HISTORICAL_DATE] >= minDate]
+                if maxDate is not None:
+                    chunk = chunk[chunk[SC.HISTORICAL_DATE] <= maxDate]
+                rowsAdded += insertRows(database, chunk.itertuples(index = False, name = None))
+            refreshStocks(database, firstDates)
+        print("Imported {} price rows from {}".format(rowsAdded, self.filePath))
+        return rowsAdded
+        
+        
+    # Generator over the file in dataframes of at most chunkSize rows holding
+    # only the code, date and price columns.
+    def _readChunks(self):
+        columns = [self.codeColumn, self.dateColumn, self.priceColumn]
+        if self.filePath.lower().endswith((".parquet", ".pq")):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("pyarrow is required to import Parquet price files.")
+            parquetFile = pq.ParquetFile(self.filePath)
+            for batch in parquetFile.iter_batches(batch_size = self.chunkSize, columns = columns):
+                yield batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(self.filePath, usecols = columns, chunksize = self.chunkSize):
+                yield chunk
+                
+                
+    # Renames the columns of chunk to the historical table's column names,
+    # converts the dates to "yyyy-mm-dd" and drops rows without a price.
+    def _clean(self, chunk):
+        chunk = chunk.rename(columns = {self.codeColumn: SC.HISTORICAL_CODE,
+                                        self.dateColumn: SC.HISTORICAL_DATE,
+                                        self.priceColumn: SC.HISTORICAL_PRICE})
+        chunk = chunk[SC.HISTORICAL_COLUMNS].dropna()
+        chunk[SC.HISTORICAL_CODE] = chunk[SC.HISTORICAL_CODE].astype(str)
+        chunk[SC.HISTORICAL_DATE] = pd.to_datetime(chunk[SC.HISTORICAL_DATE]).dt.strftime("%Y-%m-%d")
+        chunk[SC.HISTORICAL_PRICE] = chunk[SC.HISTORICAL_PRICE].astype(float)
+        return chunk
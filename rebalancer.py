@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 rebalancer.py
+Created on Sun Oct 18 14:31:52 2026
+
+@author: dmcauslan
+
+Rebalancing engine used for value averaging. Given the current holdings,
+prices and target weights of a portfolio as arrays, and an amount of cash to
+invest, solveRebalance() works out how many whole shares of each stock to buy
+(or sell) so that the final weights are as close as possible to the targets,
+without spending more than the cash available (including brokerage fees),
+and returns the result as a RebalancePlan.
+
+The integer allocation is solved in three vectorized steps:
+    1. Work out the target value of each stock, allowing for the expected
+    fees (if selling is not allowed the cash is spread over the underweight
+    stocks so that they all end at the same fraction of their target weight).
+    Trade towards these targets, rounding the number of shares towards zero
+    and dropping trades smaller than the minimum.
+    2. If fees push the total over budget, remove shares one at a time from
+    the buy that most overshoots its target.
+    3. Spend the cash left over one share at a time on the stock furthest
+    below its target, as long as that moves it closer to the target.
+Each step is O(number of stocks) per share moved, so portfolios of hundreds of
+holdings are solved in milliseconds.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Brokerage fee charged on each trade: the larger of minimumFee and
+# fixedFee + percentageFee * trade value. No fee is charged if there is no trade.
+class FeeModel:
+    def __init__(self, fixedFee = 0, percentageFee = 0, minimumFee = 0):
+        self.fixedFee = fixedFee
+        self.percentageFee = percentageFee
+        self.minimumFee = minimumFee
+
+
+    # Gets the fee for each of the trades in the array tradeValues
+    def getFees(self, tradeValues):
+        tradeValues = np.abs(np.asarray(tradeValues, dtype = float))
+        fees = np.maximum(self.fixedFee + self.percentageFee * tradeValues, self.minimumFee)
+        return np.where(tradeValues > 0, fees, 0)
+
+
+# The result of solveRebalance(). Holds the inputs and the number of shares to
+# trade of each stock (negative for sales), along with the resulting values,
+# weights and fees.
+class RebalancePlan:
+    def __init__(self, codes, holdings, prices, targetWeights, trades, feeModel, cash):
+        self.codes = list(codes)
+        self.holdings = holdings
+        self.prices = prices
+        self.targetWeights = targetWeights
+        self.trades = trades.astype(int)
+        self.cash = cash
+        self.tradeValues = trades * prices
+        self.fees = feeModel.getFees(self.tradeValues)
+        self.finalValues = (holdings + trades) * prices
+        finalTotal = self.finalValues.sum()
+        self.finalWeights = self.finalValues / finalTotal if finalTotal > 0 else np.zeros_like(self.finalValues)
+        self.totalSpent = self.tradeValues.sum()
+        self.totalFees = self.fees.sum()
+        self.cashRemaining = cash - self.totalSpent - self.totalFees
+
+
+    # Gets a dataframe with one row per stock describing the plan
+    def toDataFrame(self):
+        return pd.DataFrame({"Stock Code": self.codes,
+                             "To Buy": self.trades,
+                             "Price ($)": self.prices,
+                             "Total Cost ($)": self.tradeValues,
+                             "Fee ($)": self.fees,
+                             "Desired (%)": 100 * self.targetWeights,
+                             "Final (%)": np.round(100 * self.finalWeights, 1)
+                             }, columns = ['Stock Code', 'To Buy', 'Price ($)', "Total Cost ($)", "Fee ($)", "Desired (%)", "Final (%)"])
+
+
+    # Class string method
+    def __str__(self):
+        return str(self.toDataFrame()) + \
+            "\nTotal to spend: ${:.2f} plus ${:.2f} in fees. Total portfolio value after purchase: ${:.2f}." \
+            .format(self.totalSpent, self.totalFees, self.finalValues.sum())
+
+
+# Gets the value of each stock that the portfolio should be rebalanced to when
+# investing cash. If selling is allowed this is simply the target weights of
+# the new total value. Otherwise cash is only spread over the stocks below
+# their target, raising them to the same level lam * weight, where lam is
+# found from the sorted breakpoints value / weight at which each stock starts
+# receiving cash.
+def getTargetValues(currentValues, targetWeights, cash, sellingAllowed):
+    if sellingAllowed:
+        return targetWeights * (currentValues.sum() + cash)
+    held = targetWeights > 0
+    weights = targetWeights[held]
+    values = currentValues[held]
+    order = np.argsort(values / weights)
+    breakpoints = (values / weights)[order]
+    cumulativeWeights = np.cumsum(weights[order])
+    cumulativeValues = np.cumsum(values[order])
+    # Cash needed to raise every stock up to each breakpoint
+    cashNeeded = breakpoints * cumulativeWeights - cumulativeValues
+    active = np.searchsorted(cashNeeded, cash, side = "right") - 1
+    lam = (max(cash, 0) + cumulativeValues[active]) / cumulativeWeights[active]
+    return targetWeights * lam
+
+
+# Works out how many whole shares of each stock to trade.
+# params
+# holdings - array of the number of shares currently owned of each stock
+# prices - array of the current price of each stock
+# targetWeights - array of the desired fraction of the portfolio in each stock, summing to 1
+# cash - the amount of money available to invest
+# sellingAllowed - boolean - whether stocks can be sold to rebalance
+# minimumTransaction - the smallest trade value that is worth making
+# feeModel - FeeModel giving the brokerage charged on each trade (no fees if None)
+# codes - optional list of stock codes, used to label the plan
+def solveRebalance(holdings, prices, targetWeights, cash, sellingAllowed = False,
+                   minimumTransaction = 0, feeModel = None, codes = None):
+    holdings = np.asarray(holdings, dtype = float)
+    prices = np.asarray(prices, dtype = float)
+    targetWeights = np.asarray(targetWeights, dtype = float)
+    if feeModel is None:
+        feeModel = FeeModel()
+    if codes is None:
+        codes = range(len(prices))
+    if abs(targetWeights.sum() - 1) > 1e-9:
+        raise ValueError("Target weights must sum to 1. Current sum = {}.".format(targetWeights.sum()))
+    if (prices <= 0).any():
+        raise ValueError("All prices must be greater than 0.")
+
+    currentValues = holdings * prices
+
+    # Step 1: whole share trades towards the targets, ignoring small trades.
+    # The targets are worked out a second time with the fees of the first
+    # attempt taken out of the cash.
+    def getTrades(targetValues):
+        trades = np.fix((targetValues - currentValues) / prices)
+        if not sellingAllowed:
+            trades = np.maximum(trades, 0)
+        trades[np.abs(trades * prices) < minimumTransaction] = 0
+        return trades
+    trades = getTrades(getTargetValues(currentValues, targetWeights, cash, sellingAllowed))
+    fees = feeModel.getFees(trades * prices).sum()
+    targetValues = getTargetValues(currentValues, targetWeights, cash - fees, sellingAllowed)
+    trades = getTrades(targetValues)
+
+    # Cash spent on trades plus fees
+    def getSpent(trades):
+        tradeValues = trades * prices
+        return tradeValues.sum() + feeModel.getFees(tradeValues).sum()
+
+    # Step 2: remove shares from the buy that most overshoots its target until
+    # the plan fits in the budget
+    while getSpent(trades) > cash and (trades > 0).any():
+        overshoot = np.where(trades > 0, (holdings + trades) * prices - targetValues, -np.inf)
+        stock = np.argmax(overshoot)
+        trades[stock] -= 1
+        if trades[stock] * prices[stock] < minimumTransaction:
+            trades[stock] = 0
+
+    # Step 3: spend any cash left over, one share (or the smallest trade worth
+    # making, for stocks not already being bought) at a time, on the stock
+    # furthest below its target.
+    newTradeShares = np.maximum(1, np.ceil(minimumTransaction / prices))
+    while True:
+        shortfall = targetValues - (holdings + trades) * prices
+        addShares = np.where(trades > 0, 1, newTradeShares)
+        addValues = addShares * prices
+        # Cost of the extra shares, including the change in fees
+        addCosts = addValues + feeModel.getFees((trades + addShares) * prices) - feeModel.getFees(trades * prices)
+        eligible = (trades >= 0) & (addCosts <= cash - getSpent(trades)) & (addValues < 2 * shortfall)
+        if not eligible.any():
+            break
+        stock = np.argmax(np.where(eligible, shortfall, -np.inf))
+        trades[stock] += addShares[stock]
+
+    return RebalancePlan(codes, holdings, prices, targetWeights, trades, feeModel, cash)
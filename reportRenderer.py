@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 reportRenderer.py
+Created on Sun Oct 18 17:22:40 2026
+
+@author: dmcauslan
+
+Draws the stock and portfolio figures, and renders them to PNG, SVG or HTML
+files without a display for generating reports on a server.
+
+The draw functions take an existing figure and the series returned by
+Stock.getTimeSeries() or Portfolio.getSeries(), so the same code is used by
+Stock.plot() and Portfolio.plotPortfolio() for interactive plots and by the
+render functions here. Rendering uses matplotlib's Agg canvas directly rather
+than pyplot, so it doesn't depend on the configured backend and is safe to
+run in worker processes.
+
+A hash of the data behind each figure is saved next to the output file
+(with a ".hash" extension), and the figure is only rendered again when the
+data has changed.
+"""
+import base64
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import stockContract as SC
+
+###############
+## Constants ##
+###############
+FORMATS = ["png", "svg", "html"]
+FIGURE_SIZE = (12, 12)
+DPI = 100
+HASH_EXTENSION = ".hash"
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{0}</title></head>
+<body>
+<h1>{0}</h1>
+<img src="data:image/png;base64,{1}" alt="{0}">
+</body>
+</html>
+"""
+
+
+# Draws the value, amount spent, shares owned, dividends, price and profit of
+# a stock on fig. data is a dataframe from Stock.getTimeSeries().
+def drawStock(fig, stockCode, data):
+    date = pd.to_datetime(data[SC.HISTORICAL_DATE])
+    value = data[SC.TOTAL_VALUE]
+    owned = data[SC.TOTAL_OWNED]
+    price = data[SC.HISTORICAL_PRICE]
+    spent = data[SC.TOTAL_SPENT]
+    dividend = data[SC.DIVIDEND_TOTAL]
+
+    ax = fig.add_subplot(411)
+    ax.set_title(stockCode, fontsize = 16)
+    ax.plot(date, value)
+    ax.plot(date, spent, color = sns.color_palette()[1])
+    ax.set_ylabel("Amount ($)", fontsize = 14)
+    ax.legend(["Value", "Amount Spent"], loc = "upper left")
+
+    sns.set_style("dark")
+    ax = fig.add_subplot(412)
+    ax.plot(date, owned)
+    ax.set_ylabel("Number of shares owned", fontsize = 14, color = sns.color_palette()[0])
+    ax2 = ax.twinx()
+    ax2.plot(date, dividend, color = sns.color_palette()[1])
+    ax2.set_ylabel("Total Dividend ($)", fontsize = 14, color = sns.color_palette()[1])
+    ax2.xaxis.grid(True)
+    ax.xaxis.grid(True)
+
+    sns.set_style("darkgrid")
+    ax = fig.add_subplot(413)
+    ax.plot(date, price)
+    ax.set_ylabel("Stock price ($)", fontsize = 14)
+
+    ax = fig.add_subplot(414)
+    ax.plot(date, value - spent)
+    ax.plot(date, value - spent + dividend)
+    ax.legend(["Share Profit", "Share Profit + Dividend"], loc = "upper left")
+    ax.set_ylabel("Profit ($)", fontsize = 14)
+    ax.set_xlabel("Date", fontsize = 14)
+
+
+# Draws the total amount spent, value, dividends and profit of a portfolio on
+# fig. data is a dataframe from Portfolio.getSeries().
+def drawPortfolio(fig, data):
+    date = pd.to_datetime(data[SC.HISTORICAL_DATE])
+    spent = data[SC.TOTAL_SPENT]
+    value = data[SC.TOTAL_VALUE]
+    dividends = data[SC.DIVIDEND_TOTAL]
+
+    ax = fig.add_subplot(511)
+    ax.set_title("Portfolio Totals", fontsize = 16)
+    ax.plot(date, spent)
+    ax.set_ylabel("Spent ($)", fontsize = 14)
+
+    ax = fig.add_subplot(512)
+    ax.plot(date, value)
+    ax.set_ylabel("Value ($)", fontsize = 14)
+
+    ax = fig.add_subplot(513)
+    ax.plot(date, dividends)
+    ax.set_ylabel("Dividends ($)", fontsize = 14)
+
+    ax = fig.add_subplot(514)
+    ax.plot(date, value - spent)
+    ax.plot(date, value - spent + dividends)
+    ax.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
+    ax.set_ylabel("Profit ($)", fontsize = 14)
+
+    ax = fig.add_subplot(515)
+    ax.plot(date, 100*(value - spent)/spent)
+    ax.plot(date, 100*(value - spent + dividends)/spent)
+    ax.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
+    ax.set_ylabel("% Profit ($)", fontsize = 14)
+    ax.set_xlabel("Date", fontsize = 14)
+
+
+# Gets a hash of the data behind a figure, which changes if any of the data,
+# the title or the output format changes.
+def getDataHash(title, data, fileFormat):
+    dataHash = hashlib.sha1("{}|{}|{}".format(title, fileFormat, list(data.columns)).encode())
+    dataHash.update(pd.util.hash_pandas_object(data, index = False).to_numpy().tobytes())
+    return dataHash.hexdigest()
+
+
+# Saves fig to filePath in fileFormat. HTML files hold the figure as an
+# embedded PNG.
+def saveFigure(fig, filePath, fileFormat, title):
+    FigureCanvasAgg(fig)
+    if fileFormat == "html":
+        image = io.BytesIO()
+        fig.savefig(image, format = "png", dpi = DPI)
+        with open(filePath, "w") as htmlFile:
+            htmlFile.write(HTML_TEMPLATE.format(title, base64.b64encode(image.getvalue()).decode("ascii")))
+    else:
+        fig.savefig(filePath, format = fileFormat, dpi = DPI)
+
+
+# Renders a figure to filePath, with the format given by its extension. kind
+# is "stock" or "portfolio" and data is the dataframe passed to the matching
+# draw function. The figure isn't rendered again if filePath already holds a
+# figure of the same data. Returns True if the figure was rendered.
+def render(filePath, kind, title, data):
+    fileFormat = os.path.splitext(filePath)[1][1:].lower()
+    if fileFormat not in FORMATS:
+        raise ValueError("Can't render to {}. Format must be one of {}.".format(filePath, ", ".join(FORMATS)))
+    dataHash = getDataHash(title, data, fileFormat)
+    hashPath = filePath + HASH_EXTENSION
+    if os.path.exists(filePath) and os.path.exists(hashPath):
+        with open(hashPath) as hashFile:
+            if hashFile.read() == dataHash:
+                return False
+
+    fig = Figure(figsize = FIGURE_SIZE)
+    if kind == "stock":
+        drawStock(fig, title, data)
+    else:
+        drawPortfolio(fig, data)
+    saveFigure(fig, filePath, fileFormat, title)
+    with open(hashPath, "w") as hashFile:
+        hashFile.write(dataHash)
+    return True
+
+
+# Renders one task of renderAll(). Defined at module level so that it can be
+# sent to a worker process.
+def _renderTask(task):
+    return render(*task)
+
+
+# Renders many figures. tasks is a list of (filePath, kind, title, data) tuples
+# as taken by render(). With maxWorkers greater than 1 the figures are
+# rendered in a pool of processes. Returns a dictionary of filePath: True if
+# the figure was rendered, False if it was already up to date.
+def renderAll(tasks, maxWorkers = 1):
+    if maxWorkers is not None and maxWorkers <= 1:
+        rendered = [_renderTask(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers = maxWorkers) as executor:
+            rendered = list(executor.map(_renderTask, tasks))
+    return {task[0]: wasRendered for task, wasRendered in zip(tasks, rendered)}
@@ -19,6 +19,7 @@ TOTAL_OWNED = "Total_Owned"
 PRICE = "Price_$"
 COST = "Total_Cost_$"
 TOTAL_SPENT = "Total_Spent_$"
+TOTAL_VALUE = "Total_Value"
 COLUMNS = [CODE, DATE, NUMBER_PURCHASED, PRICE, COST]
 
 COLUMN_LIST = "{} TEXT, {} TEXT, {} INT, {} REAL, {} REAL".format(CODE, DATE, NUMBER_PURCHASED, PRICE, COST)
@@ -48,4 +49,203 @@ DIVIDEND_AMOUNT = "Amount_$"
 DIVIDEND_TOTAL = "Total_Dividend_$"
 DIVIDEND_COLUMNS = [DIVIDEND_CODE, DIVIDEND_DATE, DIVIDEND_AMOUNT]
 
-DIVIDEND_COLUMN_LIST = "{} TEXT, {} TEXT, {} REAL".format(DIVIDEND_CODE, DIVIDEND_DATE, DIVIDEND_AMOUNT)
\ No newline at end of file
+DIVIDEND_COLUMN_LIST = "{} TEXT, {} TEXT, {} REAL".format(DIVIDEND_CODE, DIVIDEND_DATE, DIVIDEND_AMOUNT)
+
+## Daily holdings table contract
+# Materialized snapshot of each stock on each date it has a price for, kept
+# up to date by holdingsTable.py
+# Table Name
+HOLDINGS_TABLE_NAME = "dailyHoldings"
+
+# Table Columns
+HOLDINGS_CODE = HISTORICAL_CODE
+HOLDINGS_DATE = HISTORICAL_DATE
+HOLDINGS_PRICE = HISTORICAL_PRICE
+HOLDINGS_OWNED = TOTAL_OWNED
+HOLDINGS_SPENT = TOTAL_SPENT
+HOLDINGS_DIVIDENDS = DIVIDEND_TOTAL
+HOLDINGS_VALUE = TOTAL_VALUE
+HOLDINGS_COLUMNS = [HOLDINGS_CODE, HOLDINGS_DATE, HOLDINGS_PRICE, HOLDINGS_OWNED, HOLDINGS_SPENT, HOLDINGS_DIVIDENDS, HOLDINGS_VALUE]
+
+HOLDINGS_COLUMN_LIST = "{} TEXT, {} TEXT, {} REAL, {} REAL, {} REAL, {} REAL, {} REAL" \
+    .format(HOLDINGS_CODE, HOLDINGS_DATE, HOLDINGS_PRICE, HOLDINGS_OWNED, HOLDINGS_SPENT, HOLDINGS_DIVIDENDS, HOLDINGS_VALUE)
+# Date before any snapshot, used when rebuilding a stock's snapshots
+HOLDINGS_START_DATE = "1900-01-01"
+
+## Stock currency table contract
+# Currency that each stock's prices, purchases and dividends are in. Stocks
+# that aren't in the table are in fxRates.DEFAULT_CURRENCY.
+# Table Name
+CURRENCY_TABLE_NAME = "stockCurrencies"
+
+# Table Columns
+CURRENCY_CODE = "Stock_Code"
+CURRENCY = "Currency"
+CURRENCY_COLUMNS = [CURRENCY_CODE, CURRENCY]
+
+CURRENCY_COLUMN_LIST = "{} TEXT, {} TEXT".format(CURRENCY_CODE, CURRENCY)
+
+## Exchange rate table contract
+# Rate is the number of To_Currency units that one From_Currency unit buys on Date
+# Table Name
+FX_TABLE_NAME = "fxRates"
+
+# Table Columns
+FX_FROM = "From_Currency"
+FX_TO = "To_Currency"
+FX_DATE = "Date"
+FX_RATE = "Rate"
+FX_COLUMNS = [FX_FROM, FX_TO, FX_DATE, FX_RATE]
+
+FX_COLUMN_LIST = "{} TEXT, {} TEXT, {} TEXT, {} REAL".format(FX_FROM, FX_TO, FX_DATE, FX_RATE)
+
+## Corporate actions table contract
+# Splits (Ratio is the number of shares each share becomes) and dividend
+# reinvestment plan allotments (Amount_$ of dividend reinvested in
+# Number_Allotted shares at Price_$), see corporateActions.py
+# Table Name
+ACTION_TABLE_NAME = "corporateActions"
+
+# Table Columns
+ACTION_CODE = "Stock_Code"
+ACTION_DATE = "Action_Date"
+ACTION_TYPE = "Action_Type"
+ACTION_RATIO = "Ratio"
+ACTION_NUMBER = "Number_Allotted"
+ACTION_PRICE = "Price_$"
+ACTION_AMOUNT = "Amount_$"
+# rowids of the dividend and purchase rows of a DRP allotment, added in version 9
+ACTION_DIVIDEND_ID = "Dividend_Id"
+ACTION_PURCHASE_ID = "Purchase_Id"
+ACTION_COLUMNS = [ACTION_CODE, ACTION_DATE, ACTION_TYPE, ACTION_RATIO, ACTION_NUMBER, ACTION_PRICE, ACTION_AMOUNT,
+                  ACTION_DIVIDEND_ID, ACTION_PURCHASE_ID]
+
+# Columns of the table as created in version 5
+ACTION_COLUMN_LIST = "{} TEXT, {} TEXT, {} TEXT, {} REAL, {} INT, {} REAL, {} REAL" \
+    .format(ACTION_CODE, ACTION_DATE, ACTION_TYPE, ACTION_RATIO, ACTION_NUMBER, ACTION_PRICE, ACTION_AMOUNT)
+
+## Lot selections table contract
+# The parcels (purchases, identified by their date and price) that a sale was
+# made from, for specific identification of the cost base (see taxLots.py).
+# Sale_Id is the rowid of the sale in the stockPurchases table.
+# Table Name
+LOT_TABLE_NAME = "lotSelections"
+
+# Table Columns
+LOT_CODE = "Stock_Code"
+LOT_SALE_ID = "Sale_Id"
+LOT_SALE_DATE = "Sale_Date"
+LOT_DATE = "Lot_Date"
+LOT_PRICE = "Lot_Price_$"
+LOT_NUMBER = "Number_Sold"
+LOT_COLUMNS = [LOT_CODE, LOT_SALE_ID, LOT_SALE_DATE, LOT_DATE, LOT_PRICE, LOT_NUMBER]
+
+LOT_COLUMN_LIST = "{} TEXT, {} INT, {} TEXT, {} TEXT, {} REAL, {} INT" \
+    .format(LOT_CODE, LOT_SALE_ID, LOT_SALE_DATE, LOT_DATE, LOT_PRICE, LOT_NUMBER)
+
+# Version 6 of the table identified the sale by its price instead of Sale_Id
+LOT_SALE_PRICE = "Sale_Price_$"
+LOT_COLUMN_LIST_V6 = "{} TEXT, {} TEXT, {} REAL, {} TEXT, {} REAL, {} INT" \
+    .format(LOT_CODE, LOT_SALE_DATE, LOT_SALE_PRICE, LOT_DATE, LOT_PRICE, LOT_NUMBER)
+
+## Empty ranges table contract
+# Date ranges in the middle of a stock's history that were downloaded but had
+# no prices (e.g. a trading halt), so planRefresh() doesn't fetch them again.
+# Table Name
+EMPTY_RANGE_TABLE_NAME = "emptyRanges"
+
+# Table Columns
+EMPTY_RANGE_CODE = "Stock_Code"
+EMPTY_RANGE_START = "Start_Date"
+EMPTY_RANGE_END = "End_Date"
+EMPTY_RANGE_COLUMNS = [EMPTY_RANGE_CODE, EMPTY_RANGE_START, EMPTY_RANGE_END]
+
+EMPTY_RANGE_COLUMN_LIST = "{} TEXT, {} TEXT, {} TEXT".format(EMPTY_RANGE_CODE, EMPTY_RANGE_START, EMPTY_RANGE_END)
+
+## Schema migrations
+# Each entry holds the sql commands that take the database schema from version
+# i to version i+1. The schema version is stored in sqlite's user_version pragma
+# and the migrations are applied by Database.migrate().
+HISTORICAL_INDEX = "idx_historical_code_date"
+PURCHASE_INDEX = "idx_purchases_code_date"
+DIVIDEND_INDEX = "idx_dividends_code_date"
+HISTORICAL_DATE_INDEX = "idx_historical_date"
+HOLDINGS_INDEX = "idx_holdings_code_date"
+CURRENCY_INDEX = "idx_currencies_code"
+FX_INDEX = "idx_fx_pair_date"
+ACTION_INDEX = "idx_actions_code_date"
+LOT_INDEX = "idx_lots_code_sale_date"
+EMPTY_RANGE_INDEX = "idx_empty_ranges_code"
+
+MIGRATIONS = [
+    # Version 1: Normalize all dates to ISO "yyyy-mm-dd" text so that they sort
+    # and compare correctly, remove duplicate price rows and add indexes on
+    # (Stock_Code, Date) so that point lookups and range scans use the index.
+    ["""UPDATE {0} SET {1} = date({1}) WHERE date({1}) IS NOT NULL AND {1} != date({1})""".format(HISTORICAL_TABLE_NAME, HISTORICAL_DATE),
+     """UPDATE {0} SET {1} = date({1}) WHERE date({1}) IS NOT NULL AND {1} != date({1})""".format(TABLE_NAME, DATE),
+     """UPDATE {0} SET {1} = date({1}) WHERE date({1}) IS NOT NULL AND {1} != date({1})""".format(DIVIDEND_TABLE_NAME, DIVIDEND_DATE),
+     """DELETE FROM {0} WHERE rowid NOT IN (SELECT MIN(rowid) FROM {0} GROUP BY {1}, {2})""".format(HISTORICAL_TABLE_NAME, HISTORICAL_CODE, HISTORICAL_DATE),
+     """CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(HISTORICAL_INDEX, HISTORICAL_TABLE_NAME, HISTORICAL_CODE, HISTORICAL_DATE),
+     """CREATE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(PURCHASE_INDEX, TABLE_NAME, CODE, DATE),
+     """CREATE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(DIVIDEND_INDEX, DIVIDEND_TABLE_NAME, DIVIDEND_CODE, DIVIDEND_DATE)],
+    # Version 2: Index the historical dates on their own, so that the trading
+    # calendar (distinct dates across all stocks) can be read from the index.
+    ["""CREATE INDEX IF NOT EXISTS {} ON {} ({})""".format(HISTORICAL_DATE_INDEX, HISTORICAL_TABLE_NAME, HISTORICAL_DATE)],
+    # Version 3: Add the dailyHoldings table and fill it from the existing data.
+    # Each snapshot sums the transactions up to its date using the
+    # (Stock_Code, Date) indexes. After this it is maintained by holdingsTable.py.
+    ["""CREATE TABLE IF NOT EXISTS {} ({})""".format(HOLDINGS_TABLE_NAME, HOLDINGS_COLUMN_LIST),
+     """CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(HOLDINGS_INDEX, HOLDINGS_TABLE_NAME, HOLDINGS_CODE, HOLDINGS_DATE),
+     """INSERT OR REPLACE INTO {0} ({1}, {2}, {3}, {4}, {5}, {6}, {7})
+        SELECT prices.{8}, prices.{9}, prices.{10},
+            COALESCE((SELECT SUM({11}) FROM {12} WHERE {13} = prices.{8} AND {14} <= prices.{9}), 0),
+            COALESCE((SELECT SUM({15}) FROM {12} WHERE {13} = prices.{8} AND {14} <= prices.{9}), 0),
+            COALESCE((SELECT SUM({16}) FROM {17} WHERE {18} = prices.{8} AND {19} <= prices.{9}), 0),
+            0
+        FROM {20} AS prices""".format(HOLDINGS_TABLE_NAME, HOLDINGS_CODE, HOLDINGS_DATE, HOLDINGS_PRICE,
+                                      HOLDINGS_OWNED, HOLDINGS_SPENT, HOLDINGS_DIVIDENDS, HOLDINGS_VALUE,
+                                      HISTORICAL_CODE, HISTORICAL_DATE, HISTORICAL_PRICE,
+                                      NUMBER_PURCHASED, TABLE_NAME, CODE, DATE, COST,
+                                      DIVIDEND_AMOUNT, DIVIDEND_TABLE_NAME, DIVIDEND_CODE, DIVIDEND_DATE,
+                                      HISTORICAL_TABLE_NAME),
+     """UPDATE {} SET {} = {} * {}""".format(HOLDINGS_TABLE_NAME, HOLDINGS_VALUE, HOLDINGS_PRICE, HOLDINGS_OWNED)],
+    # Version 4: Add the stockCurrencies and fxRates tables for holding stocks
+    # that are priced in different currencies (see fxRates.py).
+    ["""CREATE TABLE IF NOT EXISTS {} ({})""".format(CURRENCY_TABLE_NAME, CURRENCY_COLUMN_LIST),
+     """CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})""".format(CURRENCY_INDEX, CURRENCY_TABLE_NAME, CURRENCY_CODE),
+     """CREATE TABLE IF NOT EXISTS {} ({})""".format(FX_TABLE_NAME, FX_COLUMN_LIST),
+     """CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({}, {}, {})""".format(FX_INDEX, FX_TABLE_NAME, FX_FROM, FX_TO, FX_DATE)],
+    # Version 5: Add the corporateActions table for splits and dividend
+    # reinvestment plans.
+    ["""CREATE TABLE IF NOT EXISTS {} ({})""".format(ACTION_TABLE_NAME, ACTION_COLUMN_LIST),
+     """CREATE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(ACTION_INDEX, ACTION_TABLE_NAME, ACTION_CODE, ACTION_DATE)],
+    # Version 6: Add the lotSelections table for sales that specify which
+    # parcels they were made from.
+    ["""CREATE TABLE IF NOT EXISTS {} ({})""".format(LOT_TABLE_NAME, LOT_COLUMN_LIST_V6),
+     """CREATE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(LOT_INDEX, LOT_TABLE_NAME, LOT_CODE, LOT_SALE_DATE)],
+    # Version 7: Add the emptyRanges table, so that gaps in a stock's prices
+    # that can't be filled aren't downloaded on every refresh.
+    ["""CREATE TABLE IF NOT EXISTS {} ({})""".format(EMPTY_RANGE_TABLE_NAME, EMPTY_RANGE_COLUMN_LIST),
+     """CREATE INDEX IF NOT EXISTS {} ON {} ({})""".format(EMPTY_RANGE_INDEX, EMPTY_RANGE_TABLE_NAME, EMPTY_RANGE_CODE)],
+    # Version 8: Link lot selections to their sale by its rowid (Sale_Id)
+    # rather than by its price, so removing one of two sales on the same date
+    # at the same price keeps the other's lots. The table is rebuilt, with each
+    # existing selection linked to the first sale with its date and price.
+    ["""CREATE TABLE {}_new ({})""".format(LOT_TABLE_NAME, LOT_COLUMN_LIST),
+     """INSERT INTO {0}_new ({1}, {2}, {3}, {4}, {5}, {6})
+        SELECT lots.{1},
+            (SELECT MIN(sales.rowid) FROM {7} AS sales
+             WHERE sales.{8} = lots.{1} AND sales.{9} = lots.{3} AND sales.{10} = lots.{11} AND sales.{12} < 0),
+            lots.{3}, lots.{4}, lots.{5}, lots.{6}
+        FROM {0} AS lots ORDER BY lots.rowid""".format(LOT_TABLE_NAME, LOT_CODE, LOT_SALE_ID, LOT_SALE_DATE, LOT_DATE,
+                                                       LOT_PRICE, LOT_NUMBER, TABLE_NAME, CODE, DATE, PRICE,
+                                                       LOT_SALE_PRICE, NUMBER_PURCHASED),
+     """DROP TABLE {}""".format(LOT_TABLE_NAME),
+     """ALTER TABLE {0}_new RENAME TO {0}""".format(LOT_TABLE_NAME),
+     """CREATE INDEX IF NOT EXISTS {} ON {} ({}, {})""".format(LOT_INDEX, LOT_TABLE_NAME, LOT_CODE, LOT_SALE_DATE)],
+    # Version 9: Link each DRP allotment to its dividend and purchase rows by
+    # their rowids, so removing it can't remove another dividend or purchase
+    # with the same date and amount. Allotments added before this have no ids.
+    ["""ALTER TABLE {} ADD COLUMN {} INT""".format(ACTION_TABLE_NAME, ACTION_DIVIDEND_ID),
+     """ALTER TABLE {} ADD COLUMN {} INT""".format(ACTION_TABLE_NAME, ACTION_PURCHASE_ID)],
+]
@@ -4,16 +4,140 @@
 Created on Tue Nov 29 11:28:12 2016
 
 @author: hplustech
+
+Modified 18/10/2026:
+    * stockScrape() no longer builds a dataframe with one append per row. Rows
+    are collected in a list and written to the database in batches of
+    BATCH_SIZE rows as the pages are downloaded.
+    * Pages are downloaded with fetchPage(), which rate limits requests per host
+    and retries failed requests with exponential backoff.
+    * Added updateAllStockData() which updates many stocks at once with a
+    bounded thread pool. A stock that fails to update for any reason is
+    reported and recorded as None without stopping the others.
+    * updateStockData() and stockScrape() return the number of rows added.
+    * Added the PriceSource class. updateStockData() now fetches data from a
+    PriceSource (YahooPriceSource by default) rather than calling stockScrape()
+    directly. See priceImporter.py for a source that reads local files.
+    * Added insertPrices(), which all price data is written through.
+    * insertPrices() clears the cached prices (see priceCache.py) of the stocks
+    it adds data for.
+    * insertPrices() rewrites the columnar price files (see columnarStore.py)
+    of the stocks it adds data for, if the columnar store is in use, so every
+    path that writes prices keeps them in sync.
+    * Added planRefresh() which finds the date ranges a stock is missing,
+    including gaps in the middle of its history, by comparing its dates with
+    the dates stored for all stocks. updateStockData() only fetches those ranges.
+    * insertPrices() now upserts, updating the price of rows that are already
+    stored, so refreshes can be safely re-run.
+    * planRefresh() passes the stock code and dates as query parameters.
+    * fetchPage(), updateStockData() and updateAllStockData() are recorded by
+    instrumentation.py when profiling is turned on. Downloads record the
+    number of attempts, bytes and time spent waiting on the rate limiter.
+    * insertPrices() updates the dailyHoldings snapshots (see holdingsTable.py)
+    of each stock from the earliest date it added. stockScrape() updates them
+    (and the cached prices and columnar files) once after its last batch.
+    * Added updateRates() which downloads the exchange rates between two
+    currencies into the fxRates table (see fxRates.py) through a PriceSource.
+    YahooPriceSource scrapes them from the currency pair's price pages.
+    * planRefresh() compares a stock's dates with those of the stocks in the
+    same currency, rather than every stock, so dates only traded on another
+    exchange aren't seen as gaps. Gaps that are downloaded and come back
+    empty (e.g. trading halts) are recorded in the emptyRanges table and
+    skipped by later refreshes.
 """
 import stockContract as SC
+from priceCache import getPriceCache
+import columnarStore
+import instrumentation
+import holdingsTable
+import fxRates
 from bs4 import BeautifulSoup
 # Below is the change from urllib2 in python 2.7
 from urllib.request import urlopen
-import pandas as pd
+from urllib.error import URLError, HTTPError
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import re
 import datetime
+import threading
+import time
+
+###############
+## Constants ##
+###############
+# Number of scraped rows to hold in memory before writing them to the database
+BATCH_SIZE = 660
+# URL that the historical price pages are downloaded from. Formatted with the
+# stock code, start month, day, year, end month, day, year, and the page offset
+# is appended to the end.
+BASE_URL = "https://au.finance.yahoo.com/q/hp?s={}&a={}&b={}&c={}&d={}&e={}&f={}&g=d&z=66&y="
+# Maximum number of stocks that are downloaded at the same time
+MAX_CONCURRENT_DOWNLOADS = 4
+# Minimum time in seconds between two requests to the same host
+MIN_REQUEST_INTERVAL = 0.25
+# Number of times a failed request is retried, and the wait before the first
+# retry in seconds (doubled after every failed attempt)
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+# Errors that a request is retried after. HTTPError is a URLError, but client
+# errors other than 429 Too Many Requests are raised straight away.
+RETRY_ERRORS = (URLError, TimeoutError, ConnectionError)
+# Timeout in seconds for each request
+REQUEST_TIMEOUT = 30
+# Missing dates less than this many days apart are downloaded in one request
+MAX_GAP_MERGE = 7
+# Yahoo finance code of the exchange rate from one currency to another,
+# formatted with the two currency codes
+RATE_CODE = "{}{}=X"
+
+
+# Limits the rate of requests made to each host, shared between threads.
+# wait() blocks until at least minInterval seconds have passed since the last
+# request to that host was allowed through.
+class RateLimiter:
+    def __init__(self, minInterval):
+        self.minInterval = minInterval
+        self._nextAllowed = {}
+        self._lock = threading.Lock()
+        
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            allowed = max(now, self._nextAllowed.get(host, now))
+            self._nextAllowed[host] = allowed + self.minInterval
+        time.sleep(allowed - now)
+        
+rateLimiter = RateLimiter(MIN_REQUEST_INTERVAL)
 
 
+# Downloads the page at url and returns its contents. Requests are rate limited
+# per host and failed requests (connection errors, timeouts, server errors and
+# 429 Too Many Requests) are retried with exponential backoff.
+def fetchPage(url):
+    host = urlparse(url).netloc
+    with instrumentation.span(host, "http", url = url) as event:
+        for attempt in range(MAX_RETRIES + 1):
+            waitStart = time.perf_counter()
+            rateLimiter.wait(host)
+            event["rateLimitWait"] = event.get("rateLimitWait", 0) + time.perf_counter() - waitStart
+            event["attempts"] = attempt + 1
+            instrumentation.count("requests")
+            try:
+                page = urlopen(url, timeout = REQUEST_TIMEOUT).read()
+                event["bytes"] = len(page)
+                return page
+            except RETRY_ERRORS as error:
+                # Client errors other than rate limiting won't succeed on a retry
+                if isinstance(error, HTTPError) and error.code < 500 and error.code != 429:
+                    raise
+                if attempt == MAX_RETRIES:
+                    raise
+                print("Request to {} failed ({}), retrying.".format(host, error))
+                instrumentation.count("retries")
+                time.sleep(RETRY_BACKOFF * 2**attempt)
+            
+            
 # Takes a date string in the format "yyyy-mm-dd" and returns the year, month, day
 # in a format that the yahoo finance URL can use
 def convertToURLDate(date):
@@ -27,12 +151,6 @@ def convertToURLDate(date):
     return year, month, day
     
     
-# cleans dataframe data        
-def dataClean(inptFrame):
-    inptFrame[SC.HISTORICAL_DATE] = convertDate(inptFrame[SC.HISTORICAL_DATE].tolist())   
-    return inptFrame
-    
-    
 #takes a date input as a list of strings in the format 'mmm d, yyyy' and converts it to
 #yyyy-mm-dd
 def convertDate(dateString):
@@ -62,86 +180,285 @@ def incrementDate(dateString):
     return str(datePlus)
     
     
-# Checks whether stock is in database, if not it stockScrape to get all the data.
-# If it is in data base it checks whether the stock information is up to date and only fetches new data
-def updateStockData(stockCode, database):
-    # Reads database
-    sqlQuery = """SELECT {} FROM {} WHERE {} = '{}'; """ \
-    .format(SC.HISTORICAL_CODE, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, stockCode)
-    
-#    print(sqlQuery)
-    stockData = database.readDatabase(sqlQuery)
-           
-    # Checks whether any previous data has been added for the particular stock code
-    # if not then run initialStockScrape to get all past data
-    if stockData.empty:
-        print('Running stockScrape() on {}. --First run.'.format(stockCode))
-        #self.URL = 'http://finance.yahoo.com/q/hp?s='+self.stockName+'&d=02&e=25&f=2016&g=d&a=00&b=01&c=2015&z=66&y=' #Test URL
-        stockScrape(stockCode, database)
-    else:
-        #access database to get latestDate
-        print('Running stockScrape() on {}. --Updating data.'.format(stockCode))
-        # Performs SQL query to get the latest stock data date in database
-        sqlQuery = """SELECT {}, max({}) AS Date FROM {} WHERE {} = '{}' GROUP BY {}""" \
-        .format(SC.HISTORICAL_CODE, SC.HISTORICAL_DATE, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, stockCode, SC.HISTORICAL_CODE)
+# Base class for the sources that updateStockData() can fetch price data from.
+# Subclasses implement update(), which adds the prices of stockCode between
+# minDate and maxDate (today if None) to the historical table of database and
+# returns the number of rows added. Sources that have exchange rates also
+# implement updateRates(), which does the same for the rates from fromCurrency
+# to toCurrency, adding them to the fxRates table.
+class PriceSource:
+    def update(self, stockCode, database, minDate = '1900-01-01', maxDate = None):
+        raise NotImplementedError("{} does not implement update()".format(type(self).__name__))
         
-        y = database.readDatabase(sqlQuery)  
-        minDate = y.Date[0]    # minDate is the earliest data of data that the program needs to download
-        # Increment date by 1 day
-        minDate = incrementDate(minDate)
+    def updateRates(self, fromCurrency, toCurrency, database, minDate = '1900-01-01', maxDate = None):
+        raise NotImplementedError("{} does not implement updateRates()".format(type(self).__name__))
         
-        # Updates stock data
-        stockScrape(stockCode, database, minDate)                     
+        
+# Price source that scrapes the historical price pages on Yahoo finance.
+class YahooPriceSource(PriceSource):
+    def update(self, stockCode, database, minDate = '1900-01-01', maxDate = None):
+        return stockScrape(stockCode, database, minDate, maxDate)
+        
+    def updateRates(self, fromCurrency, toCurrency, database, minDate = '1900-01-01', maxDate = None):
+        return stockScrape(RATE_CODE.format(fromCurrency, toCurrency), database, minDate, maxDate,
+                           fxRates.getRateWriter(fromCurrency, toCurrency))
+        
+# Price source used when updateStockData() is not given one
+DEFAULT_PRICE_SOURCE = YahooPriceSource()
+        
+        
+# Works out which date ranges of price data stockCode is missing. Returns a list
+# of (startDate, endDate) pairs:
+#   - If the stock has no data, all dates up to today.
+#   - Any dates in the middle of the stock's history that other stocks in the
+#   same currency (so on the same exchange's trading calendar) have data for
+#   but this stock doesn't (e.g. a page that failed to download). Gaps closer
+#   than MAX_GAP_MERGE days apart are fetched together. Dates in ranges that
+#   have already been fetched and came back empty (see recordEmptyRange()),
+#   e.g. a trading halt, are skipped.
+#   - The dates after the latest date stored, up to today.
+def planRefresh(stockCode, database):
+    today = str(datetime.date.today())
+    sqlQuery = """SELECT {} FROM {} WHERE {} = ? ORDER BY {}""" \
+    .format(SC.HISTORICAL_DATE, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, SC.HISTORICAL_DATE)
+    stored = database.readDatabase(sqlQuery, (stockCode,))[SC.HISTORICAL_DATE].to_numpy().astype(str)
+    if len(stored) == 0:
+        return [('1900-01-01', today)]
+    
+    # The trading calendar is every date that any stock in the same currency
+    # has data for. Stocks without a currency are in fxRates.DEFAULT_CURRENCY.
+    currency = fxRates.getCurrencies(database, [stockCode]).iloc[0]
+    sqlQuery = """SELECT DISTINCT prices.{0} FROM {1} AS prices
+    LEFT JOIN {2} AS currencies ON prices.{3} = currencies.{4}
+    WHERE COALESCE(currencies.{5}, ?) = ? AND prices.{0} BETWEEN ? AND ?""" \
+    .format(SC.HISTORICAL_DATE, SC.HISTORICAL_TABLE_NAME, SC.CURRENCY_TABLE_NAME, SC.HISTORICAL_CODE,
+            SC.CURRENCY_CODE, SC.CURRENCY)
+    calendar = database.readDatabase(sqlQuery, (fxRates.DEFAULT_CURRENCY, currency, str(stored[0]), str(stored[-1]))) \
+        [SC.HISTORICAL_DATE].to_numpy().astype(str)
+    missing = np.setdiff1d(calendar, stored)
+    
+    # Leave out the dates that are known to have no data
+    sqlQuery = """SELECT {0}, {1} FROM {2} WHERE {3} = ? ORDER BY {0}""" \
+    .format(SC.EMPTY_RANGE_START, SC.EMPTY_RANGE_END, SC.EMPTY_RANGE_TABLE_NAME, SC.EMPTY_RANGE_CODE)
+    emptyRanges = database.readDatabase(sqlQuery, (stockCode,))
+    if len(missing) > 0 and len(emptyRanges) > 0:
+        starts = emptyRanges[SC.EMPTY_RANGE_START].to_numpy().astype(str)
+        # Latest end of the ranges starting on or before each start, as ranges may overlap
+        ends = np.maximum.accumulate(emptyRanges[SC.EMPTY_RANGE_END].to_numpy().astype("datetime64[D]")).astype(str)
+        index = np.searchsorted(starts, missing, side = "right") - 1
+        covered = (index >= 0) & (missing <= ends[np.maximum(index, 0)])
+        missing = missing[~covered]
+    missing = missing.astype("datetime64[D]")
+    
+    # Group the missing dates into ranges, starting a new range wherever the
+    # next missing date is more than MAX_GAP_MERGE days away.
+    ranges = []
+    if len(missing) > 0:
+        breaks = np.flatnonzero(np.diff(missing.astype(np.int64)) > MAX_GAP_MERGE)
+        starts = missing[np.concatenate(([0], breaks + 1))]
+        ends = missing[np.concatenate((breaks, [len(missing) - 1]))]
+        ranges = [(str(start), str(end)) for start, end in zip(starts, ends)]
+        
+    # New data since the last update
+    minDate = incrementDate(stored[-1])
+    if minDate <= today:
+        ranges.append((minDate, today))
+    return ranges
+    
+    
+# Records that the prices of stockCode between startDate and endDate were
+# fetched and there weren't any, so planRefresh() doesn't plan them again.
+def recordEmptyRange(stockCode, database, startDate, endDate):
+    sqlCommand = """INSERT INTO {} ({}, {}, {}) VALUES (?, ?, ?)""" \
+    .format(SC.EMPTY_RANGE_TABLE_NAME, SC.EMPTY_RANGE_CODE, SC.EMPTY_RANGE_START, SC.EMPTY_RANGE_END)
+    database.executeCommand(sqlCommand, (stockCode, str(startDate), str(endDate)))
+    
+    
+# Brings the price data of stockCode up to date, fetching only the date ranges
+# that planRefresh() finds are missing. Gaps in the stock's history that come
+# back empty are recorded so they aren't fetched again. Ranges up to today
+# aren't, as their prices may not have been published yet.
+# The data is fetched from priceSource (see PriceSource), which defaults to
+# scraping Yahoo finance. Returns the number of rows added.
+@instrumentation.traced
+def updateStockData(stockCode, database, priceSource = None):
+    if priceSource is None:
+        priceSource = DEFAULT_PRICE_SOURCE
+    today = str(datetime.date.today())
+    rowsAdded = 0
+    for minDate, maxDate in planRefresh(stockCode, database):
+        print('Running {} on {} for {} to {}.'.format(type(priceSource).__name__, stockCode, minDate, maxDate))
+        rangeAdded = priceSource.update(stockCode, database, minDate, maxDate)
+        if rangeAdded == 0 and maxDate < today:
+            recordEmptyRange(stockCode, database, minDate, maxDate)
+        rowsAdded += rangeAdded
+    return rowsAdded
+    
+    
+# Brings the exchange rates from fromCurrency to toCurrency up to date,
+# fetching the dates after the latest rate stored from priceSource (Yahoo
+# finance by default). Returns the number of rows added.
+@instrumentation.traced
+def updateRates(fromCurrency, toCurrency, database, priceSource = None):
+    if priceSource is None:
+        priceSource = DEFAULT_PRICE_SOURCE
+    today = str(datetime.date.today())
+    lastDate = fxRates.getLastDate(database, fromCurrency, toCurrency)
+    minDate = '1900-01-01' if lastDate is None else incrementDate(lastDate)
+    if minDate > today:
+        return 0
+    print('Running {} on {}/{} for {} to {}.'.format(type(priceSource).__name__, fromCurrency, toCurrency, minDate, today))
+    return priceSource.updateRates(fromCurrency, toCurrency, database, minDate, today)
+    
+    
+# Updates the price data of all the stocks in stockCodes at the same time, using
+# at most maxWorkers download threads. Returns a dictionary of stock code to the
+# number of rows added, or None if the stock could not be downloaded.
+@instrumentation.traced
+def updateAllStockData(stockCodes, database, maxWorkers = MAX_CONCURRENT_DOWNLOADS, priceSource = None):
+    rowsAdded = {}
+    with ThreadPoolExecutor(max_workers = maxWorkers) as executor:
+        futures = {executor.submit(updateStockData, stockCode, database, priceSource): stockCode for stockCode in stockCodes}
+        for future in as_completed(futures):
+            stockCode = futures[future]
+            try:
+                rowsAdded[stockCode] = future.result()
+            except Exception as error:
+                # One stock failing (e.g. a bad page) doesn't stop the others
+                print("{} data not updated. {}: {}".format(stockCode, type(error).__name__, error))
+                rowsAdded[stockCode] = None
+    return rowsAdded
+    
+    
+# Writes the rows in batch (lists of [stockCode, date, price] with dates as
+# scraped) to the database with insertRows (insertPrices() by default, which
+# writes to the historical table in a single executemany). Returns the number
+# of rows added.
+def flushRows(batch, database, insertRows = None):
+    if len(batch) == 0:
+        return 0
+    if insertRows is None:
+        insertRows = insertPrices
+    codes, dates, prices = map(list, zip(*batch))
+    # Cleans the date data before saving
+    convertDate(dates)
+    return insertRows(database, zip(codes, dates, prices))
+    
+    
+# Upserts rows of (stockCode, "yyyy-mm-dd" date, price) into the historical
+# price table with a single executemany. Rows for a (stockCode, date) pair that
+# is already stored update its price if it has changed, so inserting the same
+# rows twice has no effect. All price data is written through this function, so
+# that it can update the snapshots, clear the cached prices and rewrite the
+# columnar files (if the columnar store is in use) of the stocks that were
+# updated (see refreshStocks()).
+# Returns the number of rows added or changed.
+def insertPrices(database, rows):
+    firstDates = {}
+    with database.transaction():
+        rowsAdded = upsertPrices(database, rows, firstDates)
+        refreshStocks(database, firstDates)
+    return rowsAdded
+
+
+# Upserts rows into the historical price table as for insertPrices(), but
+# only records the earliest date added or changed for each stock in
+# firstDates (a dictionary of stock code: date) rather than refreshing the
+# stocks. For writes made in many batches, which call refreshStocks() once at
+# the end. Returns the number of rows added or changed.
+def upsertPrices(database, rows, firstDates):
+    rows = list(rows)
+    sqlCommand = """INSERT INTO {0} ({1}, {2}, "{3}") VALUES (?, ?, ?)
+    ON CONFLICT ({1}, {2}) DO UPDATE SET "{3}" = excluded."{3}"
+    WHERE "{3}" IS NOT excluded."{3}" """ \
+    .format(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_CODE, SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE)
+    rowsAdded = database.executeMany(sqlCommand, rows)
+    if rowsAdded > 0:
+        for stockCode, date, price in rows:
+            if stockCode not in firstDates or str(date) < firstDates[stockCode]:
+                firstDates[stockCode] = str(date)
+    return rowsAdded
+
+
+# Brings everything read from the prices of the stocks in firstDates (stock
+# code: earliest date changed) up to date after they are written: the
+# dailyHoldings snapshots from that date on, the cached prices and the
+# columnar files.
+def refreshStocks(database, firstDates):
+    holdingsTable.updateMany(database, firstDates)
+    cache = getPriceCache(database)
+    for stockCode in firstDates:
+        cache.invalidate(stockCode)
+        # Keep the columnar copy of the price data in sync
+        columnarStore.writeStock(database, stockCode)
     
     
 # function which does the first time initialization of the stock and 
-#downloads all past stock data, returns array of dates, and array of data
-def stockScrape(stockCode, database, minDate = '1900-01-01'):
-    # Initialize pandas dataframe to hold stock data    
-    stockDataFrame =  pd.DataFrame({SC.HISTORICAL_CODE: [], SC.HISTORICAL_DATE: [], SC.HISTORICAL_PRICE: []});
-    # Base URL to download data
-    endYear, endMonth, endDay = convertToURLDate(str(datetime.date.today()))
-    startYear, startMonth, startDay = convertToURLDate(minDate)
-    
-    baseURL = "https://au.finance.yahoo.com/q/hp?s={}&a={}&b={}&c={}&d={}&e={}&f={}&g=d&z=66&y=" \
-    .format(stockCode, startMonth, startDay, startYear, endMonth, endDay, endYear)
-#    print(baseURL)
-    
-    # Putting into a loop to download all pages of data
-    done = False
-    pageIndex = 0
-    
-    # This loops over the different pages of data. Each page stores at most 66
-    # rows in the table.
-    while not done:
-        print(pageIndex)
-        URLPage = baseURL + str(pageIndex)        
-        #creates soup and dowloads data
-        soup = BeautifulSoup(urlopen(URLPage).read(),"lxml")
-        table = soup.find('table','yfnc_datamodoutline1')
-        #breaks loop if it doesnt find a table
-        if table == None:
-            done = True
-            break                
+# downloads all past stock data (between minDate and maxDate, default today),
+# writing it to the database in batches of BATCH_SIZE rows as the pages arrive.
+# The rows are written with insertRows (see flushRows()). By default they are
+# upserted into the historical table, and the stock's snapshots, cached prices
+# and columnar files are refreshed once after the last batch rather than after
+# every batch, as the pages are newest first and each refresh would recompute
+# everything after the batch's earliest date. Returns the number of rows added.
+def stockScrape(stockCode, database, minDate = '1900-01-01', maxDate = None, insertRows = None):
+    firstDates = {}
+    refresh = insertRows is None
+    if refresh:
+        insertRows = lambda database, rows: upsertPrices(database, rows, firstDates)
+    try:
+        # Rows waiting to be written to the database
+        batch = []
+        rowsAdded = 0
+        # Base URL to download data
+        if maxDate is None:
+            maxDate = str(datetime.date.today())
+        endYear, endMonth, endDay = convertToURLDate(maxDate)
+        startYear, startMonth, startDay = convertToURLDate(minDate)
+    
+        baseURL = BASE_URL.format(stockCode, startMonth, startDay, startYear, endMonth, endDay, endYear)
+    #    print(baseURL)
+    
+        # Putting into a loop to download all pages of data
+        done = False
+        pageIndex = 0
+    
+        # This loops over the different pages of data. Each page stores at most 66
+        # rows in the table.
+        while not done:
+            print(pageIndex)
+            URLPage = baseURL + str(pageIndex)        
+            #creates soup and dowloads data
+            soup = BeautifulSoup(fetchPage(URLPage),"lxml")
+            table = soup.find('table','yfnc_datamodoutline1')
+            #breaks loop if it doesnt find a table
+            if table == None:
+                done = True
+                break                
 
-        # Loop over rows in table, adding date and price data to stockDataFrame
-        for row in table.tr.td.find_all("tr"):
-            columns = row.find_all("td")
-            # This checks if its a data column
-            if len(columns) == 7:
-                rowDate = columns[0].string
-                rowPrice = columns[4].string
-                rowTemp = [stockCode, rowDate, rowPrice]
-                stockDataFrame = stockDataFrame.append(pd.DataFrame([rowTemp], columns = SC.HISTORICAL_COLUMNS), ignore_index=True)
+            # Loop over rows in table, adding date and price data to the batch
+            for row in table.tr.td.find_all("tr"):
+                columns = row.find_all("td")
+                # This checks if its a data column
+                if len(columns) == 7:
+                    batch.append([stockCode, columns[0].string, columns[4].string])
         
-        #increment pageIndex
-        pageIndex += 66
+            # Write out the batch once it is large enough
+            if len(batch) >= BATCH_SIZE:
+                rowsAdded += flushRows(batch, database, insertRows)
+                batch = []
+        
+            #increment pageIndex
+            pageIndex += 66
            
-    # Cleans the numerical data before saving
-    dataClean(stockDataFrame)
-    
-    # Add to SQL database
-    database.addToDatabase(stockDataFrame, SC.HISTORICAL_TABLE_NAME)
+        # Add any remaining rows to SQL database, skipping any rows that are already stored
+        rowsAdded += flushRows(batch, database, insertRows)
+    finally:
+        # Also refreshes the batches written before a failed download
+        if refresh:
+            with database.transaction():
+                refreshStocks(database, firstDates)
+    return rowsAdded
     
     
     
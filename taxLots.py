@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 taxLots.py
+Created on Sun Oct 18 22:41:27 2026
+
+@author: dmcauslan
+
+Tax lot accounting over the stockPurchases table. Every purchase is a lot
+(parcel), and every sale is matched against the lots still open when it was
+made, using one of METHODS:
+    * FIFO - the oldest lots are sold first.
+    * LIFO - the newest lots are sold first.
+    * specific - the lots chosen when the sale was made (the lotSelections
+    table, written by Stock.sell()) are sold, and any shares sold without a
+    selection are taken first in first out.
+
+Each match gives the proceeds and cost base of the shares sold from the lot and
+so the realized gain. Gains on lots held for more than 12 months (not counting
+the days they were bought and sold) are eligible for the CGT discount.
+TaxLots.getCapitalGains() nets them off against losses for each financial
+year. Lots that are still open are valued at the latest price to give the
+unrealized gain.
+
+All the purchases and lot selections are read in one query each, and the
+matching is a single pass over the transactions in date order that keeps the
+shares left in each lot in an array, with a list of open lots for the current
+stock. Only the proceeds, cost bases and holding periods of the matches are
+computed afterwards, with NumPy for all of them at once.
+
+Numbers of shares are split adjusted (see corporateActions.py), so lots bought
+before a split hold the shares they became. Amounts are in each stock's own
+currency, except that getCostBase() can convert the cost of each lot into a
+base currency at the rate on the day it was bought.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+import stockContract as SC
+import portfolioAggregator as aggregator
+import corporateActions
+import holdingsTable
+import fxRates
+
+###############
+## Constants ##
+###############
+DEFAULT_DATE = str(datetime.date.today())
+# Date after every transaction, for checking all of a stock's sales
+LAST_DATE = "9999-12-31"
+FIFO = "FIFO"
+LIFO = "LIFO"
+SPECIFIC = "specific"
+METHODS = [FIFO, LIFO, SPECIFIC]
+# Fraction of an eligible capital gain that is taxed, and the time a lot must
+# be held for to be eligible
+DISCOUNT_FRACTION = 0.5
+DISCOUNT_PERIOD = pd.DateOffset(years = 1)
+# First month of the financial year
+FINANCIAL_YEAR_START = 7
+# Numbers of shares smaller than this are treated as zero
+EPSILON = 1e-9
+# Result columns
+LOT_DATE = "Lot_Date"
+SALE_DATE = "Sale_Date"
+NUMBER_SOLD = "Number_Sold"
+NUMBER_OWNED = "Number_Owned"
+PROCEEDS = "Proceeds_$"
+COST_BASE = "Cost_Base_$"
+GAIN = "Gain_$"
+ELIGIBLE = "Discount_Eligible"
+PRICE = "Price_$"
+VALUE = "Value_$"
+UNREALIZED_GAIN = "Unrealized_Gain_$"
+FINANCIAL_YEAR = "Financial_Year"
+NON_DISCOUNT_GAINS = "Non_Discount_Gains_$"
+DISCOUNT_GAINS = "Discount_Gains_$"
+LOSSES = "Losses_$"
+LOSSES_BROUGHT_FORWARD = "Losses_Brought_Forward_$"
+NET_GAIN = "Net_Capital_Gain_$"
+LOSSES_CARRIED_FORWARD = "Losses_Carried_Forward_$"
+
+
+# The result of getTaxLots(). Holds the realized gain of every match of a sale
+# to a lot and the lots that are still open on date.
+class TaxLots:
+    def __init__(self, method, date, realized, openLots):
+        self.method = method
+        self.date = date
+        self.realized = realized
+        self.openLots = openLots
+        self.realizedGain = realized[GAIN].sum()
+        self.unrealizedGain = openLots[UNREALIZED_GAIN].sum()
+
+
+    # Gets the realized gains as a dataframe, one row per match of a sale to a lot
+    def toDataFrame(self):
+        return self.realized
+
+
+    # Gets the cost base of the open lots of each stock as a series indexed by
+    # stock code
+    def getCostBase(self):
+        return self.openLots.groupby(SC.CODE)[COST_BASE].sum()
+
+
+    # Gets a dataframe of the net capital gain of each financial year (labelled
+    # by the year it ends in). Capital losses, and losses carried forward from
+    # earlier years, are taken off gains that aren't eligible for the discount
+    # first and then off eligible gains, before the discount is applied to
+    # what is left of the eligible gains. Losses that are left are carried
+    # forward to the next year.
+    def getCapitalGains(self):
+        saleDates = pd.to_datetime(self.realized[SALE_DATE])
+        years = saleDates.dt.year + (saleDates.dt.month >= FINANCIAL_YEAR_START)
+        gains = self.realized[GAIN].to_numpy(dtype = float)
+        eligible = self.realized[ELIGIBLE].to_numpy(dtype = bool)
+        totals = pd.DataFrame({FINANCIAL_YEAR: years,
+                               NON_DISCOUNT_GAINS: np.where((gains > 0) & ~eligible, gains, 0),
+                               DISCOUNT_GAINS: np.where((gains > 0) & eligible, gains, 0),
+                               LOSSES: np.where(gains < 0, -gains, 0)}).groupby(FINANCIAL_YEAR).sum()
+        rows = []
+        carried = 0
+        for year, nonDiscount, discount, losses in totals[[NON_DISCOUNT_GAINS, DISCOUNT_GAINS, LOSSES]].itertuples():
+            available = losses + carried
+            offsetNonDiscount = min(available, nonDiscount)
+            offsetDiscount = min(available - offsetNonDiscount, discount)
+            netGain = nonDiscount - offsetNonDiscount + (discount - offsetDiscount)*DISCOUNT_FRACTION
+            rows.append((year, nonDiscount, discount, losses, carried, netGain,
+                         available - offsetNonDiscount - offsetDiscount))
+            carried = rows[-1][-1]
+        return pd.DataFrame(rows, columns = [FINANCIAL_YEAR, NON_DISCOUNT_GAINS, DISCOUNT_GAINS, LOSSES,
+                                             LOSSES_BROUGHT_FORWARD, NET_GAIN, LOSSES_CARRIED_FORWARD])
+
+
+    # Class string method
+    def __str__(self):
+        return "Tax lots ({}) on {}: realized gain ${:.2f}, unrealized gain ${:.2f}, {} open lots." \
+            .format(self.method, self.date, self.realizedGain, self.unrealizedGain, len(self.openLots))
+
+
+# Gets an array of whether lots bought on lotDates and sold (or valued) on
+# saleDates have been held long enough to be eligible for the CGT discount
+def isDiscountEligible(lotDates, saleDates):
+    return pd.to_datetime(np.asarray(saleDates)) > pd.to_datetime(np.asarray(lotDates)) + DISCOUNT_PERIOD
+
+
+# Matches the sales in a set of transactions to lots. codes, dates, shares and
+# prices are arrays of the transactions sorted by stock code and date, with
+# shares split adjusted and negative for sales. selections is a dictionary of
+# sale row: list of [lot date, lot price, number of shares] for the specific
+# method. Returns arrays of the sale row, lot row and number of shares of each
+# match, and the shares left in each lot. Raises a ValueError if a sale is for
+# more shares than are owned, or if a lot chosen for it doesn't have the shares
+# left.
+def matchLots(codes, dates, shares, prices, method = FIFO, selections = None):
+    if method not in METHODS:
+        raise ValueError("Unknown tax lot method {}. Must be one of {}.".format(method, ", ".join(METHODS)))
+    selections = selections if method == SPECIFIC and selections is not None else {}
+    remaining = np.where(shares > 0, shares, 0)
+    saleRows, lotRows, matched = [], [], []
+
+    # Sells up to number shares from lot. Returns the number sold.
+    def sellFrom(sale, lot, number):
+        sold = min(number, remaining[lot])
+        remaining[lot] -= sold
+        saleRows.append(sale)
+        lotRows.append(lot)
+        matched.append(sold)
+        return sold
+
+    currentCode = None
+    for row in range(len(shares)):
+        if codes[row] != currentCode:
+            currentCode = codes[row]
+            openLots = []
+            head = 0
+            # Open lots of the stock by (date, price), for the specific method
+            lotsByKey = {}
+        if shares[row] > 0:
+            openLots.append(row)
+            lotsByKey.setdefault((dates[row], round(prices[row], 6)), []).append(row)
+            continue
+        toSell = -shares[row]
+        # Lots chosen when the sale was made, which must have the shares left
+        for lotDate, lotPrice, number in selections.get(row, []):
+            left = number
+            for lot in lotsByKey.get((lotDate, round(lotPrice, 6)), []):
+                if toSell <= EPSILON or left <= EPSILON:
+                    break
+                if remaining[lot] > EPSILON:
+                    sold = sellFrom(row, lot, min(toSell, left))
+                    toSell -= sold
+                    left -= sold
+            if left > EPSILON:
+                raise ValueError("Sale of {:g} shares of {} on {} is from a lot bought on {} for ${} that doesn't have {:g} "
+                                 "shares left.".format(-shares[row], currentCode, dates[row], lotDate, lotPrice, number))
+        # Any other shares are taken from the oldest (or newest) open lots
+        while toSell > EPSILON:
+            if method == LIFO:
+                while len(openLots) > 0 and remaining[openLots[-1]] <= EPSILON:
+                    openLots.pop()
+                lot = openLots[-1] if len(openLots) > 0 else None
+            else:
+                while head < len(openLots) and remaining[openLots[head]] <= EPSILON:
+                    head += 1
+                lot = openLots[head] if head < len(openLots) else None
+            if lot is None:
+                raise ValueError("Sale of {:g} shares of {} on {} is more than the number owned."
+                                 .format(-shares[row], currentCode, dates[row]))
+            toSell -= sellFrom(row, lot, toSell)
+    return np.array(saleRows, dtype = int), np.array(lotRows, dtype = int), np.array(matched, dtype = float), remaining
+
+
+# Reads the transactions of the stocks in codes (every stock if None) up to
+# date and matches their sales to lots by method. Returns arrays of the stock
+# code, date and amount per split adjusted share of each transaction, along with
+# the results of matchLots().
+def _matchTransactions(database, codes, method, date):
+    # Buys come before sales on the same date
+    sqlQuery = ''' SELECT rowid, {0}, {1}, {2}, {3}, {4} FROM {5} WHERE {1} <= date(?)''' \
+        .format(SC.CODE, SC.DATE, SC.NUMBER_PURCHASED, SC.PRICE, SC.COST, SC.TABLE_NAME)
+    params = [str(date)]
+    if codes is not None:
+        sqlQuery += ''' AND {} IN ({})'''.format(SC.CODE, aggregator.placeholders(codes))
+        params += list(codes)
+    sqlQuery += ''' ORDER BY {0}, {1}, {2} < 0, rowid'''.format(SC.CODE, SC.DATE, SC.NUMBER_PURCHASED)
+    purchases = database.readDatabase(sqlQuery, params)
+    purchases = purchases[purchases[SC.NUMBER_PURCHASED].fillna(0) != 0]
+    transactionCodes = purchases[SC.CODE].to_numpy().astype(str)
+    dates = purchases[SC.DATE].to_numpy().astype(str)
+    factors = corporateActions.getRowFactors(database, transactionCodes, dates)
+    shares = purchases[SC.NUMBER_PURCHASED].to_numpy(dtype = float) * factors
+    prices = purchases[SC.PRICE].to_numpy(dtype = float)
+    costs = purchases[SC.COST].to_numpy(dtype = float)
+
+    selections = {}
+    if method == SPECIFIC:
+        sqlQuery = ''' SELECT {}, {}, {}, {} FROM {} WHERE {} <= date(?)''' \
+            .format(SC.LOT_SALE_ID, SC.LOT_DATE, SC.LOT_PRICE, SC.LOT_NUMBER, SC.LOT_TABLE_NAME, SC.LOT_SALE_DATE)
+        params = [str(date)]
+        if codes is not None:
+            sqlQuery += ''' AND {} IN ({})'''.format(SC.LOT_CODE, aggregator.placeholders(codes))
+            params += list(codes)
+        sqlQuery += ''' ORDER BY rowid'''
+        lots = database.readDatabase(sqlQuery, params)
+        # Numbers of shares chosen on the sale date are split adjusted like the sales
+        rows = pd.Series(np.arange(len(purchases)), index = purchases["rowid"].to_numpy())
+        for saleId, lotDate, lotPrice, number in lots.itertuples(index = False):
+            if saleId in rows.index:
+                row = rows[saleId]
+                selections.setdefault(row, []).append([lotDate, lotPrice, number*factors[row]])
+
+    saleRows, lotRows, matched, remaining = matchLots(transactionCodes, dates, shares, prices, method, selections)
+    # Proceeds and cost base are shared between the shares of a transaction
+    unitAmounts = np.divide(costs, shares, out = np.zeros(len(shares)), where = shares != 0)
+    return transactionCodes, dates, unitAmounts, saleRows, lotRows, matched, remaining
+
+
+# Gets a series, indexed by stock code, of the cost base on date of the lots of
+# each stock in codes that are still open, with the sales matched to lots by
+# method (one of METHODS). If baseCurrency is given, each lot's cost is
+# converted into it at the rate on the day it was bought.
+def getCostBase(database, codes, method = FIFO, date = DEFAULT_DATE, baseCurrency = None):
+    transactionCodes, dates, unitAmounts, saleRows, lotRows, matched, remaining = \
+        _matchTransactions(database, codes, method, date)
+    lotCosts = remaining * unitAmounts
+    if baseCurrency is not None and len(lotCosts) > 0:
+        currencies = fxRates.getCurrencies(database, codes).reindex(transactionCodes).to_numpy()
+        lotCosts = fxRates.convertAmounts(database, lotCosts, dates, currencies, baseCurrency)
+    costBase = pd.Series(lotCosts).groupby(transactionCodes).sum()
+    return costBase.reindex(codes, fill_value = 0)
+
+
+# Checks that every sale of the stocks in codes, whatever its date, can be
+# matched to the lots open when it was made, including the lots chosen for it.
+# Raises a ValueError if not. Run before committing a change to the
+# transactions, so that a back dated sale can't leave a later one short.
+def checkSales(database, codes):
+    _matchTransactions(database, codes, SPECIFIC, LAST_DATE)
+
+
+# Gets the TaxLots of the stocks in codes (every stock in the stockPurchases
+# table if None) on date, with the sales matched to lots by method (one of
+# METHODS). Raises a ValueError if a sale is for more shares than were owned,
+# or if there is no price to value an open lot at.
+def getTaxLots(database, codes = None, method = FIFO, date = DEFAULT_DATE):
+    transactionCodes, dates, unitAmounts, saleRows, lotRows, matched, remaining = \
+        _matchTransactions(database, codes, method, date)
+    proceeds = matched * unitAmounts[saleRows]
+    costBase = matched * unitAmounts[lotRows]
+    realized = pd.DataFrame({SC.CODE: transactionCodes[saleRows],
+                             SALE_DATE: dates[saleRows],
+                             LOT_DATE: dates[lotRows],
+                             NUMBER_SOLD: matched,
+                             PROCEEDS: proceeds,
+                             COST_BASE: costBase,
+                             GAIN: proceeds - costBase,
+                             ELIGIBLE: isDiscountEligible(dates[lotRows], dates[saleRows])},
+                            columns = [SC.CODE, SALE_DATE, LOT_DATE, NUMBER_SOLD, PROCEEDS, COST_BASE, GAIN, ELIGIBLE])
+
+    # Open lots are valued at the latest split adjusted price
+    openRows = np.flatnonzero(remaining > EPSILON)
+    openCodes = transactionCodes[openRows]
+    lotPrices = np.zeros(len(openRows))
+    if len(openRows) > 0:
+        uniqueCodes = list(np.unique(openCodes))
+        latest = holdingsTable.getAsOf(database, uniqueCodes, date)[SC.HOLDINGS_PRICE]
+        lotPrices = latest.reindex(openCodes).to_numpy(dtype = float)
+    openShares = remaining[openRows]
+    openCost = openShares * unitAmounts[openRows]
+    openLots = pd.DataFrame({SC.CODE: openCodes,
+                             LOT_DATE: dates[openRows],
+                             NUMBER_OWNED: openShares,
+                             COST_BASE: openCost,
+                             PRICE: lotPrices,
+                             VALUE: openShares * lotPrices,
+                             UNREALIZED_GAIN: openShares * lotPrices - openCost,
+                             ELIGIBLE: isDiscountEligible(dates[openRows], np.full(len(openRows), str(date)))},
+                            columns = [SC.CODE, LOT_DATE, NUMBER_OWNED, COST_BASE, PRICE, VALUE, UNREALIZED_GAIN,
+                                       ELIGIBLE])
+    return TaxLots(method, str(date), realized, openLots)
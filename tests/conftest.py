@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""                 conftest.py
+Created on Sun Oct 18 23:05:12 2026
+
+@author: dmcauslan
+
+Shared fixtures for the tests. The modules are flat in the repository root, so
+it is added to the import path.
+"""
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stockDownloader as downloader
+from PortfolioTracker import Portfolio
+
+
+# Adds a price of price for stockCode on every weekday between startDate and
+# endDate, through stockDownloader.insertPrices() like downloaded prices
+def addPrices(database, stockCode, startDate, endDate, price):
+    dates = pd.bdate_range(startDate, endDate).strftime("%Y-%m-%d")
+    return downloader.insertPrices(database, [(stockCode, date, price) for date in dates])
+
+
+# A portfolio with an empty database in a temporary directory
+@pytest.fixture
+def portfolio(tmp_path):
+    portfolio = Portfolio("test", refresh = False, databaseDirectory = str(tmp_path))
+    yield portfolio
+    portfolio.stockDatabase.close()
+
+
+# The database of the portfolio fixture
+@pytest.fixture
+def database(portfolio):
+    return portfolio.stockDatabase
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Tests for Database.py"""
+import pytest
+from Database import Database
+
+
+# A database in a temporary directory with a single two column table
+@pytest.fixture
+def table(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    database.createTable("numbers", "Name TEXT, Value REAL")
+    yield database
+    database.close()
+
+
+# Gets the number of rows in the table
+def countRows(database):
+    return database.readValue("SELECT COUNT(*) FROM numbers")
+
+
+# Only the outermost transaction block commits, so a second connection sees
+# nothing until it exits
+def test_nested_transaction_commits_at_outermost(table, tmp_path):
+    other = Database(str(tmp_path / "test.db"))
+    try:
+        with table.transaction():
+            with table.transaction():
+                table.executeCommand("INSERT INTO numbers VALUES (?, ?)", ("a", 1.0))
+            table.executeMany("INSERT INTO numbers VALUES (?, ?)", [("b", 2.0), ("c", 3.0)])
+            assert countRows(table) == 3
+            assert countRows(other) == 0
+        assert countRows(other) == 3
+    finally:
+        other.close()
+
+
+# An exception in a nested block rolls back every write in the outermost block
+def test_exception_rolls_back_transaction(table):
+    table.executeCommand("INSERT INTO numbers VALUES (?, ?)", ("kept", 0.0))
+    with pytest.raises(ValueError):
+        with table.transaction():
+            table.executeCommand("INSERT INTO numbers VALUES (?, ?)", ("a", 1.0))
+            with table.transaction():
+                table.executeCommand("INSERT INTO numbers VALUES (?, ?)", ("b", 2.0))
+                raise ValueError("failed")
+    assert table.readDatabase("SELECT Name FROM numbers")["Name"].tolist() == ["kept"]
+    # The database can still be written to afterwards
+    with table.transaction():
+        table.executeCommand("INSERT INTO numbers VALUES (?, ?)", ("c", 3.0))
+    assert countRows(table) == 2
+
+
+# Migrations run once each, in order, and a failing migration leaves the
+# schema at the old version
+def test_migrate(table):
+    migrations = [["CREATE TABLE first (Value REAL)"],
+                  ["INSERT INTO first VALUES (1.0)"]]
+    assert table.migrate(migrations) == 2
+    assert table.migrate(migrations) == 2
+    assert table.readValue("SELECT COUNT(*) FROM first") == 1
+
+    broken = migrations + [["INSERT INTO first VALUES (2.0)"], ["INSERT INTO missing VALUES (3.0)"]]
+    with pytest.raises(Exception):
+        table.migrate(broken)
+    assert table.readValue("PRAGMA user_version") == 2
+    assert table.readValue("SELECT COUNT(*) FROM first") == 1
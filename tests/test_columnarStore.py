@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Tests for columnarStore.py"""
+import numpy as np
+import stockContract as SC
+import stockDownloader as downloader
+import columnarStore
+from conftest import addPrices
+
+
+# The store holds the same prices as the historical table, and is only used
+# once it has been built
+def test_build_and_read(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-08", 10.0)
+    assert columnarStore.getPriceArrays(database, "AAA.AX", "2021-01-01", "2021-12-31") is None
+    portfolio.addStock("AAA.AX", 100, refresh = False)
+    portfolio.buildPriceStore()
+
+    dates, prices = columnarStore.getPriceArrays(database, "AAA.AX", "2021-01-05", "2021-01-07")
+    assert list(columnarStore.toDateStrings(dates)) == ["2021-01-05", "2021-01-06", "2021-01-07"]
+    np.testing.assert_array_equal(prices, 10.0)
+    assert columnarStore.getPriceArrays(database, "BBB.AX", "2021-01-01", "2021-12-31") is None
+
+
+# Prices written through insertPrices() by any path, not just a refresh,
+# rewrite the stock's files, so price ranges aren't read from stale files
+def test_insert_prices_keeps_store_in_sync(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-08", 10.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    portfolio.buildPriceStore()
+    assert stock.getPriceRange("2021-01-04", "2021-01-15")[SC.HISTORICAL_PRICE].tolist() == [10.0] * 5
+
+    downloader.insertPrices(database, [("AAA.AX", "2021-01-06", 12.0), ("AAA.AX", "2021-01-11", 13.0)])
+    dates, prices = columnarStore.getPriceArrays(database, "AAA.AX", "2021-01-01", "2021-12-31")
+    assert len(dates) == 6
+    assert stock.getPriceRange("2021-01-04", "2021-01-15")[SC.HISTORICAL_PRICE].tolist() == \
+        [10.0, 10.0, 12.0, 10.0, 10.0, 13.0]
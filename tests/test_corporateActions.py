@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Tests for corporateActions.py"""
+import numpy as np
+import pytest
+import stockContract as SC
+from conftest import addPrices
+
+
+# A stock that splits 2 for 1 on 2021-01-11, with its stored prices halving
+@pytest.fixture
+def splitStock(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-08", 10.0)
+    addPrices(database, "AAA.AX", "2021-01-11", "2021-01-15", 5.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 10.0, "2021-01-04")
+    stock.addSplit(2, "2021-01-11")
+    return stock
+
+
+# Shares bought before the split count as the shares they became, and prices
+# before it are adjusted, so the value is continuous
+def test_split_adjusts_shares_and_prices(splitStock):
+    assert splitStock.getOwned("2021-01-08") == 10
+    assert splitStock.getOwned("2021-01-11") == 20
+    assert splitStock.numberOwned == 20
+    assert str(splitStock).startswith("AAA.AX - number owned: 20, total cost: $100.00")
+    np.testing.assert_allclose(splitStock.getPriceRange("2021-01-04", "2021-01-15")[SC.HISTORICAL_PRICE], 5.0)
+    series = splitStock.getTimeSeries("2021-01-04", "2021-01-15")
+    np.testing.assert_allclose(series[SC.TOTAL_OWNED], 20)
+    np.testing.assert_allclose(series[SC.TOTAL_VALUE], 100)
+
+
+# Removing the split undoes the adjustment
+def test_remove_split(splitStock):
+    splitStock.removeSplit(2, "2021-01-11")
+    assert splitStock.numberOwned == 10
+    assert splitStock.getPriceRange("2021-01-04", "2021-01-04")[SC.HISTORICAL_PRICE].iloc[0] == 10.0
+    np.testing.assert_allclose(splitStock.getTimeSeries("2021-01-11", "2021-01-15")[SC.TOTAL_VALUE], 50)
+
+
+# A DRP allotment is a dividend paid and shares bought with it, and is
+# removed as a whole
+def test_drp_allotment(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-15", 10.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 10.0, "2021-01-04")
+    stock.addDrp(50.0, 5, 10.0, "2021-01-11")
+    assert stock.numberOwned == 15
+    assert stock.totalDividend == pytest.approx(50)
+    assert stock.totalCost == pytest.approx(150)
+    assert stock.getTimeSeries("2021-01-15", "2021-01-15")[SC.TOTAL_VALUE].iloc[0] == pytest.approx(150)
+
+    stock.removeDrp(50.0, 5, 10.0, "2021-01-11")
+    assert stock.numberOwned == 10
+    assert stock.totalDividend == 0
+    assert stock.totalCost == pytest.approx(100)
+    assert stock.getTimeSeries("2021-01-15", "2021-01-15")[SC.TOTAL_VALUE].iloc[0] == pytest.approx(100)
+
+
+# Removing a DRP allotment removes its own dividend and purchase, not another
+# dividend and purchase with the same date and amounts
+def test_remove_drp_keeps_matching_rows(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-15", 10.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.addDividend(50.0, "2021-01-11")
+    stock.buy(5, 10.0, "2021-01-11")
+    stock.addDrp(50.0, 5, 10.0, "2021-01-11")
+    stock.removeDrp(50.0, 5, 10.0, "2021-01-11")
+
+    assert database.readValue("SELECT GROUP_CONCAT(rowid) FROM {}".format(SC.DIVIDEND_TABLE_NAME)) == "1"
+    assert database.readValue("SELECT GROUP_CONCAT(rowid) FROM {}".format(SC.TABLE_NAME)) == "1"
+    assert stock.numberOwned == 5
+    assert stock.totalDividend == pytest.approx(50)
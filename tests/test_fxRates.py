@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Tests for fxRates.py"""
+import pytest
+import stockDownloader as downloader
+import performanceMetrics as metrics
+import fxRates
+
+
+# An AUD stock and a USD stock, each bought for 100 of its own currency, with
+# the Australian dollar falling between the purchases and the dividends
+@pytest.fixture
+def mixedCurrencies(portfolio, database):
+    fxRates.insertRates(database, [("USD", "AUD", "2021-01-01", 1.5), ("USD", "AUD", "2021-07-01", 2.0)])
+    downloader.insertPrices(database, [("AAA.AX", "2021-01-01", 10.0), ("AAA.AX", "2021-07-01", 10.0),
+                                       ("UUU", "2021-01-01", 10.0), ("UUU", "2021-07-01", 10.0)])
+    local = portfolio.addStock("AAA.AX", 50, refresh = False)
+    foreign = portfolio.addStock("UUU", 50, refresh = False, currency = "USD")
+    local.buy(10, 10.0, "2021-01-01")
+    foreign.buy(10, 10.0, "2021-01-01")
+    local.addDividend(5.0, "2021-07-01")
+    foreign.addDividend(10.0, "2021-07-01")
+    return portfolio
+
+
+# Costs and dividends are converted at the rate on the day they were paid
+def test_totals_in_base_currency(mixedCurrencies):
+    assert mixedCurrencies.getCost() == pytest.approx(100 + 150)
+    assert mixedCurrencies.getDividends() == pytest.approx(5 + 20)
+    assert mixedCurrencies.getDividends("2021-06-30") == 0
+
+
+# The USD stock gains from the exchange rate, and the portfolio adds the two
+# stocks in the same currency
+def test_performance_in_base_currency(mixedCurrencies):
+    performance = mixedCurrencies.getPerformance("2021-01-01", "2021-07-01")
+    assert performance.loc["AAA.AX", "TWR"] == pytest.approx(105/100 - 1)
+    assert performance.loc["UUU", "TWR"] == pytest.approx((200 + 20)/150 - 1)
+    assert performance.loc[metrics.PORTFOLIO_COLUMN, "TWR"] == pytest.approx((300 + 25)/250 - 1)
+    years = 181/metrics.DAYS_PER_YEAR
+    assert performance.loc["UUU", "XIRR"] == pytest.approx((220/150)**(1/years) - 1, rel = 1e-6)
+    assert performance.loc[metrics.PORTFOLIO_COLUMN, "XIRR"] == pytest.approx((325/250)**(1/years) - 1, rel = 1e-6)
+
+
+# Backtested prices are converted, so the contribution buys about the same
+# value of each stock
+def test_backtest_in_base_currency(mixedCurrencies):
+    result = mixedCurrencies.backtest(1000, "2021-01-01", "2021-07-01")
+    assert list(result.trades[0]) == [50, 33]
+    assert result.value[0] == pytest.approx(1000 - result.fees[0])
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Tests for holdingsTable.py"""
+import numpy as np
+import pandas as pd
+import pytest
+import stockContract as SC
+import holdingsTable
+from conftest import addPrices
+
+
+# Reads every snapshot of the stocks in codes, sorted by code and date
+def readSnapshots(database, codes):
+    sqlQuery = ''' SELECT * FROM {} ORDER BY {}, {}'''.format(SC.HOLDINGS_TABLE_NAME, SC.HOLDINGS_CODE, SC.HOLDINGS_DATE)
+    data = database.readDatabase(sqlQuery)
+    return data[data[SC.HOLDINGS_CODE].isin(codes)].reset_index(drop = True)
+
+
+# Snapshots kept up to date by each transaction match a full rebuild
+def test_update_matches_rebuild(portfolio, database):
+    addPrices(database, "AAA.AX", "2020-01-01", "2020-12-31", 10.0)
+    addPrices(database, "BBB.AX", "2020-01-01", "2020-12-31", 20.0)
+    first = portfolio.addStock("AAA.AX", 50, refresh = False)
+    second = portfolio.addStock("BBB.AX", 50, refresh = False)
+    first.buy(10, 9.5, "2020-03-02")
+    second.buy(5, 21.0, "2020-02-03")
+    first.addDividend(12.5, "2020-06-30")
+    # Back dated transactions change the snapshots after them
+    first.buy(4, 8.0, "2020-01-15")
+    first.sell(6, 11.0, "2020-09-01")
+    second.addDividend(7.0, "2020-04-01")
+    second.removeDividend(7.0, "2020-04-01")
+    first.remove(4, 8.0, "2020-01-15")
+    incremental = readSnapshots(database, ["AAA.AX", "BBB.AX"])
+
+    holdingsTable.rebuild(database, ["AAA.AX", "BBB.AX"])
+    rebuilt = readSnapshots(database, ["AAA.AX", "BBB.AX"])
+    pd.testing.assert_frame_equal(incremental, rebuilt)
+    latest = rebuilt.groupby(SC.HOLDINGS_CODE).last()
+    assert latest.loc["AAA.AX", SC.HOLDINGS_OWNED] == 4
+    assert latest.loc["AAA.AX", SC.HOLDINGS_VALUE] == 40
+    assert latest.loc["AAA.AX", SC.HOLDINGS_DIVIDENDS] == 12.5
+    assert latest.loc["BBB.AX", SC.HOLDINGS_DIVIDENDS] == 0
+
+
+# A failed snapshot update rolls back the removal it was part of
+@pytest.mark.parametrize("removal", ["purchase", "dividend"])
+def test_failed_remove_rolls_back(portfolio, database, monkeypatch, removal):
+    addPrices(database, "AAA.AX", "2020-01-01", "2020-03-31", 10.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 9.5, "2020-01-06")
+    stock.addDividend(3.0, "2020-02-03")
+    before = readSnapshots(database, ["AAA.AX"])
+
+    def failingUpdate(database, stockCode, fromDate):
+        raise RuntimeError("update failed")
+    monkeypatch.setattr(holdingsTable, "update", failingUpdate)
+    with pytest.raises(RuntimeError):
+        if removal == "purchase":
+            stock.remove(10, 9.5, "2020-01-06")
+        else:
+            stock.removeDividend(3.0, "2020-02-03")
+    assert stock.getOwned("2020-03-31") == 10
+    assert stock.getDividend("2020-03-31") == 3.0
+    assert stock.numberOwned == 10
+    pd.testing.assert_frame_equal(readSnapshots(database, ["AAA.AX"]), before)
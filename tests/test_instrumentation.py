@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Tests for instrumentation.py"""
+import json
+import pytest
+import instrumentation
+
+
+# Starts each test with no recorded events
+@pytest.fixture(autouse = True)
+def clean():
+    instrumentation.reset()
+    yield
+    instrumentation.reset()
+
+
+# Queries that only differ in their values share a fingerprint
+def test_fingerprint():
+    first, normalized = instrumentation.fingerprint("SELECT * FROM t WHERE Code = 'A.AX' AND Value > 10")
+    second, _ = instrumentation.fingerprint("SELECT *  FROM t\n WHERE Code = 'B.AX' AND Value > 2.5")
+    assert first == second
+    assert normalized == "SELECT * FROM t WHERE Code = ? AND Value > ?"
+    inList, normalized = instrumentation.fingerprint("SELECT * FROM t WHERE Code IN (?, ?, ?)")
+    assert normalized == "SELECT * FROM t WHERE Code IN (...)"
+    assert inList == instrumentation.fingerprint("SELECT * FROM t WHERE Code IN ('A', 'B')")[0]
+    assert first != inList
+
+
+# Nothing is recorded unless profiling is turned on
+def test_off_by_default(database):
+    if instrumentation.enabled:
+        pytest.skip("profiling turned on by the environment")
+    database.readValue("SELECT 1")
+    assert instrumentation.getEvents().empty
+
+
+# Queries record their rows and the traced functions they are made from, and
+# the trace is written in the Chrome format
+def test_profiling_records_queries_and_spans(portfolio, database, tmp_path):
+    database.executeCommand("CREATE TABLE numbers (Value REAL)")
+
+    @instrumentation.traced
+    def readNumbers():
+        return database.readDatabase("SELECT * FROM numbers WHERE Value > ?", (1.5,))
+
+    traceFile = str(tmp_path / "trace.json")
+    with instrumentation.profiling(traceFile):
+        database.executeMany("INSERT INTO numbers VALUES (?)", [(1.0,), (2.0,), (3.0,)])
+        readNumbers()
+        portfolio.getCodes()
+    database.readValue("SELECT 1")
+
+    events = instrumentation.getEvents()
+    queries = events[events["category"] == "sql"]
+    assert queries["rows"].tolist() == [3, 2]
+    assert queries["sql"].tolist()[1] == "SELECT * FROM numbers WHERE Value > ?"
+    spans = events[events["category"] == "span"]
+    assert sorted(spans["name"]) == ["Portfolio.getCodes",
+                                     "test_profiling_records_queries_and_spans.<locals>.readNumbers"]
+    # The query made by readNumbers() falls inside its span
+    span = spans[spans["name"].str.endswith("readNumbers")].iloc[0]
+    query = queries.iloc[1]
+    assert span["start"] <= query["start"]
+    assert query["start"] + query["duration"] <= span["start"] + span["duration"]
+
+    with open(traceFile) as trace:
+        traceEvents = json.load(trace)["traceEvents"]
+    assert len(traceEvents) == len(events)
+    assert {event["ph"] for event in traceEvents} == {"X"}
+
+
+# Counters only count while profiling
+def test_count():
+    wasEnabled = instrumentation.enabled
+    instrumentation.count("tests")
+    with instrumentation.profiling():
+        instrumentation.count("tests")
+        instrumentation.count("tests", 2)
+    assert instrumentation._counters == {"tests": 4 if wasEnabled else 3}
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Tests for the schema migrations in stockContract.py"""
+import os
+import sqlite3
+import stockContract as SC
+from PortfolioTracker import Portfolio
+
+
+# Writes a database in the schema from before the migrations: no indexes, a
+# duplicated price row and dates stored with a time
+def writeOldDatabase(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE {} ({})".format(SC.TABLE_NAME, SC.COLUMN_LIST))
+    conn.execute("CREATE TABLE {} ({})".format(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_COLUMN_LIST))
+    conn.execute("CREATE TABLE {} ({})".format(SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_COLUMN_LIST))
+    conn.executemany("INSERT INTO {} VALUES (?, ?, ?)".format(SC.HISTORICAL_TABLE_NAME),
+                     [("AAA.AX", "2021-01-04 00:00:00", 10.0), ("AAA.AX", "2021-01-04 00:00:00", 10.0),
+                      ("AAA.AX", "2021-01-05 00:00:00", 11.0)])
+    conn.execute("INSERT INTO {} VALUES (?, ?, ?, ?, ?)".format(SC.TABLE_NAME),
+                 ("AAA.AX", "2021-01-04 00:00:00", 10, 10.0, 100.0))
+    conn.execute("INSERT INTO {} VALUES (?, ?, ?)".format(SC.DIVIDEND_TABLE_NAME),
+                 ("AAA.AX", "2021-01-05 00:00:00", 5.0))
+    conn.commit()
+    conn.close()
+
+
+# Opening an old database brings it up to the latest version, keeping its data
+def test_migrate_old_schema(tmp_path):
+    writeOldDatabase(os.path.join(str(tmp_path), "old.db"))
+    portfolio = Portfolio("old", refresh = False, databaseDirectory = str(tmp_path))
+    try:
+        database = portfolio.stockDatabase
+        assert database.readValue("PRAGMA user_version") == len(SC.MIGRATIONS)
+        prices = database.readDatabase("SELECT {}, {} FROM {} ORDER BY {}".format(
+            SC.HISTORICAL_DATE, SC.HISTORICAL_PRICE, SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_DATE))
+        assert prices.values.tolist() == [["2021-01-04", 10.0], ["2021-01-05", 11.0]]
+        assert database.readValue("SELECT {} FROM {}".format(SC.DATE, SC.TABLE_NAME)) == "2021-01-04"
+        assert database.readValue("SELECT {} FROM {}".format(SC.DIVIDEND_DATE, SC.DIVIDEND_TABLE_NAME)) == "2021-01-05"
+
+        indexes = set(database.readDatabase("SELECT name FROM sqlite_master WHERE type = 'index'")["name"])
+        assert {SC.HISTORICAL_INDEX, SC.PURCHASE_INDEX, SC.DIVIDEND_INDEX, SC.HISTORICAL_DATE_INDEX,
+                SC.HOLDINGS_INDEX, SC.LOT_INDEX, SC.EMPTY_RANGE_INDEX} <= indexes
+
+        # The snapshots are filled from the existing data
+        snapshots = database.readDatabase("SELECT {}, {}, {}, {} FROM {} ORDER BY {}".format(
+            SC.HOLDINGS_OWNED, SC.HOLDINGS_SPENT, SC.HOLDINGS_DIVIDENDS, SC.HOLDINGS_VALUE,
+            SC.HOLDINGS_TABLE_NAME, SC.HOLDINGS_DATE))
+        assert snapshots.values.tolist() == [[10, 100.0, 0.0, 100.0], [10, 100.0, 5.0, 110.0]]
+
+        # Migrating again does nothing
+        assert database.migrate(SC.MIGRATIONS) == len(SC.MIGRATIONS)
+        assert database.readValue("SELECT COUNT(*) FROM {}".format(SC.HOLDINGS_TABLE_NAME)) == 2
+    finally:
+        portfolio.stockDatabase.close()
+
+
+# A database at version 6 has its lot selections linked to the sale they were
+# made for, found by its date and price
+def test_migrate_lot_selections_from_version_6(tmp_path):
+    conn = sqlite3.connect(os.path.join(str(tmp_path), "v6.db"))
+    conn.execute("CREATE TABLE {} ({})".format(SC.TABLE_NAME, SC.COLUMN_LIST))
+    conn.execute("CREATE TABLE {} ({})".format(SC.HISTORICAL_TABLE_NAME, SC.HISTORICAL_COLUMN_LIST))
+    conn.execute("CREATE TABLE {} ({})".format(SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_COLUMN_LIST))
+    for commands in SC.MIGRATIONS[:6]:
+        for command in commands:
+            conn.execute(command)
+    conn.execute("PRAGMA user_version = 6")
+    conn.executemany("INSERT INTO {} VALUES (?, ?, ?, ?, ?)".format(SC.TABLE_NAME),
+                     [("AAA.AX", "2015-02-02", 10, 50.0, 500.0), ("AAA.AX", "2016-01-04", -3, 55.0, -165.0),
+                      ("AAA.AX", "2016-01-04", -2, 60.0, -120.0)])
+    conn.executemany("INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?)".format(SC.LOT_TABLE_NAME),
+                     [("AAA.AX", "2016-01-04", 60.0, "2015-02-02", 50.0, 2),
+                      ("AAA.AX", "2016-01-04", 55.0, "2015-02-02", 50.0, 3)])
+    conn.commit()
+    conn.close()
+
+    portfolio = Portfolio("v6", refresh = False, databaseDirectory = str(tmp_path))
+    try:
+        database = portfolio.stockDatabase
+        assert database.readValue("PRAGMA user_version") == len(SC.MIGRATIONS)
+        lots = database.readDatabase("SELECT {}, {} FROM {} ORDER BY rowid".format(
+            SC.LOT_SALE_ID, SC.LOT_NUMBER, SC.LOT_TABLE_NAME))
+        assert lots.values.tolist() == [[3, 2], [2, 3]]
+        indexes = set(database.readDatabase("SELECT name FROM sqlite_master WHERE type = 'index'")["name"])
+        assert SC.LOT_INDEX in indexes
+    finally:
+        portfolio.stockDatabase.close()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Tests for performanceMetrics.py"""
+import numpy as np
+import pytest
+import stockDownloader as downloader
+import performanceMetrics as metrics
+
+
+# Two stocks bought on different dates, priced on three dates
+@pytest.fixture
+def twoStocks(portfolio, database):
+    downloader.insertPrices(database, [("AAA.AX", "2021-01-01", 10.0), ("AAA.AX", "2021-07-01", 12.0),
+                                       ("AAA.AX", "2022-01-01", 11.0), ("BBB.AX", "2021-07-01", 21.0),
+                                       ("BBB.AX", "2022-01-01", 22.0)])
+    first = portfolio.addStock("AAA.AX", 50, refresh = False)
+    second = portfolio.addStock("BBB.AX", 50, refresh = False)
+    first.buy(10, 9.0, "2021-01-01")
+    second.buy(5, 20.0, "2021-07-01")
+    return portfolio
+
+
+# The gain from the purchase price to the first close counts for the stock and
+# the portfolio
+def test_time_weighted_return(twoStocks):
+    performance = twoStocks.getPerformance("2021-01-01", "2022-01-01")
+    assert performance.loc["AAA.AX", "TWR"] == pytest.approx(100/90 * 120/100 * 110/120 - 1)
+    assert performance.loc["BBB.AX", "TWR"] == pytest.approx(105/100 * 110/105 - 1)
+    assert performance.loc[metrics.PORTFOLIO_COLUMN, "TWR"] == pytest.approx(100/90 * (225 - 100)/100 * 220/225 - 1)
+
+
+# A single holding has the same returns as the portfolio
+def test_portfolio_matches_single_holding(portfolio, database):
+    downloader.insertPrices(database, [("AAA.AX", "2021-01-0{}".format(day), 10.0 + day) for day in range(4, 9)])
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 13.0, "2021-01-04")
+    stock.buy(5, 16.5, "2021-01-06")
+    performance = portfolio.getPerformance("2021-01-01", "2021-01-08")
+    np.testing.assert_allclose(performance.loc["AAA.AX"], performance.loc[metrics.PORTFOLIO_COLUMN])
+    assert performance.loc["AAA.AX", "TWR"] == pytest.approx(140/130 * 150/140 * (240 - 82.5)/150 * 270/240 - 1)
+
+
+# Starting part way through a holding counts the shares held at the start at
+# that date's price rather than as a purchase
+def test_period_starting_after_purchase(twoStocks):
+    performance = twoStocks.getPerformance("2021-07-01", "2022-01-01")
+    assert performance.loc["AAA.AX", "TWR"] == pytest.approx(110/120 - 1)
+
+
+# XIRR of the purchases, valued at the last price
+def test_xirr_of_holdings(twoStocks):
+    performance = twoStocks.getPerformance("2021-01-01", "2022-01-01")
+    assert performance.loc["AAA.AX", "XIRR"] == pytest.approx(110/90 - 1)
+    assert performance.loc["BBB.AX", "XIRR"] == pytest.approx(1.1 ** (365/184) - 1)
+
+
+# xirr() against known values, solving several problems at once
+def test_xirr_known_values():
+    amounts = np.array([[-1000, 0, 1100],
+                        [-1000, 500, 600],
+                        [-100, 0, 50],
+                        [-100, -100, 0]])
+    times = np.array([0, 1, 2])
+    rates = metrics.xirr(amounts, times)
+    assert rates[0] == pytest.approx(np.sqrt(1.1) - 1)
+    # 500/(1 + r) + 600/(1 + r)^2 = 1000
+    assert rates[1] == pytest.approx((500 + np.sqrt(500**2 + 4*1000*600)) / 2000 - 1)
+    assert rates[2] == pytest.approx(np.sqrt(0.5) - 1)
+    # Cash flows all the same sign have no rate
+    assert np.isnan(rates[3])
+
+
+# getMonthEnds() keeps the last date of each month
+def test_month_ends():
+    dates = np.array(["2021-01-04", "2021-01-29", "2021-02-01", "2021-02-26", "2021-03-01"])
+    assert list(metrics.getMonthEnds(dates)) == ["2021-01-29", "2021-02-26", "2021-03-01"]
+
+
+# The rolling volatility is NaN until there is a full window of returns, then
+# matches the volatility of the returns in the window
+def test_rolling_volatility(portfolio, database):
+    prices = [10.0, 11.0, 10.5, 12.0, 11.0, 11.5]
+    downloader.insertPrices(database, [("AAA.AX", "2021-01-{:02d}".format(day + 4), price)
+                                       for day, price in enumerate(prices)])
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 10.0, "2021-01-04")
+    performance = portfolio.getPerformance("2021-01-01", "2021-01-09", window = 3)
+    lastReturns = np.array(prices[-3:]) / np.array(prices[-4:-1]) - 1
+    assert performance.loc["AAA.AX", "Rolling_Volatility"] == \
+        pytest.approx(metrics.volatility(lastReturns))
+    longWindow = portfolio.getPerformance("2021-01-01", "2021-01-09", window = 10)
+    assert np.isnan(longWindow.loc["AAA.AX", "Rolling_Volatility"])
+
+
+# The monthly XIRR at each month end matches the XIRR over the period ending on it
+def test_monthly_performance(twoStocks):
+    monthly = twoStocks.getMonthlyPerformance("2021-01-01", "2022-01-01", window = 2)
+    assert list(monthly.index) == ["2021-01-01", "2021-07-01", "2022-01-01"]
+    for date in ["2021-07-01", "2022-01-01"]:
+        performance = twoStocks.getPerformance("2021-01-01", date)
+        np.testing.assert_allclose(monthly.loc[date, "XIRR"], performance["XIRR"])
+    assert monthly.loc["2022-01-01", ("Rolling_Volatility", "AAA.AX")] == \
+        pytest.approx(metrics.volatility(np.array([120/100 - 1, 110/120 - 1])))
+    assert np.isnan(monthly.loc["2021-01-01", ("Rolling_Volatility", "AAA.AX")])
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests for priceCache.py"""
+import stockDownloader as downloader
+import priceCache
+from priceCache import PriceCache, getPriceCache
+from conftest import addPrices
+
+
+# The least recently used entry is evicted, and the counts are kept
+def test_lru_eviction_and_stats():
+    cache = PriceCache(maxSize = 2)
+    cache.put((priceCache.PRICE, "AAA.AX", "2021-01-04"), 10.0)
+    cache.put((priceCache.PRICE, "AAA.AX", "2021-01-05"), 11.0)
+    assert cache.get((priceCache.PRICE, "AAA.AX", "2021-01-04")) == 10.0
+    cache.put((priceCache.PRICE, "AAA.AX", "2021-01-06"), 12.0)
+    assert cache.get((priceCache.PRICE, "AAA.AX", "2021-01-05")) is None
+    assert cache.get((priceCache.PRICE, "AAA.AX", "2021-01-04")) == 10.0
+    assert cache.stats() == {"size": 2, "maxSize": 2, "hits": 2, "misses": 1, "hitRate": 2/3}
+
+
+# Entries of different kinds don't share keys, and invalidating a stock
+# removes all of its entries but no other stock's
+def test_kinds_and_invalidate():
+    cache = PriceCache()
+    cache.put((priceCache.PRICE, "AAA.AX", "split"), 10.0)
+    cache.put((priceCache.SPLITS, "AAA.AX"), "splits")
+    cache.put((priceCache.PRICE_AS_OF, "AAA.AX", "2021-01-04"), 11.0)
+    cache.put((priceCache.RANGE, "AAA.AX", "asOf", "2021-01-04"), "range")
+    cache.put((priceCache.PRICE, "BBB.AX", "2021-01-04"), 20.0)
+    assert cache.get((priceCache.PRICE, "AAA.AX", "split")) == 10.0
+    assert cache.get((priceCache.SPLITS, "AAA.AX")) == "splits"
+    assert cache.get((priceCache.PRICE_AS_OF, "AAA.AX", "2021-01-04")) == 11.0
+
+    cache.invalidate("AAA.AX")
+    assert cache.stats()["size"] == 1
+    assert cache.get((priceCache.PRICE, "BBB.AX", "2021-01-04")) == 20.0
+
+
+# Cached prices are served without a query, and are replaced when new prices
+# are written for the stock
+def test_stock_prices_cached_until_written(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-08", 10.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    cache = getPriceCache(database)
+    cache.clear()
+    assert stock.getPrice("2021-01-05") == 10.0
+    assert stock.getPriceAsOf("2021-01-09") == 10.0
+    assert stock.getPrice("2021-01-05") == 10.0
+    assert stock.getPriceAsOf("2021-01-09") == 10.0
+    assert cache.stats()["hits"] == 2
+
+    downloader.insertPrices(database, [("AAA.AX", "2021-01-05", 12.0), ("AAA.AX", "2021-01-08", 13.0)])
+    assert stock.getPrice("2021-01-05") == 12.0
+    assert stock.getPriceAsOf("2021-01-09") == 13.0
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Tests for rebalancer.py"""
+import numpy as np
+import pytest
+import rebalancer
+
+
+# The fees are taken out of the cash before it is split between the stocks
+def test_solve_with_fees():
+    plan = rebalancer.solveRebalance([0, 0], [10.0, 10.0], [0.5, 0.5], 1000, feeModel = rebalancer.FeeModel(fixedFee = 10))
+    assert list(plan.trades) == [49, 49]
+    assert plan.totalFees == 20
+    assert plan.cashRemaining == pytest.approx(0)
+
+
+# Without selling, an overweight stock isn't sold and the cash goes to the
+# underweight one. With selling, the portfolio is brought back to the targets.
+def test_solve_selling_allowed():
+    plan = rebalancer.solveRebalance([100, 0], [10.0, 10.0], [0.5, 0.5], 500)
+    assert list(plan.trades) == [0, 50]
+    plan = rebalancer.solveRebalance([100, 0], [10.0, 10.0], [0.5, 0.5], 0, sellingAllowed = True)
+    assert list(plan.trades) == [-50, 50]
+    assert plan.cashRemaining == pytest.approx(0)
+
+
+# Plans never spend more than the cash, never sell unless allowed and never
+# make a trade smaller than the minimum
+@pytest.mark.parametrize("seed", range(20))
+def test_solve_limits(seed):
+    random = np.random.default_rng(seed)
+    numberStocks = random.integers(1, 20)
+    holdings = random.integers(0, 200, numberStocks)
+    prices = random.uniform(0.5, 150, numberStocks)
+    weights = random.dirichlet(np.ones(numberStocks))
+    cash = random.uniform(0, 20000)
+    feeModel = rebalancer.FeeModel(fixedFee = random.uniform(0, 10), percentageFee = random.uniform(0, 0.01),
+                                   minimumFee = random.uniform(0, 20))
+    plan = rebalancer.solveRebalance(holdings, prices, weights, cash, minimumTransaction = 200, feeModel = feeModel)
+    assert plan.totalSpent + plan.totalFees <= cash + 1e-9
+    assert (plan.trades >= 0).all()
+    assert (np.abs(plan.tradeValues[plan.trades != 0]) >= 200).all()
+    np.testing.assert_array_equal(plan.trades, np.round(plan.trades))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Tests for reportRenderer.py"""
+import os
+import pytest
+import reportRenderer
+from conftest import addPrices
+
+
+# A portfolio holding one stock with a week of prices
+@pytest.fixture
+def holding(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-08", 10.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 10.0, "2021-01-04")
+    return portfolio
+
+
+# Gets the time each file in a report was last modified
+def getModifiedTimes(outputDirectory):
+    return {name: os.stat(os.path.join(outputDirectory, name)).st_mtime_ns
+            for name in os.listdir(outputDirectory)}
+
+
+# Figures are only rendered again when the data behind them changes
+def test_render_report_skips_unchanged(holding, database, tmp_path):
+    outputDirectory = str(tmp_path / "report")
+    first = holding.renderReport(outputDirectory, "svg", "2021-01-01", "2021-01-08")
+    assert list(first.values()) == [True, True]
+    assert sorted(os.listdir(outputDirectory)) == ["AAA.AX.svg", "AAA.AX.svg.hash",
+                                                   "Portfolio.svg", "Portfolio.svg.hash"]
+    modified = getModifiedTimes(outputDirectory)
+
+    second = holding.renderReport(outputDirectory, "svg", "2021-01-01", "2021-01-08")
+    assert list(second.values()) == [False, False]
+    assert getModifiedTimes(outputDirectory) == modified
+
+    holding.stockList[0].addDividend(5.0, "2021-01-07")
+    third = holding.renderReport(outputDirectory, "svg", "2021-01-01", "2021-01-08")
+    assert list(third.values()) == [True, True]
+
+
+# A missing output file is rendered again even if its hash is up to date, and
+# a different format is a different figure
+def test_render_missing_file_and_format(holding, tmp_path):
+    outputDirectory = str(tmp_path / "report")
+    holding.renderReport(outputDirectory, "svg", "2021-01-01", "2021-01-08")
+    os.remove(os.path.join(outputDirectory, "AAA.AX.svg"))
+    rendered = holding.renderReport(outputDirectory, "svg", "2021-01-01", "2021-01-08")
+    assert rendered == {os.path.join(outputDirectory, "Portfolio.svg"): False,
+                        os.path.join(outputDirectory, "AAA.AX.svg"): True}
+    data = holding.stockList[0].getTimeSeries("2021-01-01", "2021-01-08")
+    assert reportRenderer.getDataHash("AAA.AX", data, "svg") != reportRenderer.getDataHash("AAA.AX", data, "png")
+
+
+# Only the supported formats can be rendered
+def test_render_unknown_format(holding, tmp_path):
+    with pytest.raises(ValueError):
+        holding.renderReport(str(tmp_path), "gif", "2021-01-01", "2021-01-08")
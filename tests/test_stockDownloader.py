@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Tests for stockDownloader.py"""
+import datetime
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import pytest
+import stockContract as SC
+import stockDownloader as downloader
+from conftest import addPrices
+
+
+# Price source that adds nothing and records the ranges it was asked for
+class EmptySource(downloader.PriceSource):
+    def __init__(self):
+        self.requests = []
+
+    def update(self, stockCode, database, minDate = '1900-01-01', maxDate = None):
+        self.requests.append((stockCode, minDate, maxDate))
+        return 0
+
+
+# Dates only traded on another currency's exchange aren't gaps
+def test_plan_refresh_uses_calendar_of_same_currency(portfolio, database):
+    today = str(datetime.date.today())
+    addPrices(database, "AAA.AX", "2020-01-01", "2020-03-31", 10.0)
+    portfolio.addStock("SPY", 50, refresh = False, currency = "USD")
+    # Saturdays in the other currency's prices
+    saturdays = pd.date_range("2020-01-04", "2020-03-28", freq = "W-SAT").strftime("%Y-%m-%d")
+    downloader.insertPrices(database, [("SPY", date, 300.0) for date in saturdays])
+    addPrices(database, "SPY", "2020-01-01", "2020-03-31", 300.0)
+
+    assert downloader.planRefresh("AAA.AX", database) == [("2020-04-01", today)]
+
+
+# Gaps that come back empty, e.g. a trading halt, are only fetched once
+def test_empty_gaps_are_not_refetched(portfolio, database):
+    today = str(datetime.date.today())
+    addPrices(database, "AAA.AX", "2020-01-01", "2020-03-31", 10.0)
+    addPrices(database, "BBB.AX", "2020-01-01", "2020-02-07", 20.0)
+    addPrices(database, "BBB.AX", "2020-02-24", "2020-03-31", 20.0)
+    assert downloader.planRefresh("BBB.AX", database) == [("2020-02-10", "2020-02-21"), ("2020-04-01", today)]
+
+    source = EmptySource()
+    assert downloader.updateStockData("BBB.AX", database, source) == 0
+    assert source.requests == [("BBB.AX", "2020-02-10", "2020-02-21"), ("BBB.AX", "2020-04-01", today)]
+    # The range up to today is still fetched, as it may have data later
+    assert downloader.planRefresh("BBB.AX", database) == [("2020-04-01", today)]
+
+
+# Local HTTP server standing in for the price pages. Each path fails with the
+# statuses in failures before returning its price, and the server records the
+# time of every request and the most requests it was handling at once.
+class StubServer:
+    def __init__(self, failures, responses):
+        self.failures = failures
+        self.responses = responses
+        self.requests = {}
+        self.active = 0
+        self.maxActive = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    times = stub.requests.setdefault(self.path, [])
+                    times.append(time.monotonic())
+                    stub.active += 1
+                    stub.maxActive = max(stub.maxActive, stub.active)
+                    attempt = len(times) - 1
+                time.sleep(0.05)
+                failures = stub.failures.get(self.path, [])
+                status = failures[attempt] if attempt < len(failures) else 200
+                body = stub.responses.get(self.path, b"10.0") if status == 200 else b""
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub.lock:
+                    stub.active -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Price source that reads today's price of each stock from the stub server
+class StubSource(downloader.PriceSource):
+    def __init__(self, url):
+        self.url = url
+
+    def update(self, stockCode, database, minDate = '1900-01-01', maxDate = None):
+        price = float(downloader.fetchPage("{}/{}".format(self.url, stockCode)))
+        return downloader.insertPrices(database, [(stockCode, maxDate, price)])
+
+
+@pytest.fixture
+def stubServer(monkeypatch):
+    monkeypatch.setattr(downloader, "RETRY_BACKOFF", 0.02)
+    monkeypatch.setattr(downloader, "rateLimiter", downloader.RateLimiter(0))
+    server = StubServer({"/RETRY.AX": [500, 429], "/MISSING.AX": [404] * 10},
+                        {"/BAD.AX": b"not a price"})
+    yield server
+    server.close()
+
+
+# Server errors and rate limiting are retried with backoff, client errors
+# aren't, and a stock that fails doesn't stop the others
+def test_update_all_retries_and_limits_concurrency(database, stubServer):
+    codes = ["RETRY.AX", "MISSING.AX", "BAD.AX"] + ["OK{}.AX".format(i) for i in range(5)]
+    rowsAdded = downloader.updateAllStockData(codes, database, maxWorkers = 2, priceSource = StubSource(stubServer.url))
+
+    assert rowsAdded == dict({code: 1 for code in codes}, **{"MISSING.AX": None, "BAD.AX": None})
+    retries = stubServer.requests["/RETRY.AX"]
+    assert len(retries) == 3
+    # Each retry waits for the response and then the doubled backoff
+    assert (np.diff(retries) >= np.array([0.05 + 0.02, 0.05 + 0.04]) - 0.005).all()
+    assert len(stubServer.requests["/MISSING.AX"]) == 1
+    assert stubServer.maxActive == 2
+
+
+# Yahoo style price pages of (day, price) rows for January 2021, newest first,
+# followed by a page without a price table
+def yahooPages(pages):
+    html = []
+    for rows in pages:
+        cells = "".join("<tr>" + "<td>{} Jan 2021</td>".format(day) + "<td>0</td>" * 3 + "<td>{}</td>".format(price) +
+                        "<td>0</td>" * 2 + "</tr>" for day, price in rows)
+        html.append('<html><body><table class="yfnc_datamodoutline1"><tr><td><table>{}</table></td></tr></table>'
+                    '</body></html>'.format(cells).encode())
+    return html + [b"<html><body></body></html>"]
+
+
+# The snapshots are updated once after a scrape written in several batches,
+# and the batches written before a failed page are still refreshed
+@pytest.mark.parametrize("failPage", [None, 2])
+def test_scrape_refreshes_once(portfolio, database, monkeypatch, failPage):
+    pages = yahooPages([[(8, 14.0), (7, 13.0)], [(6, 12.0), (5, 11.0)], [(4, 10.0)]])
+    def fetchPage(url):
+        page = int(url.rsplit("=", 1)[1]) // 66
+        if page == failPage:
+            raise downloader.URLError("failed")
+        return pages[page]
+    monkeypatch.setattr(downloader, "fetchPage", fetchPage)
+    monkeypatch.setattr(downloader, "BATCH_SIZE", 2)
+    updates = []
+    updateMany = downloader.holdingsTable.updateMany
+    monkeypatch.setattr(downloader.holdingsTable, "updateMany",
+                        lambda database, firstDates: updates.append(dict(firstDates)) or updateMany(database, firstDates))
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 10.0, "2021-01-01")
+
+    if failPage is None:
+        assert downloader.stockScrape("AAA.AX", database, "2021-01-01", "2021-01-08") == 5
+        assert updates == [{"AAA.AX": "2021-01-04"}]
+        assert stock.getTimeSeries("2021-01-01", "2021-01-08")[SC.TOTAL_VALUE].tolist() == [100, 110, 120, 130, 140]
+    else:
+        with pytest.raises(downloader.URLError):
+            downloader.stockScrape("AAA.AX", database, "2021-01-01", "2021-01-08")
+        assert updates == [{"AAA.AX": "2021-01-05"}]
+        assert stock.getTimeSeries("2021-01-01", "2021-01-08")[SC.TOTAL_VALUE].tolist() == [110, 120, 130, 140]
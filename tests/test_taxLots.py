@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Tests for taxLots.py"""
+import numpy as np
+import pytest
+import stockContract as SC
+import taxLots
+from conftest import addPrices
+
+
+# Removing one of two sales made at the same price on the same date keeps the
+# lots chosen for the other one
+def test_remove_keeps_other_sales_lots(portfolio, database):
+    addPrices(database, "AAA.AX", "2015-01-01", "2016-12-30", 55.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 50.0, "2015-02-02")
+    stock.buy(10, 52.0, "2015-03-02")
+    stock.sell(3, 55.0, "2016-01-04", lots = [("2015-03-02", 52.0, 3)])
+    stock.sell(2, 55.0, "2016-01-04", lots = [("2015-03-02", 52.0, 2)])
+    stock.remove(-2, 55.0, "2016-01-04")
+
+    openLots = stock.getTaxLots(taxLots.SPECIFIC).openLots.set_index(taxLots.LOT_DATE)
+    assert openLots.loc["2015-02-02", taxLots.NUMBER_OWNED] == 10
+    assert openLots.loc["2015-03-02", taxLots.NUMBER_OWNED] == 7
+
+
+# totalCost is the cost base of the lots still owned rather than the amount
+# spent less the sale proceeds
+def test_total_cost_is_cost_base(portfolio, database):
+    addPrices(database, "AAA.AX", "2015-01-01", "2016-12-30", 55.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 50.0, "2015-02-02")
+    stock.buy(10, 52.0, "2015-03-02")
+    assert stock.totalCost == 1020
+    stock.sell(5, 60.0, "2016-01-04")
+    assert stock.totalCost == 770
+    stock.sell(5, 60.0, "2016-02-01", lots = [("2015-03-02", 52.0, 5)])
+    assert stock.totalCost == 510
+    assert stock.getCostBase(method = taxLots.FIFO) == 520
+    assert portfolio.getCost() == 510
+    assert "total cost: $510.00" in str(stock)
+
+
+# A back dated sale of shares that weren't owned yet is rejected, and leaves
+# the stock as it was
+def test_back_dated_oversell_rolls_back(portfolio, database):
+    addPrices(database, "AAA.AX", "2015-01-01", "2016-12-30", 55.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 50.0, "2015-02-02")
+    with pytest.raises(ValueError, match = "more than the number owned"):
+        stock.sell(5, 55.0, "2015-01-05")
+    assert stock.numberOwned == 10
+    assert stock.totalCost == 500
+    assert portfolio.getCost() == 500
+    assert database.readValue("SELECT COUNT(*) FROM {}".format(SC.TABLE_NAME)) == 1
+
+    # Removing the purchase a later sale relies on is rejected too
+    stock.sell(5, 55.0, "2016-01-04")
+    with pytest.raises(ValueError, match = "more than the number owned"):
+        stock.remove(10, 50.0, "2015-02-02")
+    assert stock.numberOwned == 5
+
+
+# Lots chosen for a sale must exist and have the shares left
+@pytest.mark.parametrize("lots", [[("2015-02-03", 100.0, 4)], [("2015-02-02", 50.0, 11)]])
+def test_sell_rejects_unmatched_lots(portfolio, database, lots):
+    addPrices(database, "AAA.AX", "2015-01-01", "2016-12-30", 55.0)
+    stock = portfolio.addStock("AAA.AX", 100, refresh = False)
+    stock.buy(10, 50.0, "2015-02-02")
+    stock.buy(10, 52.0, "2015-03-02")
+    with pytest.raises(ValueError, match = "doesn't have"):
+        stock.sell(sum(number for lotDate, lotPrice, number in lots), 55.0, "2016-01-04", lots = lots)
+    assert stock.numberOwned == 20
+    assert database.readValue("SELECT COUNT(*) FROM {}".format(SC.LOT_TABLE_NAME)) == 0
+
+
+# Two purchases and a sale of AAA.AX, then a purchase and sale of BBB.AX
+CODES = np.array(["AAA.AX", "AAA.AX", "AAA.AX", "BBB.AX", "BBB.AX"])
+DATES = np.array(["2015-01-01", "2015-02-01", "2015-03-01", "2015-01-01", "2015-03-01"])
+SHARES = np.array([10.0, 10.0, -15.0, 5.0, -5.0])
+PRICES = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+@pytest.mark.parametrize("method, selections, expectedMatches, expectedRemaining", [
+    (taxLots.FIFO, None, [(2, 0, 10), (2, 1, 5), (4, 3, 5)], [0, 5, 0, 0, 0]),
+    (taxLots.LIFO, None, [(2, 1, 10), (2, 0, 5), (4, 3, 5)], [5, 0, 0, 0, 0]),
+    # The chosen lot is sold first, and the rest first in first out
+    (taxLots.SPECIFIC, {2: [["2015-02-01", 2.0, 5]]}, [(2, 1, 5), (2, 0, 10), (4, 3, 5)], [0, 5, 0, 0, 0]),
+    # Selections are ignored by the other methods
+    (taxLots.FIFO, {2: [["2015-02-01", 2.0, 5]]}, [(2, 0, 10), (2, 1, 5), (4, 3, 5)], [0, 5, 0, 0, 0])])
+def test_match_lots(method, selections, expectedMatches, expectedRemaining):
+    saleRows, lotRows, matched, remaining = taxLots.matchLots(CODES, DATES, SHARES, PRICES, method, selections)
+    # The caller's selections aren't used up
+    if selections is not None:
+        assert selections == {2: [["2015-02-01", 2.0, 5]]}
+    assert list(zip(saleRows, lotRows, matched)) == expectedMatches
+    assert list(remaining) == expectedRemaining
+
+
+# A sale can't use another stock's lots
+def test_match_lots_oversell():
+    shares = np.array([10.0, 10.0, -15.0, 5.0, -6.0])
+    with pytest.raises(ValueError, match = "Sale of 6 shares of BBB.AX"):
+        taxLots.matchLots(CODES, DATES, shares, PRICES, taxLots.FIFO)
+    with pytest.raises(ValueError, match = "Unknown tax lot method"):
+        taxLots.matchLots(CODES, DATES, SHARES, PRICES, "average")
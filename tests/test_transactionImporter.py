@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Tests for transactionImporter.py"""
+import pandas as pd
+import pytest
+import stockContract as SC
+import transactionImporter as importer
+from conftest import addPrices
+
+
+# Purchases of two stocks, with a sale and a row repeated in the data
+PURCHASES = pd.DataFrame({SC.CODE: ["AAA.AX", "AAA.AX", "BBB.AX", "AAA.AX", "BBB.AX"],
+                          SC.DATE: ["2021-01-04", "2021-01-06", "2021-01-05", "2021-01-04", "2021-01-07"],
+                          SC.NUMBER_PURCHASED: [10, -4, 5, 10, 2],
+                          SC.PRICE: [10.0, 11.0, 20.0, 10.0, 21.0]})
+
+
+# A portfolio holding two stocks with a week of prices, and no transactions
+@pytest.fixture
+def twoStocks(portfolio, database):
+    addPrices(database, "AAA.AX", "2021-01-04", "2021-01-08", 10.0)
+    addPrices(database, "BBB.AX", "2021-01-04", "2021-01-08", 20.0)
+    portfolio.addStock("AAA.AX", 50, refresh = False)
+    portfolio.addStock("BBB.AX", 50, refresh = False)
+    return portfolio
+
+
+# Repeated rows are only imported once, within the data and across imports,
+# and the stock totals include every row imported
+def test_import_skips_duplicates(twoStocks, database):
+    first, second = twoStocks.stockList
+    assert first.numberOwned == 0
+    assert twoStocks.importTransactions(PURCHASES) == 4
+    assert first.numberOwned == 6
+    assert second.numberOwned == 7
+    assert database.readValue("SELECT COUNT(*) FROM {}".format(SC.TABLE_NAME)) == 4
+
+    more = pd.concat([PURCHASES, pd.DataFrame({SC.CODE: ["BBB.AX"], SC.DATE: ["2021-01-08"],
+                                               SC.NUMBER_PURCHASED: [1], SC.PRICE: [22.0]})])
+    assert twoStocks.importTransactions(more) == 1
+    assert second.numberOwned == 8
+    assert second.getOwned("2021-01-07") == 7
+
+
+# Dividends are deduplicated the same way, with dates stored as yyyy-mm-dd so
+# that dates written with a time still match
+def test_import_dividends(twoStocks, database):
+    dividends = pd.DataFrame({SC.DIVIDEND_CODE: ["AAA.AX", "AAA.AX", "AAA.AX"],
+                              SC.DIVIDEND_DATE: ["2021-01-05", "2021-01-05", "2021-01-08"],
+                              SC.DIVIDEND_AMOUNT: [5.0, 5.0, "2.5"]})
+    assert twoStocks.importDividends(dividends) == 2
+    withTimes = dividends.assign(**{SC.DIVIDEND_DATE: dividends[SC.DIVIDEND_DATE] + " 00:00:00"})
+    assert twoStocks.importDividends(withTimes) == 0
+    assert twoStocks.getDividends() == pytest.approx(7.5)
+    dates = database.readDatabase("SELECT {} FROM {} ORDER BY {}".format(
+        SC.DIVIDEND_DATE, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_DATE))[SC.DIVIDEND_DATE]
+    assert dates.tolist() == ["2021-01-05", "2021-01-08"]
+
+
+# Invalid data is rejected before anything is written
+@pytest.mark.parametrize("column, values, message", [
+    (SC.PRICE, None, "missing the columns"),
+    (SC.PRICE, [10.0, None, 20.0, 10.0, 21.0], "missing values"),
+    (SC.NUMBER_PURCHASED, [10, -4, 5.5, 10, 2], "whole number"),
+    (SC.PRICE, [10.0, "ten", 20.0, 10.0, 21.0], "Unable to parse"),
+])
+def test_import_rejects_invalid_data(twoStocks, database, column, values, message):
+    data = PURCHASES.drop(columns = column) if values is None else PURCHASES.assign(**{column: values})
+    with pytest.raises(ValueError, match = message):
+        twoStocks.importTransactions(data)
+    assert database.readValue("SELECT COUNT(*) FROM {}".format(SC.TABLE_NAME)) == 0
+
+
+# CSV files are read the same way as dataframes
+def test_import_from_csv(twoStocks, database, tmp_path):
+    csvPath = str(tmp_path / "purchases.csv")
+    PURCHASES.to_csv(csvPath, index = False)
+    added = importer.importTransactions(database, csvPath)
+    assert len(added) == 4
+    assert added[SC.COST].tolist() == [100.0, -44.0, 100.0, 42.0]
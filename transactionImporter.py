@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""                 transactionImporter.py
+Created on Sun Oct 18 11:47:05 2026
+
+@author: dmcauslan
+
+Functions for importing many stock purchases/sales or dividend payments at
+once, from a dataframe or a CSV file. The data is validated, duplicate rows
+(within the data, or already in the database) are dropped, and the remaining
+rows are inserted in a single transaction, along with the updates to the
+dailyHoldings snapshots (see holdingsTable.py) that they affect.
+
+Purchase data needs the columns Stock_Code, Purchase_Date, Number_Purchased
+and Price_$ (see stockContract.py), sales have a negative Number_Purchased.
+Dividend data needs the columns Stock_Code, Dividend_Date and Amount_$.
+Exchange rate data needs the columns From_Currency, To_Currency, Date and Rate.
+"""
+import pandas as pd
+import stockContract as SC
+import portfolioAggregator as aggregator
+import holdingsTable
+import fxRates
+
+
+# Reads data (a dataframe, or the path to a CSV file) and returns a copy holding
+# just the columns in columns. Raises a ValueError if a column is missing, or
+# any values are missing or not numbers/dates.
+def readTransactions(data, columns, dateColumn, numericColumns):
+    if isinstance(data, str):
+        data = pd.read_csv(data)
+    missing = [column for column in columns if column not in data.columns]
+    if len(missing) > 0:
+        raise ValueError("Transaction data is missing the columns: {}.".format(", ".join(missing)))
+    data = data[columns].copy()
+    if data.isnull().values.any():
+        rows = data.index[data.isnull().any(axis = 1)].tolist()
+        raise ValueError("Transaction data has missing values in rows: {}.".format(rows))
+    
+    data[dateColumn] = pd.to_datetime(data[dateColumn]).dt.strftime("%Y-%m-%d")
+    for column in numericColumns:
+        data[column] = pd.to_numeric(data[column])
+    return data
+
+
+# Removes rows from data that are repeated within data, or that are already in
+# tableName. Rows are duplicates if all of their columns match.
+def removeDuplicates(database, data, tableName, codeColumn):
+    data = data.drop_duplicates()
+    if data.empty:
+        return data
+    codes = data[codeColumn].unique().tolist()
+    sqlQuery = '''SELECT {} FROM {} WHERE {} IN ({})''' \
+        .format(", ".join('"{}"'.format(column) for column in data.columns), tableName,
+                codeColumn, aggregator.placeholders(codes))
+    existing = database.readDatabase(sqlQuery, codes)
+    merged = data.merge(existing.drop_duplicates(), how = "left", indicator = True)
+    return merged[merged["_merge"] == "left_only"].drop(columns = "_merge")
+
+
+# Validates and inserts the purchases in data into the database in a single
+# transaction, skipping duplicates. Returns a dataframe of the rows that were added.
+def importTransactions(database, data):
+    data = readTransactions(data, [SC.CODE, SC.DATE, SC.NUMBER_PURCHASED, SC.PRICE],
+                            SC.DATE, [SC.NUMBER_PURCHASED, SC.PRICE])
+    if (data[SC.NUMBER_PURCHASED] % 1 != 0).any():
+        raise ValueError("Number_Purchased must be a whole number of shares.")
+    data[SC.NUMBER_PURCHASED] = data[SC.NUMBER_PURCHASED].astype(int)
+    data[SC.COST] = data[SC.NUMBER_PURCHASED] * data[SC.PRICE]
+    
+    added = removeDuplicates(database, data, SC.TABLE_NAME, SC.CODE)
+    with database.transaction():
+        database.addToDatabase(added, SC.TABLE_NAME)
+        holdingsTable.updateMany(database, added.groupby(SC.CODE)[SC.DATE].min().to_dict())
+    print("Imported {} transactions, skipped {} duplicates.".format(len(added), len(data) - len(added)))
+    return added
+
+
+# Validates and inserts the dividend payments in data into the database in a
+# single transaction, skipping duplicates. Returns a dataframe of the rows that
+# were added.
+def importDividends(database, data):
+    data = readTransactions(data, [SC.DIVIDEND_CODE, SC.DIVIDEND_DATE, SC.DIVIDEND_AMOUNT],
+                            SC.DIVIDEND_DATE, [SC.DIVIDEND_AMOUNT])
+    
+    added = removeDuplicates(database, data, SC.DIVIDEND_TABLE_NAME, SC.DIVIDEND_CODE)
+    with database.transaction():
+        database.addToDatabase(added, SC.DIVIDEND_TABLE_NAME)
+        holdingsTable.updateMany(database, added.groupby(SC.DIVIDEND_CODE)[SC.DIVIDEND_DATE].min().to_dict())
+    print("Imported {} dividends, skipped {} duplicates.".format(len(added), len(data) - len(added)))
+    return added
+
+
+# Validates and upserts the exchange rates in data into the fxRates table in a
+# single transaction. Rates already stored for a currency pair and date are
+# replaced. Returns the number of rates added or changed.
+def importRates(database, data):
+    data = readTransactions(data, SC.FX_COLUMNS, SC.FX_DATE, [SC.FX_RATE])
+    if (data[SC.FX_RATE] <= 0).any():
+        raise ValueError("Exchange rates must be greater than 0.")
+    added = fxRates.insertRates(database, data.itertuples(index = False, name = None))
+    print("Imported {} exchange rates.".format(added))
+    return added